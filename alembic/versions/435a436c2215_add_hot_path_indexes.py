@@ -0,0 +1,56 @@
+"""add hot path indexes
+
+Revision ID: 435a436c2215
+Revises: e2f85714b855
+Create Date: 2026-10-18 07:03:15.673706
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '435a436c2215'
+down_revision = 'e2f85714b855'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # vk_user.vk_id станет уникальным: дубли, которые успели создать
+    # параллельные create_vk_user, сливаются в самую раннюю запись
+    op.execute(
+        """
+        UPDATE player SET user_id = duplicate.keep_id
+        FROM (
+            SELECT id, min(id) OVER (PARTITION BY vk_id) AS keep_id
+            FROM vk_user
+        ) AS duplicate
+        WHERE player.user_id = duplicate.id
+            AND duplicate.id != duplicate.keep_id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM vk_user USING vk_user AS kept
+        WHERE vk_user.vk_id = kept.vk_id AND vk_user.id > kept.id
+        """
+    )
+    op.create_unique_constraint('vk_user_vk_id_key', 'vk_user', ['vk_id'])
+
+    # индексы строятся без блокировки записи в таблицы
+    with op.get_context().autocommit_block():
+        op.create_index('ix_game_active', 'game', ['id'], unique=False, postgresql_where=sa.text("state != 'inactive'"), postgresql_concurrently=True)
+        op.create_index(op.f('ix_game_chat_id'), 'game', ['chat_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_player_game_id_is_active', 'player', ['game_id', 'is_active'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_player_user_id'), 'player', ['user_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_player_user_id'), table_name='player', postgresql_concurrently=True)
+        op.drop_index('ix_player_game_id_is_active', table_name='player', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_game_chat_id'), table_name='game', postgresql_concurrently=True)
+        op.drop_index('ix_game_active', table_name='game', postgresql_concurrently=True)
+
+    op.drop_constraint('vk_user_vk_id_key', 'vk_user', type_='unique')
@@ -0,0 +1,24 @@
+"""add game deadline
+
+Revision ID: cb7bbb51856c
+Revises: 435a436c2215
+Create Date: 2026-10-18 09:12:40.518204
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'cb7bbb51856c'
+down_revision = '435a436c2215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('game', sa.Column('deadline', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('game', 'deadline')
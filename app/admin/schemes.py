@@ -9,3 +9,28 @@ class AdminLoginSchema(Schema):
 class AdminCurrentSchema(Schema):
     id = fields.Int(required=False)
     email = fields.Str(required=True)
+
+
+class MetricsSchema(Schema):
+    # метрики ролей, которые процесс не выполняет, - null
+    role = fields.Str()
+    poller = fields.Dict(allow_none=True)
+    outbox = fields.Dict(allow_none=True)
+    execute = fields.Dict(allow_none=True)
+    profiles = fields.Dict(allow_none=True)
+    members = fields.Dict(allow_none=True)
+    http = fields.Dict(allow_none=True)
+    active_games = fields.Dict(allow_none=True)
+    game_timers = fields.Dict(allow_none=True)
+    game_actors = fields.Dict(allow_none=True)
+    db_pool = fields.Dict(allow_none=True)
+    db_retry = fields.Dict(allow_none=True)
+    updates = fields.Dict(allow_none=True)
+    rate_limit = fields.List(fields.Dict(), allow_none=True)
+
+
+class QueryProfileSchema(Schema):
+    queries = fields.Int()
+    total_ms = fields.Float()
+    histogram = fields.Dict()
+    methods = fields.Dict()
@@ -2,9 +2,15 @@ from aiohttp.web import HTTPForbidden
 from aiohttp_apispec import docs, request_schema, response_schema
 from aiohttp_session import get_session, new_session
 
-from app.admin.schemes import AdminCurrentSchema, AdminLoginSchema
+from app.admin.schemes import (
+    AdminCurrentSchema,
+    AdminLoginSchema,
+    MetricsSchema,
+    QueryProfileSchema,
+)
 from app.web.app import View
 from app.web.mixins import AuthRequiredMixin
+from app.web.roles import Role
 from app.web.utils import json_response
 
 
@@ -54,3 +60,69 @@ class AdminCurrentView(AuthRequiredMixin, View):
             "email": admin.email,
         }
         return json_response(data)
+
+
+class MetricsView(AuthRequiredMixin, View):
+    @docs(
+        tags=["admin"],
+        summary="bot metrics",
+        description="Returns runtime metrics of the bot components. "
+        "Components of roles the process does not run are null",
+    )
+    @response_schema(MetricsSchema, 200)
+    async def get(self):
+        vk_api = self.store.vk_api
+        runs = self.request.app.runs
+
+        # каждая роль отчитывается за свои компоненты,
+        # в процессе другой роли они простаивают и не показываются
+        vk = runs(Role.poller, Role.worker)
+        worker = runs(Role.worker)
+        database = runs(Role.worker, Role.api)
+
+        data = {
+            "role": self.request.app.role,
+            "poller": vk_api.poller.stats() if vk_api.poller else None,
+            "outbox": vk_api.outbox.stats() if worker else None,
+            "execute": vk_api.batcher.stats() if worker else None,
+            "profiles": vk_api.profiles.stats() if worker else None,
+            "members": vk_api.members.stats() if worker else None,
+            "http": (
+                {pool.name: pool.stats() for pool in vk_api.http_pools}
+                if vk
+                else None
+            ),
+            "active_games": self.store.game.active.stats() if worker else None,
+            "game_timers": (
+                self.store.game_manager.timer.stats() if worker else None
+            ),
+            "game_actors": (
+                self.store.game_manager.actors.stats() if worker else None
+            ),
+            "db_pool": self.database.pool_stats() if database else None,
+            "db_retry": self.database.retry.stats() if database else None,
+            "updates": (
+                self.store.bot_manager.receiver.stats() if worker else None
+            ),
+            "rate_limit": (
+                [bucket.stats() for bucket in vk_api.buckets.values()]
+                if vk
+                else None
+            ),
+        }
+        return json_response(data)
+
+
+class QueryProfileView(AuthRequiredMixin, View):
+    @docs(
+        tags=["admin"],
+        summary="database query profile",
+        description="Returns a histogram of database query durations "
+        "and the slowest statements of every accessor method",
+    )
+    @response_schema(QueryProfileSchema, 200)
+    async def get(self):
+        data = self.database.profiler.stats(
+            limit=self.request.app.config.database.slow_queries
+        )
+        return json_response(data)
@@ -1,4 +1,13 @@
-from sqlalchemy import JSON, Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
 from sqlalchemy.orm import relationship
 
 from app.game.states import GameState
@@ -30,11 +39,15 @@ class GameModel(db):
     __tablename__ = "game"
 
     id = Column(Integer, primary_key=True)
-    chat_id = Column(ForeignKey("chat.id", ondelete="CASCADE"), nullable=False)
+    chat_id = Column(
+        ForeignKey("chat.id", ondelete="CASCADE"), nullable=False, index=True
+    )
     state = Column(String(50), default=GameState.inactive, nullable=False)
     current_player_id = Column(Integer, nullable=True)
     dealer_hand: dict = Column(JSON, default={"cards": []}, nullable=False)
     dealer_points = Column(Integer, nullable=True)
+    # срок таймера текущей стадии или хода, чтобы пережить перезапуск
+    deadline = Column(DateTime(timezone=True), nullable=True)
 
     chat = relationship(
         "ChatModel",
@@ -49,6 +62,15 @@ class GameModel(db):
         passive_deletes=True,
     )
 
+    __table_args__ = (
+        # идущих игр мало, поиск только их - по маленькому индексу
+        Index(
+            "ix_game_active",
+            "id",
+            postgresql_where=state != GameState.inactive,
+        ),
+    )
+
     def __repr__(self):
         return f"GameModel(id={self.id!r}, state={self.state!r})"
 
@@ -57,7 +79,7 @@ class PlayerModel(db):
     __tablename__ = "player"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(ForeignKey("vk_user.id"), nullable=False)
+    user_id = Column(ForeignKey("vk_user.id"), nullable=False, index=True)
     game_id = Column(ForeignKey("game.id", ondelete="CASCADE"), nullable=False)
     cash = Column(Integer, default=1000, nullable=False)
     bet = Column(Integer, nullable=True)
@@ -70,6 +92,11 @@ class PlayerModel(db):
     game = relationship("GameModel", back_populates="players")
     vk_user = relationship("VKUserModel", back_populates="players")
 
+    # покрывает и поиск всех игроков игры по game_id
+    __table_args__ = (
+        Index("ix_player_game_id_is_active", "game_id", "is_active"),
+    )
+
     def __repr__(self):
         return f"PlayerModel(id={self.id!r})"
 
@@ -78,7 +105,7 @@ class VKUserModel(db):
     __tablename__ = "vk_user"
 
     id = Column(Integer, primary_key=True)
-    vk_id = Column(Integer, nullable=False)
+    vk_id = Column(Integer, unique=True, nullable=False)
     name = Column(String(255), nullable=False)
     sex = Column(String(20), nullable=False)
 
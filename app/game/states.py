@@ -10,3 +10,12 @@ class GameState(StrEnum):
     dealing_players = "dealing_players"
     dealing_dealer = "dealing_dealer"
     results = "results"
+
+
+class PlayerOutcome(StrEnum):
+    """исходы раздачи для игрока"""
+
+    win = "win"
+    blackjack = "blackjack"
+    draw = "draw"
+    loss = "loss"
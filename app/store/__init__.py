@@ -1,6 +1,7 @@
 import typing
 
 from app.store.database.database import Database
+from app.web.roles import Role
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
@@ -25,6 +26,8 @@ class Store:
 
 def setup_store(app: "Application"):
     app.database = Database(app)
-    app.on_startup.append(app.database.connect)
-    app.on_cleanup.append(app.database.disconnect)
+    # поллеру бд не нужна
+    if app.runs(Role.worker, Role.api):
+        app.on_startup.append(app.database.connect)
+        app.on_cleanup.append(app.database.disconnect)
     app.store = Store(app)
@@ -4,9 +4,11 @@ from sqlalchemy import select
 
 from app.admin.models import AdminModel
 from app.base.base_accessor import BaseAccessor
+from app.store.database.profiler import query_source
 
 
 class AdminAccessor(BaseAccessor):
+    @query_source
     async def get_by_email(self, email: str) -> AdminModel | None:
         async with self.app.database.session() as session:
             async with session.begin():
@@ -16,6 +18,7 @@ class AdminAccessor(BaseAccessor):
 
                 return admin
 
+    @query_source
     async def create_admin(self, email: str, password: str) -> None:
         async with self.app.database.session() as session:
             async with session.begin():
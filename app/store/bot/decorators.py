@@ -1,5 +1,4 @@
 import typing
-from asyncio import sleep as asleep
 from collections.abc import Awaitable, Callable
 from typing import Any
 
@@ -9,16 +8,18 @@ if typing.TYPE_CHECKING:
 
 # декоратор для Notifier
 def bot_typing(method: Callable[[int, Any], Awaitable[None]], sec: int = 3):
-    """посылает инфо о печатании и ждет переданное количество секунд.
-    по умолчанию = 3 секунды"""
+    """ставит перед сообщением метода инфо о печатании и паузу
+    в переданное количество секунд, по умолчанию = 3 секунды.
+    пауза выдерживается в очереди отправки, сам метод не ждет.
+    при vk_api.typing_delays = false паузы не ставятся вовсе"""
 
     async def wrapper(self: "BotNotifier", *args, **kwargs):
         vk_chat_id = kwargs.get("peer_id")
         if not vk_chat_id:
             vk_chat_id = args[0]
 
-        await self.app.store.vk_api.send_activity(vk_chat_id)
-        await asleep(sec)
+        if self.app.config.vk_api.typing_delays:
+            await self.app.store.vk_api.send_typing(vk_chat_id, sec)
 
         return await method(self, *args, **kwargs)
 
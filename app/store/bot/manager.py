@@ -1,14 +1,21 @@
 import typing
+from asyncio import gather
+from functools import partial
 from logging import getLogger
 
 from app.store.bot.notifications import BotNotifier
 from app.store.bot.receiver import UpdateReceiver
+from app.store.game.events import GameEvent
 from app.store.game.router import GameEventRouter
 from app.store.vk_api.dataclasses import Update
+from app.store.vk_api.members import INVITE_ACTIONS, KICK_ACTIONS
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
+# команды, которым нужен состав беседы
+MEMBERS_EVENTS = {GameEvent.start, GameEvent.register}
+
 
 class BotManager:
     """управление основными функциями бота"""
@@ -21,17 +28,55 @@ class BotManager:
         self.logger = getLogger("bot handler")
 
     async def handle_update(self, update: Update) -> None:
+        """передает событие от вк в актор его беседы: события одной беседы
+        и сроки таймеров ее игры обрабатываются строго по очереди"""
+
+        await self.app.store.game_manager.actors.ask(
+            update.peer_id, partial(self.dispatch_update, update)
+        )
+
+    async def dispatch_update(self, update: Update) -> None:
         """направляет полученное событие от вк в более специализированный обработчик,
-        в зависимости от типа: чат, личка или инвайт"""
+        в зависимости от типа: чат, личка или инвайт.
+        все обращения к бд при обработке - одна транзакция"""
+
+        if update.action_type in INVITE_ACTIONS | KICK_ACTIONS:
+            await self.app.store.vk_api.members.on_action(update)
+
+        # ответов vk команда ждет до начала транзакции,
+        # а не держа соединение из пула
+        await self.prefetch(update)
+
+        async with self.app.database.unit_of_work():
+            if update.from_id == update.peer_id:
+                await self.handle_private_msg(update)
+
+            elif update.action_type == "chat_invite_user":
+                await self.handle_chat_invite(update)
+
+            else:
+                await self.handle_chat_msg(update)
+
+    async def prefetch(self, update: Update) -> None:
+        """загружает в кэши профиль автора команды и, если команде
+        он нужен, состав беседы. внутри транзакции обработчики
+        берут их из кэша, не обращаясь к vk"""
 
         if update.from_id == update.peer_id:
-            await self.handle_private_msg(update)
+            return
 
-        elif update.action_type == "chat_invite_user":
-            await self.handle_chat_invite(update)
+        invite = update.action_type == "chat_invite_user"
+        event = self.router.get_event(self._clean_update_text(update.text))
+        if event is None and not invite:
+            return
 
-        else:
-            await self.handle_chat_msg(update)
+        vk_api = self.app.store.vk_api
+        requests = [vk_api.get_user(update.from_id)]
+        # после приглашения может восстановиться идущая игра
+        if event in MEMBERS_EVENTS or invite:
+            requests.append(vk_api.get_chat_members_count(update.peer_id))
+
+        await gather(*requests)
 
     async def handle_private_msg(self, update: Update) -> None:
         """обработка сообщения в личке"""
@@ -41,24 +86,26 @@ class BotManager:
     async def handle_chat_invite(self, update: Update) -> None:
         """обработка приглашения в беседу"""
 
-        game_on = await self.app.store.game.is_game_on(update.peer_id)
+        ctx = await self.app.store.game.get_game_context(
+            update.peer_id, update.from_id
+        )
 
-        if game_on:
+        if ctx.game_is_on:
             await self.app.store.game_manager.notifier.bot_returning(
                 update.peer_id
             )
-            game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-            await self.app.store.game_manager.timer.end_timer(game.id)
-            await self.app.store.game_manager.recovery(update.peer_id, game)
+            self.app.store.game_manager.timer.end_timer(ctx.game.id)
+            await self.app.store.game_manager.recovery(update.peer_id, ctx.game)
             return
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-        if game:
+        if ctx.game:
             await self.notifier.meeting(update.peer_id, again=True)
         else:
             await self.notifier.meeting(update.peer_id)
 
-        await self.app.store.game_handler.send_game_offer(update=update)
+        await self.app.store.game_handler.send_game_offer(
+            update=update, ctx=ctx
+        )
 
     async def handle_chat_msg(self, update: Update) -> None:
         """обработка сообщения в беседе"""
@@ -69,8 +116,13 @@ class BotManager:
         if event is None:
             return
 
+        # игра, беседа и игрок загружаются один раз на команду,
+        # проверки стадий и обработчик работают с ними
+        ctx = await self.app.store.game.get_game_context(
+            update.peer_id, update.from_id
+        )
         handler = self.router.route(event)
-        await handler(update)
+        await handler(update, ctx)
 
     def _clean_update_text(self, text: str) -> str:
         """возвращает полученный ботом текст очищенным
@@ -1,41 +1,224 @@
 import json
 import typing
+from asyncio import Lock, Task, create_task, sleep as asleep
+from functools import partial
 from logging import getLogger
+from typing import Optional
 
 import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractQueue
+from aio_pika.exceptions import CONNECTION_EXCEPTIONS
+from aiormq.exceptions import ChannelLockedResource
 
+from app.store.database.retry import DatabaseUnavailable, is_transient
+from app.store.game.actors import ActorsClosed
 from app.store.vk_api.dataclasses import Update
+from app.store.vk_api.shards import (
+    QUEUE_ARGUMENTS,
+    owned_shards,
+    owner_queue,
+    shard_of,
+    shard_queue,
+)
+from app.web.roles import Role
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
+# как часто процесс в резерве проверяет, не освободился ли шард
+STANDBY_RETRY = 5.0
+
 
 class UpdateReceiver:
-    """получатель обновлений из брокера сообщений"""
+    """получатель обновлений из брокера сообщений.
+    слушает очереди только своих шардов. шард сначала занимается
+    его очередью-замком, затем восстанавливаются игры его бесед
+    и только потом начинается прием updates. занятый другим
+    процессом шард ждет в резерве, пока тот не отключится.
+    замок живет, пока живо соединение: если оно оборвалось,
+    шард отдается, состояние его бесед забывается,
+    и он снова ждет в резерве уже с новым соединением"""
 
     def __init__(self, app: "Application"):
         self.app = app
-        self.queue_name: str = "vk_updates"
+        # соединение не восстанавливается само: восстановленный канал
+        # занимал бы замок заново, не зная, что шард уже у другого
+        self.connection: Optional[AbstractConnection] = None
+        self.connecting = Lock()
+        # остановка началась: потерянные шарды больше не занимаются
+        self.closing = False
+        # шарды, которые этот процесс занял и обслуживает
+        self.active: set[int] = set()
+        self.standby: dict[int, Task] = {}
+        # очереди занятых шардов и теги их потребителей
+        self.consumers: dict[int, tuple[AbstractQueue, str]] = {}
         self.logger = getLogger("update receiver")
+
+        self.handled: int = 0
+        self.requeued: int = 0
+        self.failed: int = 0
         app.on_startup.append(self.connect)
+        # прием останавливается раньше менеджера игр:
+        # после его финального сохранения новых updates не будет
+        app.on_shutdown.append(self.stop_consuming)
+        # замки держатся до cleanup: пока менеджер игр прощается
+        # с беседами и сохраняет игры, шарды не достаются резерву
+        app.on_cleanup.append(self.disconnect)
+
+    @property
+    def shards(self) -> list[int]:
+        config = self.app.config.rabbitmq
+        return owned_shards(config.shards, config.owned_shards)
 
     async def connect(self, app: "Application"):
-        connection = await aio_pika.connect_robust(self.app.config.rabbitmq.url)
-        channel = await connection.channel()
+        if not app.runs(Role.worker):
+            return
+
+        for shard in self.shards:
+            if not await self.serve(shard):
+                self.logger.info(f"shard {shard} is busy, standing by")
+                self.standby[shard] = create_task(self._stand_by(shard))
+
+    async def serve(self, shard: int) -> bool:
+        """занимает шард, восстанавливает игры его бесед и начинает
+        прием его updates. False - шард занят другим процессом"""
+
+        channel = await self._channel()
+        try:
+            await channel.declare_queue(owner_queue(shard), exclusive=True)
+        except ChannelLockedResource:
+            await channel.close()
+            return False
+
+        # канал закрывается вместе с соединением, а с ним пропадает замок
+        channel.close_callbacks.add(partial(self._lost, shard))
+        self.active.add(shard)
+        await self.app.store.game_manager.recover([shard])
+
         await channel.set_qos(prefetch_count=10)
-        queue = await channel.declare_queue(self.queue_name, durable=True)
-        await queue.consume(self.route_update)
+        queue = await channel.declare_queue(
+            shard_queue(shard), durable=True, arguments=QUEUE_ARGUMENTS
+        )
+        self.consumers[shard] = (queue, await queue.consume(self.route_update))
+        return True
+
+    async def _channel(self) -> AbstractChannel:
+        """новый канал брокера, оборванное соединение открывается заново"""
+
+        async with self.connecting:
+            if self.connection is None or self.connection.is_closed:
+                self.connection = await aio_pika.connect(
+                    self.app.config.rabbitmq.url
+                )
+        return await self.connection.channel()
+
+    async def _stand_by(self, shard: int, lost: bool = False) -> None:
+        try:
+            while True:
+                if lost:
+                    await self._release(shard)
+                try:
+                    if await self.serve(shard):
+                        break
+                    lost = False
+                except CONNECTION_EXCEPTIONS as error:
+                    self.logger.warning(f"shard {shard}: {error!r}")
+                    lost = True
+                await asleep(STANDBY_RETRY)
+            self.logger.info(f"shard {shard} taken over")
+        finally:
+            del self.standby[shard]
+
+    def _lost(self, shard: int, *_) -> None:
+        """канал шарда закрылся: замок потерян, и шард мог занять
+        резервный процесс. беседы шарда сразу перестают считаться своими"""
+
+        if self.closing or shard not in self.active:
+            return
+
+        self.logger.warning(f"shard {shard} lock lost, standing by")
+        self.active.discard(shard)
+        self.consumers.pop(shard, None)
+        if shard not in self.standby:
+            self.standby[shard] = create_task(self._stand_by(shard, True))
+
+    async def _release(self, shard: int) -> None:
+        """забывает игры бесед потерянного шарда"""
+
+        self.active.discard(shard)
+        self.consumers.pop(shard, None)
+        try:
+            await self.app.store.game_manager.release([shard])
+        except Exception as error:
+            self.logger.error(f"shard {shard}", exc_info=error)
+
+    async def stop_consuming(self, *_) -> None:
+        """перестает ждать свободные шарды и принимать updates.
+        необработанные updates остаются в очередях шардов"""
+
+        self.closing = True
+        for task in list(self.standby.values()):
+            task.cancel()
+
+        for shard, (queue, consumer_tag) in list(self.consumers.items()):
+            try:
+                await queue.cancel(consumer_tag)
+            except Exception as error:
+                self.logger.error(f"shard {shard}", exc_info=error)
+        self.consumers.clear()
+
+    async def disconnect(self, *_) -> None:
+        self.closing = True
+        if self.connection:
+            await self.connection.close()
+
+    def owns(self, peer_id: int) -> bool:
+        """обслуживает ли этот процесс беседу сейчас"""
+
+        return shard_of(peer_id, self.app.config.rabbitmq.shards) in self.active
 
     async def route_update(
         self, message: aio_pika.abc.AbstractIncomingMessage
     ) -> None:
         """направляет полученный update в обработчик (если это update)"""
 
-        async with message.process():
+        async with message.process(ignore_processed=True):
             try:
                 data = json.loads(message.body.decode())
                 update = Update(**data)
                 await self.app.store.bot_manager.handle_update(update)
+                self.handled += 1
 
             except json.decoder.JSONDecodeError:
                 self.logger.info(f"{message.body.decode()}")
+
+            except ActorsClosed:
+                # процесс останавливается - update дождется
+                # следующего владельца шарда
+                self.requeued += 1
+                await message.nack(requeue=True)
+
+            except DatabaseUnavailable as error:
+                # обработка не началась - update вернется в очередь
+                self.requeued += 1
+                self.logger.warning(f"database unavailable, requeue: {error}")
+                await asleep(self.app.config.database.retry_max_backoff)
+                await message.nack(requeue=True)
+
+            except Exception as error:
+                # сбой посреди обработки: часть ответов уже отправлена,
+                # повтор задвоил бы их - update отбрасывается, но учитывается
+                self.failed += 1
+                if not is_transient(error):
+                    raise
+                self.logger.error("database failure", exc_info=error)
+                await message.reject()
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.shards,
+            "active": sorted(self.active),
+            "handled": self.handled,
+            "requeued": self.requeued,
+            "failed": self.failed,
+        }
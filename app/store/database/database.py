@@ -1,4 +1,7 @@
-from typing import TYPE_CHECKING, Any, Optional
+from asyncio import Task, current_task
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
 
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -8,26 +11,99 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.store.database import db
+from app.store.database.pool import MeasuredQueuePool
+from app.store.database.profiler import QueryProfiler
+from app.store.database.retry import RetryPolicy
 
 if TYPE_CHECKING:
     from app.web.app import Application
 
 
+# единица работы текущей задачи: задача-владелец и ее общая сессия
+_unit_of_work: ContextVar[
+    Optional[tuple[Task, "UnitOfWorkSession"]]
+] = ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWorkSession:
+    """общая сессия единицы работы в том виде, в каком ее ждут аксессоры.
+    транзакцией владеет Database.unit_of_work, поэтому
+    begin() и выход из async with ничего не делают,
+    а commit() только сбрасывает изменения в бд"""
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def __aenter__(self) -> "UnitOfWorkSession":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        pass
+
+    def begin(self) -> "UnitOfWorkSession":
+        return self
+
+    async def commit(self) -> None:
+        await self._session.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+
+class UnitOfWorkSessionmaker(sessionmaker):
+    """внутри единицы работы отдает ее общую сессию,
+    вне ее - новую, как обычный sessionmaker"""
+
+    def __call__(self, **kwargs: Any) -> AsyncSession:
+        unit_of_work = _unit_of_work.get()
+
+        # дочерние задачи наследуют контекст, но не сессию
+        if unit_of_work is not None and unit_of_work[0] is current_task():
+            return unit_of_work[1]
+
+        return super().__call__(**kwargs)
+
+
 class Database:
     def __init__(self, app: "Application"):
         self.app = app
         self._engine: Optional[AsyncEngine] = None
         self._db: Optional[declarative_base] = None
         self.session: Optional[AsyncSession] = None
+        self.profiler = QueryProfiler()
+        self.retry = RetryPolicy(app)
 
     async def connect(self, *_: Any, **__: Any) -> None:
         self._db = db
 
         url = self._build_db_url()
 
-        self._engine = create_async_engine(url, echo=True, future=True)
+        config = self.app.config.database
+        connect_args = {}
+        if config.driver == "asyncpg":
+            connect_args = {
+                "statement_cache_size": config.statement_cache_size,
+                "prepared_statement_cache_size": (
+                    config.prepared_statement_cache_size
+                ),
+            }
 
-        self.session = sessionmaker(
+        self._engine = create_async_engine(
+            url,
+            echo=config.echo,
+            future=True,
+            poolclass=MeasuredQueuePool,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+            pool_recycle=config.pool_recycle,
+            pool_pre_ping=config.pool_pre_ping,
+            connect_args=connect_args,
+        )
+        if config.profile_queries:
+            self.profiler.attach(self._engine.sync_engine)
+
+        self.session = UnitOfWorkSessionmaker(
             self._engine, expire_on_commit=False, class_=AsyncSession
         )
 
@@ -37,8 +113,71 @@ class Database:
         )
         await self.app.store.game.create_global_settings()
 
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[UnitOfWorkSession]:
+        """одна сессия и одна транзакция на все обращения аксессоров к бд
+        из текущей задачи. фиксируется при выходе, при ошибке откатывается.
+        вложенный вызов в той же задаче присоединяется к внешнему.
+        если соединение так и не удалось получить - DatabaseUnavailable"""
+
+        if self.in_unit_of_work():
+            yield _unit_of_work.get()[1]
+            return
+
+        task = current_task()
+
+        # до начала работы ничего не сделано - соединение можно
+        # добывать с повторами, а при неудаче отказаться целиком
+        session = await self.retry.run(self._begin)
+        try:
+            unit_of_work_session = UnitOfWorkSession(session)
+            token = _unit_of_work.set((task, unit_of_work_session))
+            try:
+                yield unit_of_work_session
+            finally:
+                _unit_of_work.reset(token)
+
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def _begin(self) -> AsyncSession:
+        """сессия с начатой транзакцией и уже полученным соединением"""
+
+        session = self.session()
+        try:
+            await session.begin()
+            await session.connection()
+        except BaseException:
+            await session.close()
+            raise
+        return session
+
+    def in_unit_of_work(self) -> bool:
+        """идет ли в текущей задаче единица работы"""
+
+        unit_of_work = _unit_of_work.get()
+        return unit_of_work is not None and unit_of_work[0] is current_task()
+
+    async def invalidate_pool(self) -> None:
+        """заменяет пул соединений новым, не закрывая старые соединения"""
+
+        if self._engine:
+            await self._engine.dispose(close=False)
+
+    def pool_stats(self) -> dict:
+        """занятость пула соединений и время ожидания соединения"""
+
+        if self._engine is None:
+            return {}
+        return self._engine.pool.stats()
+
     async def disconnect(self, *_: list, **__: dict) -> None:
         if self._engine:
+            self.profiler.detach()
             await self._engine.dispose()
 
     def _build_db_url(self) -> str:
@@ -0,0 +1,43 @@
+from time import perf_counter
+from typing import Any
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """пул соединений движка, который считает время получения соединения:
+    ожидание свободного, когда все заняты, и открытие нового"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+
+        self.checkouts: int = 0
+        self.wait_time: float = 0.0
+        self.max_wait: float = 0.0
+        self.timeouts: int = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = perf_counter() - started
+            self.checkouts += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "wait_time": round(self.wait_time, 3),
+            "max_wait": round(self.max_wait, 3),
+            "timeouts": self.timeouts,
+        }
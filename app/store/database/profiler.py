@@ -0,0 +1,181 @@
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from time import perf_counter
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# верхние границы корзин гистограммы длительности запросов, мс
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# метод аксессора, из которого сейчас идут запросы к бд
+_query_source: ContextVar[str] = ContextVar("query_source", default="unknown")
+
+
+def query_source(method):
+    """приписывает запросы к бд, сделанные внутри метода, этому методу.
+    во вложенных вызовах запросы достаются самому внутреннему"""
+
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        token = _query_source.set(f"{type(self).__name__}.{method.__name__}")
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            _query_source.reset(token)
+
+    return wrapper
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """текст запроса без значений: литералы и плейсхолдеры заменены на ?,
+    списки значений любой длины свернуты, чтобы IN (...) и VALUES
+    на разное число строк считались одним запросом"""
+
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"\$\d+", "?", statement)
+    statement = re.sub(r"\?::[\w ]+?(?=[,)\s]|$)", "?", statement)
+    statement = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?\b", "?", statement)
+    statement = re.sub(r"\?(?: ?, ?\?)+", "?, ...", statement)
+    statement = re.sub(
+        r"\((\?(?:, \.\.\.)?)\)(?: ?, ?\(\1\))+", r"(\1), ...", statement
+    )
+    return statement
+
+
+@dataclass
+class QueryStats:
+    """накопленные замеры одного запроса из одного метода"""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    buckets: list[int] = field(
+        default_factory=lambda: [0] * (len(BUCKETS_MS) + 1)
+    )
+
+    def add(self, duration: float, rows: int) -> None:
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.rows += rows
+        self.buckets[bucket_index(duration)] += 1
+
+    def percentile(self, share: float) -> float:
+        """оценка перцентиля сверху - граница корзины, в которую он попал"""
+
+        border = share * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= border and count:
+                break
+        else:
+            return 0.0
+
+        if index == len(BUCKETS_MS):
+            return round(self.max * 1000, 3)
+        return float(BUCKETS_MS[index])
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+        }
+
+
+def bucket_index(duration: float) -> int:
+    duration_ms = duration * 1000
+    for index, border in enumerate(BUCKETS_MS):
+        if duration_ms <= border:
+            return index
+    return len(BUCKETS_MS)
+
+
+class QueryProfiler:
+    """замеряет через события sqlalchemy каждый запрос к бд:
+    длительность и число строк по отпечатку запроса и методу аксессора,
+    из которого он сделан (см. query_source)"""
+
+    def __init__(self):
+        self.engine: Optional[Engine] = None
+        self.queries: dict[tuple[str, str], QueryStats] = {}
+        self.histogram: list[int] = [0] * (len(BUCKETS_MS) + 1)
+
+    def attach(self, engine: Engine) -> None:
+        self.engine = engine
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def detach(self) -> None:
+        if self.engine is None:
+            return
+
+        event.remove(self.engine, "before_cursor_execute", self._before_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_execute)
+        event.remove(self.engine, "handle_error", self._on_error)
+        self.engine = None
+
+    def _before_execute(self, conn, cursor, statement, *_: Any) -> None:
+        conn.info.setdefault("query_started", []).append(perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, *_: Any) -> None:
+        duration = perf_counter() - conn.info["query_started"].pop()
+
+        rows = cursor.rowcount
+        if rows < 0:
+            # select: asyncpg-адаптер sqlalchemy выбирает строки сразу
+            rows = len(getattr(cursor, "_rows", ()))
+
+        key = (_query_source.get(), fingerprint(statement))
+        query = self.queries.get(key)
+        if query is None:
+            query = self.queries[key] = QueryStats()
+
+        query.add(duration, rows)
+        self.histogram[bucket_index(duration)] += 1
+
+    def _on_error(self, context) -> None:
+        # упавший запрос не доходит до after_cursor_execute
+        if context.connection is not None:
+            started = context.connection.info.get("query_started")
+            if started:
+                started.pop()
+
+    def reset(self) -> None:
+        self.queries.clear()
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def stats(self, limit: int = 5) -> dict:
+        """общая гистограмма и самые медленные запросы каждого метода"""
+
+        methods: dict[str, list[dict]] = {}
+        for (source, statement), query in sorted(
+            self.queries.items(), key=lambda item: -item[1].max
+        ):
+            slowest = methods.setdefault(source, [])
+            if len(slowest) < limit:
+                slowest.append({"statement": statement, **query.stats()})
+
+        borders = [f"<={border}ms" for border in BUCKETS_MS] + [
+            f">{BUCKETS_MS[-1]}ms"
+        ]
+
+        return {
+            "queries": sum(self.histogram),
+            "total_ms": round(
+                sum(query.total for query in self.queries.values()) * 1000, 3
+            ),
+            "histogram": dict(zip(borders, self.histogram)),
+            "methods": methods,
+        }
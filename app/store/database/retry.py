@@ -0,0 +1,192 @@
+import random
+import typing
+from asyncio import CancelledError, Task, current_task, sleep as asleep
+from contextvars import ContextVar
+from logging import getLogger
+from time import monotonic
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy.exc import (
+    DBAPIError,
+    InterfaceError,
+    OperationalError,
+    TimeoutError as PoolTimeoutError,
+)
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+T = TypeVar("T")
+
+# задача, в которой сейчас идет RetryPolicy.run: вложенные вызовы
+# не повторяются сами, иначе попытки перемножаются
+_running: ContextVar[Optional[Task]] = ContextVar("retry_running", default=None)
+
+
+class DatabaseUnavailable(Exception):
+    """бд недоступна: попытки кончились или разомкнут предохранитель.
+    вызов ничего не успел сделать, его можно безопасно повторить позже"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """сбой соединения или пула, а не ошибка в самом запросе"""
+
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(
+        error, (OperationalError, InterfaceError, PoolTimeoutError, OSError)
+    )
+
+
+class CircuitBreaker:
+    """предохранитель: после threshold сбоев подряд размыкается
+    и reset секунд отказывает сразу, не дергая бд.
+    затем пропускает одну пробную попытку: успех замыкает его,
+    сбой или прерванная попытка снова размыкает"""
+
+    def __init__(self, threshold: int, reset: float):
+        self.threshold = threshold
+        self.reset = reset
+        self.failures: int = 0
+        self.opened_at: float | None = None
+        self.trial: bool = False
+
+        self.opens: int = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.trial or monotonic() - self.opened_at >= self.reset:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        if self.trial or self.failures >= self.threshold:
+            if self.opened_at is None or self.trial:
+                self.opens += 1
+            self.opened_at = monotonic()
+            self.trial = False
+
+
+class RetryPolicy:
+    """повторы обращений к бд при сбоях соединения:
+    экспоненциальная задержка со случайным разбросом (full jitter),
+    не больше retry_attempts попыток и предохранитель на всю бд.
+    повторять можно только то, что безопасно выполнить дважды:
+    чтение или единицу работы целиком до ее начала"""
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        config = app.config.database
+        self.breaker = CircuitBreaker(
+            config.breaker_threshold, config.breaker_reset
+        )
+        self.logger = getLogger("database retry")
+
+        self.calls: int = 0
+        self.retries: int = 0
+        self.failures: int = 0
+        self.rejected: int = 0
+        self.invalidations: int = 0
+
+    def delay(self, attempt: int) -> float:
+        """задержка перед повтором номер attempt (с единицы)"""
+
+        config = self.app.config.database
+        ceiling = min(
+            config.retry_max_backoff, config.retry_backoff * 2 ** (attempt - 1)
+        )
+        return random.uniform(0, ceiling)
+
+    async def run(
+        self, call: Callable[[], Awaitable[T]], retry: bool = True
+    ) -> T:
+        """выполняет call, при сбое соединения повторяет его (если retry).
+        когда повторять больше нельзя - DatabaseUnavailable"""
+
+        if _running.get() is current_task():
+            return await call()
+
+        attempts = self.app.config.database.retry_attempts if retry else 1
+        self.calls += 1
+        token = _running.set(current_task())
+        try:
+            return await self._run(call, attempts)
+        finally:
+            _running.reset(token)
+
+    async def _run(self, call: Callable[[], Awaitable[T]], attempts: int) -> T:
+        for attempt in range(1, attempts + 1):
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise DatabaseUnavailable("circuit breaker is open")
+
+            # пробную попытку после паузы забрал именно этот вызов
+            trial = self.breaker.trial
+
+            try:
+                result = await call()
+            except (Exception, CancelledError) as error:
+                if isinstance(error, CancelledError):
+                    # отмененная проба не дала ответа - считается сбоем,
+                    # иначе предохранитель навсегда остался бы полуоткрытым
+                    if trial:
+                        self.breaker.on_failure()
+                    raise
+
+                if not is_transient(error):
+                    # ошибка запроса, а не бд - предохранитель не трогаем
+                    self.breaker.on_success()
+                    raise
+
+                self.breaker.on_failure()
+                await self._invalidate(error)
+
+                if attempt == attempts:
+                    self.failures += 1
+                    raise DatabaseUnavailable(str(error)) from error
+
+                self.retries += 1
+                self.logger.warning(
+                    f"database call failed ({error!r}), "
+                    f"retry {attempt} of {attempts - 1}"
+                )
+                await asleep(self.delay(attempt))
+            else:
+                self.breaker.on_success()
+                return result
+
+    async def _invalidate(self, error: Exception) -> None:
+        """при обрыве соединения бросает весь пул: соседние соединения
+        к той же бд скорее всего тоже мертвы, а их закрытие может зависнуть"""
+
+        if isinstance(error, DBAPIError) and error.connection_invalidated:
+            self.invalidations += 1
+            await self.app.database.invalidate_pool()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "breaker_opens": self.breaker.opens,
+            "invalidations": self.invalidations,
+        }
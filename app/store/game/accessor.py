@@ -1,4 +1,20 @@
-from sqlalchemy import func, select, update
+import typing
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    column,
+    func,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.base.base_accessor import BaseAccessor
 from app.game.models import (
@@ -8,32 +24,58 @@ from app.game.models import (
     PlayerModel,
     VKUserModel,
 )
-from app.game.states import GameState
-from app.store.game.decorators import catch_db_error
+from app.game.states import GameState, PlayerOutcome
+from app.store.game.active import ActiveGames
+from app.store.game.dataclasses import GameContext
+from app.store.game.decorators import db_read, db_write
+from app.store.vk_api.dataclasses import VKUser
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+# исходы, при которых игрок получает выигрыш
+PAYOUTS = {PlayerOutcome.win, PlayerOutcome.blackjack}
 
 
 class GameAccessor(BaseAccessor):
     """взаимосвязь gamemanager и database"""
 
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        self.active = ActiveGames(app)
+
+        # беседа не меняет ни чат, ни игру: peer_id -> (id чата, id игры)
+        # и id игры -> id чата запоминаются, пока беседа не окажется
+        # давно не использовавшейся сверх game.chat_cache_size
+        self.chat_games: OrderedDict[int, tuple[int, int]] = OrderedDict()
+        self.game_chats: dict[int, int] = {}
+
     # vk_user
-    @catch_db_error
+    @db_write
     async def create_vk_user(self, vk_id: int) -> VKUserModel:
-        """создает и возвращает модель пользователя вк"""
+        """создает и возвращает модель пользователя вк.
+        если его уже успели создать параллельно - возвращает ту запись"""
+
+        vk_user = await self.app.store.vk_api.get_user(vk_id)
 
         async with self.app.database.session() as session:
             async with session.begin():
-                vk_user = await self.app.store.vk_api.get_user(vk_id)
-                vk_user_model = VKUserModel(
-                    vk_id=vk_id,
-                    name=vk_user.name,
-                    sex=vk_user.sex,
+                q = (
+                    insert(VKUserModel)
+                    .values(vk_id=vk_id, name=vk_user.name, sex=vk_user.sex)
+                    .on_conflict_do_update(
+                        index_elements=[VKUserModel.vk_id],
+                        set_={"name": vk_user.name, "sex": vk_user.sex},
+                    )
+                    .returning(VKUserModel)
                 )
-                session.add(vk_user_model)
+                result = await session.execute(q)
+                vk_user_model = result.scalars().one()
                 await session.commit()
 
         return vk_user_model
 
-    @catch_db_error
+    @db_read
     async def get_vk_user_by_vk_id(self, vk_id: int) -> VKUserModel | None:
         """возвращает модель пользователя вк по его id в вк"""
 
@@ -45,7 +87,52 @@ class GameAccessor(BaseAccessor):
 
         return vk_user
 
-    @catch_db_error
+    @db_read
+    async def get_vk_users_by_vk_ids(
+        self, vk_ids: list[int]
+    ) -> list[VKUserModel]:
+        """возвращает модели пользователей вк по их id в вк"""
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                q = select(VKUserModel).filter(VKUserModel.vk_id.in_(vk_ids))
+                result = await session.execute(q)
+                vk_users = result.scalars().all()
+
+        return vk_users
+
+    @db_write
+    async def update_vk_users(self, vk_users: list[VKUser]) -> None:
+        """обновляет имя и пол уже записанных пользователей вк
+        по свежим профилям из vk"""
+
+        if not vk_users:
+            return
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                profiles = values(
+                    column("vk_id", Integer),
+                    column("name", String),
+                    column("sex", String),
+                    name="profiles",
+                ).data(
+                    [
+                        (vk_user.vk_user_id, vk_user.name, vk_user.sex)
+                        for vk_user in vk_users
+                    ]
+                )
+
+                q = (
+                    update(VKUserModel)
+                    .where(VKUserModel.vk_id == profiles.c.vk_id)
+                    .values(name=profiles.c.name, sex=profiles.c.sex)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.execute(q)
+                await session.commit()
+
+    @db_read
     async def get_vk_user_by_player(self, player_id: int) -> VKUserModel | None:
         """возвращает модель пользователя вк"""
 
@@ -60,7 +147,7 @@ class GameAccessor(BaseAccessor):
         return vk_user
 
     # player
-    @catch_db_error
+    @db_write
     async def create_player(self, vk_id: int, game_id: int) -> PlayerModel:
         """создает и возвращает модель игрока"""
 
@@ -78,7 +165,7 @@ class GameAccessor(BaseAccessor):
 
         return player
 
-    @catch_db_error
+    @db_read
     async def get_player_by_id(self, player_id: int) -> PlayerModel | None:
         """возвращает модель игрока"""
 
@@ -88,9 +175,26 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 player = result.scalars().first()
 
-        return player
+        return self.active.apply_player(player)
+
+    @db_read
+    async def get_player_with_user(self, player_id: int) -> PlayerModel | None:
+        """возвращает модель игрока вместе с его пользователем вк
+        (player.vk_user) одним запросом"""
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                q = (
+                    select(PlayerModel)
+                    .filter_by(id=player_id)
+                    .options(joinedload(PlayerModel.vk_user))
+                )
+                result = await session.execute(q)
+                player = result.scalars().first()
+
+        return self.active.apply_player(player)
 
-    @catch_db_error
+    @db_read
     async def get_player_by_vk_and_game(
         self, vk_id: int, game_id: int
     ) -> PlayerModel | None:
@@ -106,9 +210,9 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 player = result.scalars().first()
 
-        return player
+        return self.active.apply_player(player)
 
-    @catch_db_error
+    @db_read
     async def get_players_of_user(self, vk_id: int) -> list[PlayerModel]:
         """возвращает все модели игрока, соответствующие одному пользователю vk"""
 
@@ -120,9 +224,9 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 players = result.scalars().all()
 
-        return players
+        return [self.active.apply_player(player) for player in players]
 
-    @catch_db_error
+    @db_write
     async def set_player_cash(
         self, player_id: int, new_cash: int = 1000
     ) -> None:
@@ -137,7 +241,7 @@ class GameAccessor(BaseAccessor):
                 )
                 await session.execute(q)
 
-    @catch_db_error
+    @db_write
     async def set_player_bet(self, player_id: int, new_bet: int | None) -> None:
         """меняет ставку игрока"""
 
@@ -150,7 +254,7 @@ class GameAccessor(BaseAccessor):
                 )
                 await session.execute(q)
 
-    @catch_db_error
+    @db_write
     async def set_player_state(self, player_id: int, is_active: bool) -> None:
         """меняет статус игрока - активный/неактивный"""
 
@@ -163,43 +267,23 @@ class GameAccessor(BaseAccessor):
                 )
                 await session.execute(q)
 
-    @catch_db_error
+    @db_write
     async def add_cards_to_player(
         self, player_id: int, cards: list[str]
     ) -> None:
         """добавляет в руку игрока переданные карты"""
 
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = select(PlayerModel).filter_by(id=player_id)
-                result = await session.execute(q)
-                player: PlayerModel = result.scalars().first()
-
-                new_hand = player.hand.copy()
-                for card in cards:
-                    new_hand["cards"].append(card)
-
-                q = (
-                    update(PlayerModel)
-                    .filter_by(id=player_id)
-                    .values(hand=new_hand)
-                )
-                await session.execute(q)
+        await self.active.add_cards(player_id, cards)
+        self.active.schedule_flush()
 
-    @catch_db_error
+    @db_write
     async def clear_player_hand(self, player_id: int) -> None:
         """опустошает руку игрока. в смысле, от карт"""
 
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = (
-                    update(PlayerModel)
-                    .filter_by(id=player_id)
-                    .values(hand={"cards": []})
-                )
-                await session.execute(q)
+        await self.active.clear_hand(player_id)
+        self.active.schedule_flush()
 
-    @catch_db_error
+    @db_write
     async def withdraw_bet_from_cash(self, vk_id: int, player_id: int) -> int:
         """уменьшает баланс игрока на его ставку, убирает ставку,
         возвращает сумму, оставшуюся на балансе игрока"""
@@ -223,7 +307,7 @@ class GameAccessor(BaseAccessor):
 
         return player.cash
 
-    @catch_db_error
+    @db_write
     async def add_bet_to_cash(
         self, vk_id: int, player_id: int, blackjack: bool = False
     ) -> None:
@@ -249,7 +333,7 @@ class GameAccessor(BaseAccessor):
                 player.bet = None
                 await session.commit()
 
-    @catch_db_error
+    @db_read
     async def get_players(self, game_id: int) -> list[PlayerModel]:
         """возвращает список всех игроков"""
 
@@ -259,9 +343,9 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 players = result.scalars().all()
 
-        return players
+        return [self.active.apply_player(player) for player in players]
 
-    @catch_db_error
+    @db_read
     async def get_active_players(self, game_id: int) -> list[PlayerModel]:
         """возвращает список игроков с is_active=True"""
 
@@ -273,9 +357,28 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 players = result.scalars().all()
 
-        return players
+        return [self.active.apply_player(player) for player in players]
+
+    @db_read
+    async def get_active_players_with_users(
+        self, game_id: int
+    ) -> list[PlayerModel]:
+        """возвращает список игроков с is_active=True
+        вместе с их пользователями вк (player.vk_user) одним запросом"""
 
-    @catch_db_error
+        async with self.app.database.session() as session:
+            async with session.begin():
+                q = (
+                    select(PlayerModel)
+                    .filter_by(game_id=game_id, is_active=True)
+                    .options(joinedload(PlayerModel.vk_user))
+                )
+                result = await session.execute(q)
+                players = result.scalars().all()
+
+        return [self.active.apply_player(player) for player in players]
+
+    @db_read
     async def count_losers(self, game_id: int) -> int:
         """возвращает количество игроков с cash = 0"""
 
@@ -291,7 +394,7 @@ class GameAccessor(BaseAccessor):
 
         return amount
 
-    @catch_db_error
+    @db_write
     async def add_game_played_to_player(self, player_id: int) -> None:
         """добавляет еще одну игру в статистику игрока"""
 
@@ -303,7 +406,7 @@ class GameAccessor(BaseAccessor):
                 player.games_played += 1
                 await session.commit()
 
-    @catch_db_error
+    @db_write
     async def add_game_win_to_player(self, player_id: int) -> None:
         """добавляет еще одну выигранную игру в статистику игрока"""
 
@@ -315,7 +418,7 @@ class GameAccessor(BaseAccessor):
                 player.games_won += 1
                 await session.commit()
 
-    @catch_db_error
+    @db_write
     async def add_game_loss_to_player(self, player_id: int) -> None:
         """добавляет еще одну проигранную игру в статистику игрока"""
 
@@ -328,7 +431,7 @@ class GameAccessor(BaseAccessor):
                 await session.commit()
 
     # chat
-    @catch_db_error
+    @db_write
     async def create_chat(self, vk_id: int) -> ChatModel:
         """создает и возвращает модель чата, vk_id = peer_id из vk"""
 
@@ -340,7 +443,7 @@ class GameAccessor(BaseAccessor):
 
         return chat
 
-    @catch_db_error
+    @db_read
     async def get_chat_by_vk_id(self, vk_id: int) -> ChatModel | None:
         """возвращает модель чата, vk_id = peer_id из vk"""
 
@@ -353,19 +456,50 @@ class GameAccessor(BaseAccessor):
 
         return chat
 
-    @catch_db_error
+    @db_read
     async def get_chat_by_game_id(self, game_id: int) -> ChatModel:
-        """возвращает модель чата"""
+        """возвращает модель чата.
+        чат известной игры ищется по первичному ключу"""
+
+        chat_id = self.game_chats.get(game_id)
 
         async with self.app.database.session() as session:
             async with session.begin():
-                q = select(ChatModel).filter(ChatModel.game.any(id=game_id))
+                if chat_id is not None:
+                    q = select(ChatModel).filter_by(id=chat_id)
+                else:
+                    q = (
+                        select(ChatModel)
+                        .join(ChatModel.game)
+                        .filter(GameModel.id == game_id)
+                    )
                 result = await session.execute(q)
                 chat = result.scalars().first()
 
+        if chat is not None:
+            self._remember_chat_game(chat.vk_id, chat.id, game_id)
+        elif chat_id is not None:
+            self.game_chats.pop(game_id, None)
+            return await self.get_chat_by_game_id(game_id)
+
         return chat
 
-    @catch_db_error
+    def _remember_chat_game(
+        self, vk_id: int, chat_id: int, game_id: int
+    ) -> None:
+        self.chat_games[vk_id] = (chat_id, game_id)
+        self.chat_games.move_to_end(vk_id)
+        self.game_chats[game_id] = chat_id
+
+        while len(self.chat_games) > self.app.config.game.chat_cache_size:
+            _, (_, evicted_game_id) = self.chat_games.popitem(last=False)
+            self.game_chats.pop(evicted_game_id, None)
+
+    def _forget_chat_game(self, vk_id: int) -> None:
+        _, game_id = self.chat_games.pop(vk_id)
+        self.game_chats.pop(game_id, None)
+
+    @db_write
     async def add_game_played_to_chat(self, vk_id: int) -> None:
         """добавляет еще одну игру в статистику чата"""
 
@@ -378,7 +512,7 @@ class GameAccessor(BaseAccessor):
                 await session.commit()
 
     # game
-    @catch_db_error
+    @db_write
     async def create_game(self, chat_id: int) -> GameModel:
         """создает и возвращает модель игры для чата"""
 
@@ -390,7 +524,7 @@ class GameAccessor(BaseAccessor):
 
         return game
 
-    @catch_db_error
+    @db_read
     async def get_game_by_chat_id(self, chat_id: int) -> GameModel | None:
         """возвращает модель игры"""
 
@@ -400,9 +534,9 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 game = result.scalars().first()
 
-        return game
+        return self.active.apply_game(game)
 
-    @catch_db_error
+    @db_read
     async def get_game_by_id(self, game_id: int) -> GameModel:
         """возвращает модель игры"""
 
@@ -412,21 +546,79 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 game = result.scalars().first()
 
-        return game
+        return self.active.apply_game(game)
 
-    @catch_db_error
+    @db_read
     async def get_game_by_vk_id(self, vk_id: int) -> GameModel | None:
-        """возвращает модель игры по peer_id из vk"""
+        """возвращает модель игры по peer_id из vk.
+        известная беседа ищется по первичному ключу игры"""
+
+        ids = self.chat_games.get(vk_id)
+        if ids is not None:
+            self.chat_games.move_to_end(vk_id)
+            game = await self.get_game_by_id(ids[1])
+            if game is not None:
+                return game
+            # игра из откаченной транзакции
+            self._forget_chat_game(vk_id)
 
         async with self.app.database.session() as session:
             async with session.begin():
-                q = select(GameModel).filter(GameModel.chat.has(vk_id=vk_id))
+                q = (
+                    select(GameModel)
+                    .join(GameModel.chat)
+                    .filter(ChatModel.vk_id == vk_id)
+                )
                 result = await session.execute(q)
                 game = result.scalars().first()
 
-        return game
+        if game is not None:
+            self._remember_chat_game(vk_id, game.chat_id, game.id)
+
+        return self.active.apply_game(game)
+
+    @db_read
+    async def get_game_context(self, vk_id: int, from_id: int) -> GameContext:
+        """одним запросом загружает беседу по peer_id, ее игру,
+        пользователя вк по from_id и его игрока в этой игре.
+        если беседа неизвестна - контекст пустой"""
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                q = (
+                    select(ChatModel, GameModel, VKUserModel, PlayerModel)
+                    .outerjoin(GameModel, GameModel.chat_id == ChatModel.id)
+                    .outerjoin(VKUserModel, VKUserModel.vk_id == from_id)
+                    .outerjoin(
+                        PlayerModel,
+                        and_(
+                            PlayerModel.game_id == GameModel.id,
+                            PlayerModel.user_id == VKUserModel.id,
+                        ),
+                    )
+                    .filter(ChatModel.vk_id == vk_id)
+                    .limit(1)
+                )
+                result = await session.execute(q)
+                row = result.first()
+
+        if row is None:
+            return GameContext()
 
-    @catch_db_error
+        chat, game, vk_user, player = row
+        if game is not None:
+            self._remember_chat_game(vk_id, chat.id, game.id)
+        if player is not None:
+            set_committed_value(player, "vk_user", vk_user)
+
+        return GameContext(
+            chat=chat,
+            game=self.active.apply_game(game),
+            vk_user=vk_user,
+            player=self.active.apply_player(player),
+        )
+
+    @db_read
     async def is_game_on(self, vk_id: int) -> bool:
         """предикат, проверяющий, в процессе ли игра в чате по peer_id из vk"""
 
@@ -434,20 +626,32 @@ class GameAccessor(BaseAccessor):
 
         return game and game.state != GameState.inactive
 
-    @catch_db_error
-    async def set_game_state(self, game_id: int, new_state: GameState) -> None:
-        """меняет статус игры"""
+    @db_write
+    async def set_game_state(
+        self,
+        game_id: int,
+        new_state: GameState,
+        deadline: datetime | None = None,
+    ) -> None:
+        """меняет статус игры и срок таймера новой стадии.
+        смена стадии сохраняется в бд сразу
+        вместе с накопленными изменениями хода игры"""
+
+        await self.active.set_game_fields(
+            game_id, state=new_state.name, deadline=deadline
+        )
+        await self.active.flush()
+
+    @db_write
+    async def set_game_deadline(
+        self, game_id: int, deadline: datetime | None
+    ) -> None:
+        """запоминает срок таймера хода в игре"""
 
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = (
-                    update(GameModel)
-                    .filter_by(id=game_id)
-                    .values(state=new_state.name)
-                )
-                await session.execute(q)
+        await self.active.set_game_fields(game_id, deadline=deadline)
+        self.active.schedule_flush()
 
-    @catch_db_error
+    @db_read
     async def get_active_games(self) -> list[GameModel]:
         """возвращает список активных игр"""
 
@@ -459,55 +663,42 @@ class GameAccessor(BaseAccessor):
                 result = await session.execute(q)
                 games = result.scalars().all()
 
-        return games
+        return [self.active.apply_game(game) for game in games]
 
-    @catch_db_error
+    @db_write
     async def set_current_player(
         self, game_id: int, player_id: int | None
     ) -> None:
-        """отмечает в базе, что сейчас ход переданного игрока"""
+        """отмечает, что сейчас ход переданного игрока.
+        срок хода прежнего игрока забывается"""
 
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = (
-                    update(GameModel)
-                    .filter_by(id=game_id)
-                    .values(current_player_id=player_id)
-                )
-                await session.execute(q)
+        await self.active.set_game_fields(
+            game_id, current_player_id=player_id, deadline=None
+        )
+        self.active.schedule_flush()
 
-    @catch_db_error
+    @db_write
     async def set_dealer_hand_and_points(
         self, game_id: int, cards: list[str], points: int | None
     ) -> None:
         """записывает набранные дилером карты и очки"""
 
-        new_hand = {"cards": cards}
-
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = (
-                    update(GameModel)
-                    .filter_by(id=game_id)
-                    .values(dealer_points=points, dealer_hand=new_hand)
-                )
-                await session.execute(q)
+        await self.active.set_game_fields(
+            game_id, dealer_hand={"cards": cards}, dealer_points=points
+        )
+        self.active.schedule_flush()
 
-    @catch_db_error
+    @db_write
     async def clear_dealer_hand_and_points(self, game_id: int) -> None:
         """опустошает руку дилера от карт и удаляет очки"""
 
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = (
-                    update(GameModel)
-                    .filter_by(id=game_id)
-                    .values(dealer_hand={"cards": []}, dealer_points=None)
-                )
-                await session.execute(q)
+        await self.active.set_game_fields(
+            game_id, dealer_hand={"cards": []}, dealer_points=None
+        )
+        self.active.schedule_flush()
 
     # global_settings
-    @catch_db_error
+    @db_write
     async def create_global_settings(self) -> None:
         async with self.app.database.session() as session:
             async with session.begin():
@@ -520,7 +711,7 @@ class GameAccessor(BaseAccessor):
                     session.add(global_settings)
                     await session.commit()
 
-    @catch_db_error
+    @db_read
     async def get_global_settings(self) -> GlobalSettingsModel | None:
         """возвращает модель глобальных настроек"""
 
@@ -532,7 +723,7 @@ class GameAccessor(BaseAccessor):
 
         return global_settings
 
-    @catch_db_error
+    @db_write
     async def set_start_cash(self, start_cash: int) -> None:
         """записывает число стартовых монет в бд"""
 
@@ -546,44 +737,94 @@ class GameAccessor(BaseAccessor):
                 await session.execute(q)
 
     # комплексные транзакции
-    @catch_db_error
-    async def set_player_win(
-        self, player_id: int, blackjack: bool = False
+    @db_write
+    async def settle_players(
+        self, game_id: int, outcomes: dict[int, PlayerOutcome]
     ) -> None:
-        """регистрирует победу игрока:
-        увеличивает баланс на ставку,
-        вносит инфо в статистику,
-        инактивирует игрока и очищает нужные поля"""
+        """подводит итоги раздачи для всех игроков разом:
+        меняет балансы на ставки по исходам, вносит инфо в статистику,
+        инактивирует игроков, очищает нужные поля
+        и переносит разницу в казну чата.
+        outcomes - исходы по id игроков"""
+
+        if not outcomes:
+            return
 
         async with self.app.database.session() as session:
             async with session.begin():
-                q = select(PlayerModel).filter_by(id=player_id)
+                q = (
+                    select(PlayerModel.id, PlayerModel.bet)
+                    .filter(PlayerModel.id.in_(outcomes))
+                    .with_for_update()
+                )
                 result = await session.execute(q)
-                player: PlayerModel = result.scalars().first()
 
-                q = select(ChatModel).filter(
-                    ChatModel.game.any(id=player.game_id)
+                rows = []
+                for player_id, bet in result.all():
+                    outcome = outcomes[player_id]
+                    rows.append(
+                        (
+                            player_id,
+                            self._cash_change(outcome, bet or 0),
+                            int(outcome in PAYOUTS),
+                            int(outcome == PlayerOutcome.loss),
+                        )
+                    )
+
+                settlement = values(
+                    column("player_id", Integer),
+                    column("cash_change", Integer),
+                    column("won", Integer),
+                    column("lost", Integer),
+                    name="settlement",
+                ).data(rows)
+
+                q = (
+                    update(PlayerModel)
+                    .where(PlayerModel.id == settlement.c.player_id)
+                    .values(
+                        cash=PlayerModel.cash + settlement.c.cash_change,
+                        bet=None,
+                        hand={"cards": []},
+                        is_active=False,
+                        games_played=PlayerModel.games_played + 1,
+                        games_won=PlayerModel.games_won + settlement.c.won,
+                        games_lost=PlayerModel.games_lost + settlement.c.lost,
+                    )
+                    .execution_options(synchronize_session="fetch")
                 )
-                result = await session.execute(q)
-                chat: ChatModel = result.scalars().first()
+                await session.execute(q)
 
-                if blackjack:
-                    player_bet = player.bet * 1.5
-                else:
-                    player_bet = player.bet
+                casino_change = -sum(row[1] for row in rows)
+                q = (
+                    update(ChatModel)
+                    .where(
+                        ChatModel.id
+                        == select(GameModel.chat_id)
+                        .filter_by(id=game_id)
+                        .scalar_subquery()
+                    )
+                    .values(casino_cash=ChatModel.casino_cash + casino_change)
+                    .execution_options(synchronize_session="fetch")
+                )
+                await session.execute(q)
 
-                chat.casino_cash -= player_bet
+        self.active.clear_cached_hands(outcomes)
+        self.active.schedule_flush()
 
-                player.cash += player_bet
-                player.bet = None
-                player.hand = {"cards": []}
-                player.is_active = False
-                player.games_played += 1
-                player.games_won += 1
+    @staticmethod
+    def _cash_change(outcome: PlayerOutcome, bet: int) -> int:
+        """изменение баланса игрока по исходу раздачи"""
 
-                await session.commit()
+        if outcome == PlayerOutcome.blackjack:
+            return bet * 3 // 2
+        if outcome == PlayerOutcome.win:
+            return bet
+        if outcome == PlayerOutcome.loss:
+            return -bet
+        return 0
 
-    @catch_db_error
+    @db_write
     async def set_player_loss(self, player_id: int) -> None:
         """регистрирует проигрыш игрока:
         уменьшает баланс на ставку,
@@ -613,21 +854,5 @@ class GameAccessor(BaseAccessor):
 
                 await session.commit()
 
-    @catch_db_error
-    async def set_player_draw(self, player_id: int) -> None:
-        """регистрирует ничью:
-        вносит инфо в статистику,
-        инактивирует игрока и очищает нужные поля"""
-
-        async with self.app.database.session() as session:
-            async with session.begin():
-                q = select(PlayerModel).filter_by(id=player_id)
-                result = await session.execute(q)
-                player: PlayerModel = result.scalars().first()
-
-                player.bet = None
-                player.hand = {"cards": []}
-                player.is_active = False
-                player.games_played += 1
-
-                await session.commit()
+        self.active.clear_cached_hands([player_id])
+        self.active.schedule_flush()
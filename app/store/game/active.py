@@ -0,0 +1,419 @@
+import typing
+from asyncio import TimerHandle, create_task, get_running_loop
+from copy import deepcopy
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import getLogger
+from typing import Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.game.models import GameModel, PlayerModel
+from app.game.states import GameState
+from app.store.database.profiler import query_source
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+@dataclass
+class ActiveGame:
+    """изменяемые по ходу раздачи поля игры"""
+
+    game_id: int
+    state: str
+    current_player_id: Optional[int]
+    dealer_hand: dict
+    dealer_points: Optional[int]
+    deadline: Optional[datetime]
+    version: int = 0
+    flushed_version: int = 0
+
+
+@dataclass
+class ActiveHand:
+    """рука игрока в идущей игре"""
+
+    player_id: int
+    game_id: int
+    hand: dict
+    version: int = 0
+    flushed_version: int = 0
+
+
+@dataclass
+class Snapshot:
+    """записи, которые меняла единица работы, в том виде,
+    в каком они были до первого изменения. None - записи
+    в памяти не было, ее загрузила сама единица работы"""
+
+    games: dict[int, Optional[ActiveGame]] = field(default_factory=dict)
+    hands: dict[int, Optional[ActiveHand]] = field(default_factory=dict)
+
+
+class ActiveGames:
+    """состояние идущих игр в памяти: стадия, срок ее таймера,
+    текущий игрок, рука дилера и руки игроков. память - источник истины для этих полей,
+    бд догоняет ее с задержкой не больше game.write_behind_delay,
+    а при смене стадии и при выключении - сразу.
+    запись считается сохраненной только после commit ее транзакции.
+    изменения единицы работы живут в памяти вместе с ее транзакцией:
+    чужие сохранения их не пишут, а при откате они возвращаются
+    к снимку, сделанному до первого изменения"""
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.games: dict[int, ActiveGame] = {}
+        self.hands: dict[int, ActiveHand] = {}
+        self.flush_handle: Optional[TimerHandle] = None
+        # снимки открытых единиц работы по их сессиям
+        self.snapshots: dict[Session, Snapshot] = {}
+        self.logger = getLogger("active games")
+
+        self.flushes: int = 0
+        self.rows_written: int = 0
+
+    # запись
+    async def set_game_fields(self, game_id: int, **fields) -> None:
+        """меняет поля игры в памяти"""
+
+        self._touch_game(game_id)
+        game = await self._game(game_id)
+        for name, value in fields.items():
+            setattr(game, name, value)
+        game.version += 1
+
+    async def add_cards(self, player_id: int, cards: list[str]) -> None:
+        """добавляет карты в руку игрока в памяти"""
+
+        self._touch_hand(player_id)
+        active_hand = await self._hand(player_id)
+        active_hand.hand = {"cards": [*active_hand.hand["cards"], *cards]}
+        active_hand.version += 1
+
+    async def clear_hand(self, player_id: int) -> None:
+        """опустошает руку игрока в памяти"""
+
+        self._touch_hand(player_id)
+        active_hand = await self._hand(player_id)
+        active_hand.hand = {"cards": []}
+        active_hand.version += 1
+
+    def clear_cached_hands(self, player_ids: typing.Iterable[int]) -> None:
+        """опустошает руки игроков, если они есть в памяти.
+        для итогов раздачи, которые очищают руки в бд сами"""
+
+        for player_id in player_ids:
+            active_hand = self.hands.get(player_id)
+            if active_hand:
+                self._touch_hand(player_id)
+                active_hand.hand = {"cards": []}
+                active_hand.version += 1
+
+    def evict(self, game_ids: typing.Iterable[int]) -> None:
+        """забывает игры и руки их игроков, не сохраняя:
+        их состояние теперь ведет другой процесс"""
+
+        game_ids = set(game_ids)
+        for game_id in game_ids:
+            self.games.pop(game_id, None)
+        for player_id, active_hand in list(self.hands.items()):
+            if active_hand.game_id in game_ids:
+                del self.hands[player_id]
+
+    # единицы работы
+    def _snapshot(self) -> Optional[Snapshot]:
+        """снимок текущей единицы работы, вне ее - None"""
+
+        database = self.app.database
+        if not database.in_unit_of_work():
+            return None
+
+        session: Session = database.session().sync_session
+        snapshot = self.snapshots.get(session)
+        if snapshot is None:
+            snapshot = self.snapshots[session] = Snapshot()
+            event.listen(
+                session, "after_commit", lambda _: self._committed(session)
+            )
+            event.listen(
+                session,
+                "after_transaction_end",
+                lambda _, transaction: self._ended(session, transaction),
+            )
+
+        return snapshot
+
+    def _touch_game(self, game_id: int) -> None:
+        snapshot = self._snapshot()
+        if snapshot is not None and game_id not in snapshot.games:
+            snapshot.games[game_id] = deepcopy(self.games.get(game_id))
+
+    def _touch_hand(self, player_id: int) -> None:
+        snapshot = self._snapshot()
+        if snapshot is not None and player_id not in snapshot.hands:
+            snapshot.hands[player_id] = deepcopy(self.hands.get(player_id))
+
+    def _locked(self) -> tuple[set[int], set[int]]:
+        """игры и руки, измененные чужими открытыми единицами работы"""
+
+        own = None
+        if self.app.database.in_unit_of_work():
+            own = self.app.database.session().sync_session
+
+        games, hands = set(), set()
+        for session, snapshot in self.snapshots.items():
+            if session is not own:
+                games.update(snapshot.games)
+                hands.update(snapshot.hands)
+
+        return games, hands
+
+    def _committed(self, session: Session) -> None:
+        """изменения единицы работы зафиксированы, снимок не нужен"""
+
+        snapshot = self.snapshots.pop(session, None)
+        if snapshot and (snapshot.games or snapshot.hands):
+            # сохранения, пропустившие эти записи, их уже не допишут
+            self.schedule_flush()
+
+    def _ended(self, session: Session, transaction: SessionTransaction) -> None:
+        """транзакция единицы работы закончилась без commit - откат"""
+
+        if transaction.parent is not None:
+            return
+
+        snapshot = self.snapshots.pop(session, None)
+        if snapshot is None:
+            return
+
+        for game_id, game in snapshot.games.items():
+            self._restore(self.games, game_id, game)
+        for player_id, hand in snapshot.hands.items():
+            self._restore(self.hands, player_id, hand)
+
+        self.schedule_flush()
+
+    @staticmethod
+    def _restore(
+        entries: dict,
+        key: int,
+        entry: Optional[typing.Union[ActiveGame, ActiveHand]],
+    ) -> None:
+        """возвращает запись к снимку. запись, загруженную
+        единицей работы, забывает - ее перечитают из бд"""
+
+        current = entries.pop(key, None)
+        if entry is None:
+            return
+
+        if current is not None:
+            entry.flushed_version = current.flushed_version
+        entries[key] = entry
+
+    # чтение
+    def apply_game(self, game: Optional[GameModel]) -> Optional[GameModel]:
+        """накладывает на модель игры ее состояние из памяти"""
+
+        active_game = self.games.get(game.id) if game else None
+
+        if active_game:
+            set_committed_value(game, "state", active_game.state)
+            set_committed_value(
+                game, "current_player_id", active_game.current_player_id
+            )
+            set_committed_value(
+                game, "dealer_hand", deepcopy(active_game.dealer_hand)
+            )
+            set_committed_value(
+                game, "dealer_points", active_game.dealer_points
+            )
+            set_committed_value(game, "deadline", active_game.deadline)
+
+        return game
+
+    def apply_player(
+        self, player: Optional[PlayerModel]
+    ) -> Optional[PlayerModel]:
+        """накладывает на модель игрока его руку из памяти"""
+
+        active_hand = self.hands.get(player.id) if player else None
+
+        if active_hand:
+            set_committed_value(player, "hand", deepcopy(active_hand.hand))
+
+        return player
+
+    # сохранение
+    def schedule_flush(self) -> None:
+        """сохраняет изменения не позже чем через write_behind_delay"""
+
+        if self.flush_handle is not None:
+            return
+
+        self.flush_handle = get_running_loop().call_later(
+            self.app.config.game.write_behind_delay,
+            lambda: create_task(self._scheduled_flush()),
+        )
+
+    async def _scheduled_flush(self) -> None:
+        self.flush_handle = None
+        try:
+            await self.flush()
+        except Exception as error:
+            self.logger.error("Exception", exc_info=error)
+            self.schedule_flush()
+
+    @query_source
+    async def flush(self) -> None:
+        """записывает в бд все несохраненные изменения одной транзакцией.
+        внутри единицы работы - ее транзакцией.
+        изменения чужих открытых единиц работы пропускаются"""
+
+        locked_games, locked_hands = self._locked()
+        games = [
+            (game, game.version)
+            for game in self.games.values()
+            if game.version != game.flushed_version
+            and game.game_id not in locked_games
+        ]
+        hands = [
+            (hand, hand.version)
+            for hand in self.hands.values()
+            if hand.version != hand.flushed_version
+            and hand.player_id not in locked_hands
+        ]
+
+        if not games and not hands:
+            return
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                event.listen(
+                    session.sync_session,
+                    "after_commit",
+                    lambda _: self._flushed(games, hands),
+                    once=True,
+                )
+
+                if games:
+                    await session.execute(
+                        update(GameModel),
+                        [
+                            {
+                                "id": game.game_id,
+                                "state": game.state,
+                                "current_player_id": game.current_player_id,
+                                "dealer_hand": game.dealer_hand,
+                                "dealer_points": game.dealer_points,
+                                "deadline": game.deadline,
+                            }
+                            for game, _ in games
+                        ],
+                    )
+
+                if hands:
+                    await session.execute(
+                        update(PlayerModel),
+                        [
+                            {"id": hand.player_id, "hand": hand.hand}
+                            for hand, _ in hands
+                        ],
+                    )
+
+                await session.commit()
+
+    def _flushed(
+        self,
+        games: list[tuple[ActiveGame, int]],
+        hands: list[tuple[ActiveHand, int]],
+    ) -> None:
+        """отмечает записанное сохраненным, закончившиеся игры забывает"""
+
+        self.flushes += 1
+        self.rows_written += len(games) + len(hands)
+
+        for hand, version in hands:
+            hand.flushed_version = max(hand.flushed_version, version)
+
+        for game, version in games:
+            game.flushed_version = max(game.flushed_version, version)
+
+            if (
+                game.state == GameState.inactive
+                and game.version == game.flushed_version
+            ):
+                self._evict(game.game_id)
+
+    def _evict(self, game_id: int) -> None:
+        """забывает закончившуюся игру и сохраненные руки ее игроков"""
+
+        self.games.pop(game_id, None)
+
+        for player_id, hand in list(self.hands.items()):
+            if hand.game_id not in self.games and (
+                hand.version == hand.flushed_version
+            ):
+                del self.hands[player_id]
+
+    # загрузка
+    @query_source
+    async def _game(self, game_id: int) -> ActiveGame:
+        game = self.games.get(game_id)
+        if game:
+            return game
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                q = select(GameModel).filter_by(id=game_id)
+                result = await session.execute(q)
+                model: GameModel = result.scalars().first()
+
+        # пока шла загрузка, игру могли загрузить параллельно
+        return self.games.setdefault(
+            game_id,
+            ActiveGame(
+                game_id=model.id,
+                state=model.state,
+                current_player_id=model.current_player_id,
+                dealer_hand=model.dealer_hand,
+                dealer_points=model.dealer_points,
+                deadline=model.deadline,
+            ),
+        )
+
+    @query_source
+    async def _hand(self, player_id: int) -> ActiveHand:
+        hand = self.hands.get(player_id)
+        if hand:
+            return hand
+
+        async with self.app.database.session() as session:
+            async with session.begin():
+                q = select(PlayerModel).filter_by(id=player_id)
+                result = await session.execute(q)
+                model: PlayerModel = result.scalars().first()
+
+        return self.hands.setdefault(
+            player_id,
+            ActiveHand(
+                player_id=model.id,
+                game_id=model.game_id,
+                hand=deepcopy(model.hand),
+            ),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "games": len(self.games),
+            "hands": len(self.hands),
+            "dirty": sum(
+                1
+                for entry in (*self.games.values(), *self.hands.values())
+                if entry.version != entry.flushed_version
+            ),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
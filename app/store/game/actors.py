@@ -0,0 +1,147 @@
+import asyncio
+from asyncio import Future, Semaphore, Task, create_task, current_task
+from collections import deque
+from collections.abc import Awaitable, Callable
+from contextvars import Context
+from logging import getLogger
+from typing import Any, Optional, TypeVar
+
+T = TypeVar("T")
+
+Action = Callable[[], Awaitable[Any]]
+
+
+class ActorsClosed(Exception):
+    """акторы остановлены: новые письма не принимаются"""
+
+
+class GameActors:
+    """акторы бесед: у каждой беседы свой почтовый ящик, команды игроков
+    и сроки таймеров ее игры выполняются из него строго по одному.
+    разные беседы обслуживаются параллельно, но одновременно
+    выполняется не больше concurrency действий.
+    актор живет, пока в его ящике есть письма.
+    после close письма не принимаются"""
+
+    def __init__(self, concurrency: int):
+        self.closed = False
+        self.mailboxes: dict[int, deque[tuple[Action, Optional[Future]]]] = {}
+        self.workers: dict[int, Task] = {}
+        self.semaphore = Semaphore(concurrency)
+        self.logger = getLogger("game actors")
+
+        self.processed: int = 0
+        self.failed: int = 0
+        self.waiting: int = 0
+        self.peak_depth: int = 0
+
+    async def ask(self, peer_id: int, action: Callable[[], Awaitable[T]]) -> T:
+        """выполняет действие в акторе беседы и возвращает его результат.
+        изнутри того же актора действие выполняется сразу.
+        после close - ActorsClosed"""
+
+        if current_task() is self.workers.get(peer_id):
+            return await action()
+
+        future = asyncio.get_running_loop().create_future()
+        self._put(peer_id, action, future)
+        return await future
+
+    def tell(self, peer_id: int, action: Action) -> None:
+        """ставит действие в ящик беседы, не дожидаясь его выполнения.
+        ошибка действия только логируется, после close действие
+        отбрасывается"""
+
+        try:
+            self._put(peer_id, action, None)
+        except ActorsClosed:
+            self.logger.warning(f"actors closed, dropped, peer_id={peer_id}")
+
+    def _put(
+        self, peer_id: int, action: Action, future: Optional[Future]
+    ) -> None:
+        if self.closed:
+            raise ActorsClosed(f"peer_id={peer_id}")
+
+        mailbox = self.mailboxes.setdefault(peer_id, deque())
+        mailbox.append((action, future))
+        self.peak_depth = max(self.peak_depth, len(mailbox))
+
+        if peer_id not in self.workers:
+            # у актора свой контекст: переменные контекста того,
+            # кто первым написал в ящик, не протекают в чужие письма
+            self.workers[peer_id] = create_task(
+                self._work(peer_id), context=Context()
+            )
+
+    async def _work(self, peer_id: int) -> None:
+        """выполняет письма беседы по одному, пока ящик не опустеет"""
+
+        mailbox = self.mailboxes[peer_id]
+        try:
+            while mailbox:
+                action, future = mailbox.popleft()
+                if future is not None and future.cancelled():
+                    continue
+
+                try:
+                    self.waiting += 1
+                    try:
+                        await self.semaphore.acquire()
+                    finally:
+                        self.waiting -= 1
+
+                    try:
+                        result = await action()
+                    finally:
+                        self.semaphore.release()
+                except asyncio.CancelledError:
+                    # письмо уже вынуто из ящика: его ждущий узнает
+                    # об отмене, даже если она пришла до выполнения
+                    if future is not None:
+                        future.cancel()
+                    raise
+                except Exception as error:
+                    self.failed += 1
+                    if future is None:
+                        self.logger.error("Exception", exc_info=error)
+                    elif not future.done():
+                        future.set_exception(error)
+                else:
+                    self.processed += 1
+                    if future is not None and not future.done():
+                        future.set_result(result)
+        finally:
+            for _, future in mailbox:
+                if future is not None:
+                    future.cancel()
+            del self.workers[peer_id]
+            del self.mailboxes[peer_id]
+
+    async def close(self, timeout: float = 10) -> None:
+        """перестает принимать письма, дожидается разбора ящиков,
+        по таймауту отменяет оставшееся"""
+
+        self.closed = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.workers and loop.time() < deadline:
+            await asyncio.wait(
+                list(self.workers.values()), timeout=deadline - loop.time()
+            )
+
+        for task in list(self.workers.values()):
+            task.cancel()
+
+    def stats(self) -> dict:
+        depths = [len(mailbox) for mailbox in self.mailboxes.values()]
+        return {
+            "actors": len(self.workers),
+            "pending": sum(depths),
+            "max_depth": max(depths, default=0),
+            "peak_depth": self.peak_depth,
+            "waiting": self.waiting,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
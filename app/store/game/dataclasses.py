@@ -1,8 +1,31 @@
-from asyncio import Task
+from collections.abc import Awaitable, Callable
 from dataclasses import dataclass
+from typing import Any
+
+from app.game.models import ChatModel, GameModel, PlayerModel, VKUserModel
+from app.game.states import GameState
 
 
 @dataclass
-class GameWaitTask:
+class GameDeadline:
+    """срок таймера игры на колесе GameTimerManager"""
+
     game_id: int
-    timer: Task
+    vk_id: int
+    tick: int
+    callback: Callable[[int, int], Awaitable[Any]]
+
+
+@dataclass
+class GameContext:
+    """беседа, ее игра, написавший пользователь вк и его игрок в этой игре.
+    загружается одним запросом на update и передается в обработчик"""
+
+    chat: ChatModel | None = None
+    game: GameModel | None = None
+    vk_user: VKUserModel | None = None
+    player: PlayerModel | None = None
+
+    @property
+    def game_is_on(self) -> bool:
+        return self.game is not None and self.game.state != GameState.inactive
@@ -1,27 +1,27 @@
 import typing
 
-from sqlalchemy.exc import OperationalError
-
 from app.game.states import GameState
+from app.store.database.profiler import query_source
+from app.store.game.dataclasses import GameContext
 from app.store.vk_api.dataclasses import Update
 
 if typing.TYPE_CHECKING:
     from app.store.game.accessor import GameAccessor
-    from app.store.game.manager import GameManager
+    from app.store.game.handler import GameHandler
 
 
 def game_must_be_on(method):
     """если активной игры в этом чате не ведется -
     отменяет выполнение метода и посылает соответствующее уведомление"""
 
-    async def wrapper(self: "GameManager", update: Update, *args, **kwargs):
-        game_is_on = await self.app.store.game.is_game_on(update.peer_id)
-
-        if not game_is_on:
+    async def wrapper(
+        self: "GameHandler", update: Update, ctx: GameContext, *args, **kwargs
+    ):
+        if not ctx.game_is_on:
             await self.notifier.game_is_off(peer_id=update.peer_id)
             return
 
-        return await method(self, update, *args, **kwargs)
+        return await method(self, update, ctx, *args, **kwargs)
 
     return wrapper
 
@@ -29,13 +29,13 @@ def game_must_be_on(method):
 def game_must_be_off(method):
     """если в чате ведется игра - отменяет выполнение метода"""
 
-    async def wrapper(self: "GameManager", update: Update, *args, **kwargs):
-        game_is_on = await self.app.store.game.is_game_on(update.peer_id)
-
-        if game_is_on:
+    async def wrapper(
+        self: "GameHandler", update: Update, ctx: GameContext, *args, **kwargs
+    ):
+        if ctx.game_is_on:
             return
 
-        return await method(self, update, *args, **kwargs)
+        return await method(self, update, ctx, *args, **kwargs)
 
     return wrapper
 
@@ -45,27 +45,56 @@ def game_must_be_on_state(*states: GameState):
     и посылает соответствующее уведомление"""
 
     def decorator(method):
-        async def wrapper(self: "GameManager", update: Update, *args, **kwargs):
-            game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-
-            if game.state not in states:
+        async def wrapper(
+            self: "GameHandler",
+            update: Update,
+            ctx: GameContext,
+            *args,
+            **kwargs,
+        ):
+            if ctx.game.state not in states:
                 await self.notifier.wrong_state(peer_id=update.peer_id)
                 return
 
-            return await method(self, update, *args, **kwargs)
+            return await method(self, update, ctx, *args, **kwargs)
 
         return wrapper
 
     return decorator
 
 
-def catch_db_error(method):
+def db_read(method):
+    """чтение из бд: при сбое соединения повторяется с задержкой.
+    внутри единицы работы не повторяется - сбой прерывает ее целиком.
+    запросы метода попадают в профиль под его именем"""
+
+    method = query_source(method)
+
     async def wrapper(self: "GameAccessor", *args, **kwargs):
-        try:
+        database = self.app.database
+        if database.in_unit_of_work():
             return await method(self, *args, **kwargs)
-        except OperationalError:
+
+        return await database.retry.run(lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+
+def db_write(method):
+    """запись в бд: не повторяется, но учитывается предохранителем.
+    запросы метода попадают в профиль под его именем"""
+
+    method = query_source(method)
+
+    async def wrapper(self: "GameAccessor", *args, **kwargs):
+        database = self.app.database
+        if database.in_unit_of_work():
             return await method(self, *args, **kwargs)
 
+        return await database.retry.run(
+            lambda: method(self, *args, **kwargs), retry=False
+        )
+
     return wrapper
 
 
@@ -2,6 +2,7 @@ import typing
 from logging import getLogger
 
 from app.game.states import GameState
+from app.store.game.dataclasses import GameContext
 from app.store.game.decks import EndlessDeck
 from app.store.game.decorators import (
     game_must_be_off,
@@ -27,32 +28,34 @@ class GameHandler:
         self.logger = getLogger("game handler")
 
     @game_must_be_off
-    async def send_game_offer(self, update: Update) -> None:
+    async def send_game_offer(self, update: Update, ctx: GameContext) -> None:
         """отправляет предложение поиграть"""
 
-        chat = await self.app.store.game.get_chat_by_vk_id(update.peer_id)
+        chat = ctx.chat
         if chat and chat.games_played:
             await self.notifier.game_offer(update.peer_id, again=True)
         else:
             await self.notifier.game_offer(update.peer_id)
 
     @game_must_be_off
-    async def start_game(self, update: Update) -> None:
+    async def start_game(self, update: Update, ctx: GameContext) -> None:
         """обработка запроса на старт игры"""
 
-        chat = await self.app.store.game.get_chat_by_vk_id(update.peer_id)
+        chat = ctx.chat
 
         if not chat:
             chat = await self.app.store.game.create_chat(update.peer_id)
             game = await self.app.store.game.create_game(chat.id)
         else:
-            game = await self.app.store.game.get_game_by_chat_id(chat.id)
+            game = ctx.game
 
-        chat_users = await self.app.store.vk_api.get_chat_users(update.peer_id)
+        chat_users_count = await self.app.store.vk_api.get_chat_members_count(
+            update.peer_id
+        )
 
-        if chat_users:
+        if chat_users_count:
             num_of_losers = await self.app.store.game.count_losers(game.id)
-            if len(chat_users) == num_of_losers:
+            if chat_users_count == num_of_losers:
                 await self.notifier.all_losers(update.peer_id)
                 return
 
@@ -60,20 +63,13 @@ class GameHandler:
 
     @game_must_be_on
     @game_must_be_on_state(GameState.gathering)
-    async def register_player(self, update: Update) -> None:
+    async def register_player(self, update: Update, ctx: GameContext) -> None:
         """регистрирует пользователя в качестве игрока"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-
-        # TODO сделать как транзакции
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        game, player = ctx.game, ctx.player
 
         if not player:
-            vk_user = await self.app.store.game.get_vk_user_by_vk_id(
-                update.from_id
-            )
+            vk_user = ctx.vk_user
             if not vk_user:
                 vk_user = await self.app.store.game.create_vk_user(
                     update.from_id
@@ -85,7 +81,7 @@ class GameHandler:
             await self.notifier.start_cash_given(update.peer_id, vk_user.name)
 
         else:
-            vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
+            vk_user = ctx.vk_user
 
             if player.cash == 0:
                 await self.notifier.no_cash_to_play(
@@ -106,7 +102,7 @@ class GameHandler:
         all_play = await self._is_all_play(update.peer_id, game.id)
 
         if all_play:
-            await self.app.store.game_manager.timer.end_timer(game.id)
+            self.app.store.game_manager.timer.end_timer(game.id)
 
             losers = await self.app.store.game.count_losers(game.id)
             await self.notifier.all_play(update.peer_id, losers)
@@ -120,8 +116,10 @@ class GameHandler:
         у которых остался cash, согласились играть"""
         # TODO учитывать нажавших "пас"
 
-        chat_users = await self.app.store.vk_api.get_chat_users(vk_chat_id)
-        if not chat_users:
+        chat_users_count = await self.app.store.vk_api.get_chat_members_count(
+            vk_chat_id
+        )
+        if not chat_users_count:
             return False
 
         active_players = await self.app.store.game.get_active_players(game_id)
@@ -130,18 +128,14 @@ class GameHandler:
 
         losers = await self.app.store.game.count_losers(game_id)
 
-        return len(active_players) == (len(chat_users) - losers)
+        return len(active_players) == (chat_users_count - losers)
 
     @game_must_be_on
     @game_must_be_on_state(GameState.gathering, GameState.betting)
-    async def unregister_player(self, update: Update) -> None:
+    async def unregister_player(self, update: Update, ctx: GameContext) -> None:
         """отмечает игрока как неактивного"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        game, player = ctx.game, ctx.player
 
         if not player:
             vk_user = await self.app.store.vk_api.get_user(update.from_id)
@@ -155,23 +149,20 @@ class GameHandler:
 
         await self.app.store.game.set_player_state(player.id, False)
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
+        vk_user = ctx.vk_user
         await self.notifier.player_unregistered(update.peer_id, vk_user.name)
 
     @game_must_be_on
     @game_must_be_on_state(GameState.betting)
-    async def accept_bet(self, update: Update) -> None:
+    async def accept_bet(self, update: Update, ctx: GameContext) -> None:
         """проверяет и регистрирует ставку игрока"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        game, player = ctx.game, ctx.player
 
         if not player or not player.is_active:
             return
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
+        vk_user = ctx.vk_user
 
         if player.bet:
             await self.notifier.bet_accepted_already(
@@ -198,7 +189,7 @@ class GameHandler:
         active_players = await self.app.store.game.get_active_players(game.id)
 
         if all(player.bet for player in active_players):
-            await self.app.store.game_manager.timer.end_timer(game.id)
+            self.app.store.game_manager.timer.end_timer(game.id)
             await self.notifier.all_bets_placed(update.peer_id)
             await self.app.store.game_manager.start_dealing(
                 update.peer_id, game.id
@@ -206,13 +197,10 @@ class GameHandler:
 
     @game_must_be_on
     @game_must_be_on_state(GameState.dealing_players)
-    async def deal_more_card(self, update: Update) -> None:
+    async def deal_more_card(self, update: Update, ctx: GameContext) -> None:
         """останавливает таймер и выдает игроку еще одну карту"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        game, player = ctx.game, ctx.player
 
         if not player:
             vk_user = await self.app.store.vk_api.get_user(update.from_id)
@@ -220,25 +208,24 @@ class GameHandler:
             return
 
         if game.current_player_id != player.id:
-            vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
+            vk_user = ctx.vk_user
             await self.notifier.not_your_turn(update.peer_id, vk_user.name)
             return
 
-        await self.app.store.game_manager.timer.end_timer(game.id)
+        self.app.store.game_manager.timer.end_timer(game.id)
         await self.app.store.game_manager.deal_cards_to_player(
             1, update.peer_id, game.id, player.id
         )
 
     @game_must_be_on
     @game_must_be_on_state(GameState.dealing_players)
-    async def stop_dealing_cards(self, update: Update) -> None:
+    async def stop_dealing_cards(
+        self, update: Update, ctx: GameContext
+    ) -> None:
         """останавливает раздачу карт игроку,
         останавливает таймер и передает ход следующему"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        game, player = ctx.game, ctx.player
 
         if not player:
             vk_user = await self.app.store.vk_api.get_user(update.from_id)
@@ -246,52 +233,47 @@ class GameHandler:
             return
 
         if game.current_player_id != player.id:
-            vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
+            vk_user = ctx.vk_user
             await self.notifier.not_your_turn(update.peer_id, vk_user.name)
             return
 
-        await self.app.store.game_manager.timer.end_timer(game.id)
+        self.app.store.game_manager.timer.end_timer(game.id)
         await self.app.store.game_manager.set_next_player_turn(
             update.peer_id, game.id
         )
 
     @game_must_be_on
-    async def send_player_hand(self, update: Update) -> None:
+    async def send_player_hand(self, update: Update, ctx: GameContext) -> None:
         """отправляет в чат информацию о картах в руке игрока"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        player = ctx.player
         if not player:
             vk_user = await self.app.store.vk_api.get_user(update.from_id)
             hand = []
         else:
-            vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
+            vk_user = ctx.vk_user
             hand = player.hand["cards"]
 
         await self.notifier.player_hand(update.peer_id, vk_user.name, hand)
 
-    async def send_player_cash(self, update: Update) -> None:
+    async def send_player_cash(self, update: Update, ctx: GameContext) -> None:
         """отправляет в чат информацию о балансе игрока, сделавшего такой запрос"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
-        player = await self.app.store.game.get_player_by_vk_and_game(
-            update.from_id, game.id
-        )
+        player = ctx.player
 
         if not player:
             vk_user = await self.app.store.vk_api.get_user(update.from_id)
             await self.notifier.not_a_player_cash(update.peer_id, vk_user.name)
             return
 
-        if player.bet:
-            player.cash -= player.bet
+        # модель привязана к сессии единицы работы: ее нельзя менять
+        # ради сообщения, иначе изменение сохранится в бд
+        cash = player.cash - (player.bet or 0)
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
-        await self.notifier.show_cash(update.peer_id, vk_user.name, player.cash)
+        vk_user = ctx.vk_user
+        await self.notifier.show_cash(update.peer_id, vk_user.name, cash)
 
-    async def send_game_rules(self, update: Update) -> None:
+    async def send_game_rules(self, update: Update, ctx: GameContext) -> None:
         """отправляет в чат описание правил игры"""
 
         vk_user = await self.app.store.vk_api.get_user(update.from_id)
@@ -302,10 +284,10 @@ class GameHandler:
 
     @game_must_be_on
     @game_must_be_on_state(GameState.gathering, GameState.betting)
-    async def abort_game(self, update: Update) -> None:
+    async def abort_game(self, update: Update, ctx: GameContext) -> None:
         """отменяет игру"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
+        game = ctx.game
         await self.app.store.game_manager.inactivate_game(game.id)
 
         causer = await self.app.store.vk_api.get_user(update.from_id)
@@ -315,27 +297,29 @@ class GameHandler:
     @game_must_be_on_state(
         GameState.dealing_players, GameState.dealing_dealer, GameState.results
     )
-    async def cancel_game(self, update: Update) -> None:
+    async def cancel_game(self, update: Update, ctx: GameContext) -> None:
         """досрочно останавливает игру"""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
+        game = ctx.game
         await self.app.store.game_manager.inactivate_game(game.id)
 
         causer = await self.app.store.vk_api.get_user(update.from_id)
         await self.notifier.game_canceled(update.peer_id, causer.name)
 
-    async def send_statistic(self, update: Update) -> None:
+    async def send_statistic(self, update: Update, ctx: GameContext) -> None:
         """обрабатывает запрос статистики"""
 
         await self.app.store.game_manager.send_statistic(
             update.peer_id, update.from_id
         )
 
-    async def send_restore_command(self, update: Update) -> None:
+    async def send_restore_command(
+        self, update: Update, ctx: GameContext
+    ) -> None:
         """отправляет команду для восстановления cash у всех игроков.
         но только если есть хотя бы один проигравшийся."""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
+        game = ctx.game
         losers = await self.app.store.game.count_losers(game.id)
 
         if losers:
@@ -344,11 +328,13 @@ class GameHandler:
                 update.peer_id, vk_user.name, vk_user.sex
             )
 
-    async def restore_game_and_cash(self, update: Update) -> None:
+    async def restore_game_and_cash(
+        self, update: Update, ctx: GameContext
+    ) -> None:
         """инактивирует игру и делает cash игроков стартовым.
         но только если есть хотя бы один проигравшийся."""
 
-        game = await self.app.store.game.get_game_by_vk_id(update.peer_id)
+        game = ctx.game
         losers = await self.app.store.game.count_losers(game.id)
 
         if not losers:
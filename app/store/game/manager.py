@@ -1,13 +1,21 @@
 import random
 import typing
-from asyncio import create_task
+from asyncio import gather
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from logging import getLogger
+from typing import Any, Optional
 
-from app.game.models import GameModel
-from app.game.states import GameState
+from app.game.models import GameModel, PlayerModel
+from app.game.states import GameState, PlayerOutcome
+from app.store.database.retry import DatabaseUnavailable
+from app.store.game.actors import GameActors
 from app.store.game.decks import EndlessDeck
 from app.store.game.notifications import GameNotifier
 from app.store.game.timer import GameTimerManager
+from app.store.vk_api.shards import shard_of
+from app.web.roles import Role
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
@@ -18,11 +26,15 @@ class GameManager:
 
     def __init__(self, app: "Application"):
         self.app = app
-        app.on_startup.append(self.connect)
         app.on_shutdown.append(self.disconnect)
         self.notifier = GameNotifier(app)
         self.deck = EndlessDeck()
-        self.timer = GameTimerManager()
+        self.timer = GameTimerManager(
+            tick=app.config.game.timer_tick,
+            slots=app.config.game.timer_slots,
+            overdue_rate=app.config.game.overdue_timers_rate,
+        )
+        self.actors = GameActors(app.config.game.actors_concurrency)
         self.logger = getLogger("game manager")
 
     async def start_game(self, vk_id: int, game_id: int) -> None:
@@ -34,29 +46,93 @@ class GameManager:
 
         await self.gathering_players(vk_id, game_id)
 
-    async def gathering_players(self, vk_id: int, game_id: int) -> None:
-        """запускает стадию набора игроков"""
+    def deadline_in(self, sec: float) -> datetime:
+        """срок таймера через sec секунд от текущего момента"""
 
-        self.logger.info(f"gathering_players, vk_id={vk_id}, game_id={game_id}")
+        return datetime.now(timezone.utc) + timedelta(seconds=sec)
 
-        await self.app.store.game.set_game_state(game_id, GameState.gathering)
-        await self.notifier.waiting_players(vk_id)
+    def start_timer(
+        self,
+        vk_id: int,
+        game_id: int,
+        deadline: datetime,
+        next_method: Callable[[int, int], Awaitable[Any]],
+    ) -> None:
+        """ставит таймер игры на сохраненный срок. прошедший срок
+        (после перезапуска) встает в очередь просроченных.
+        сработавший срок обрабатывается в акторе беседы,
+        по очереди с командами игроков"""
+
+        async def expired(vk_id: int, game_id: int) -> None:
+            self.actors.tell(
+                vk_id,
+                lambda: self.on_deadline(vk_id, game_id, expired, next_method),
+            )
 
-        create_task(
+        remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+
+        if remaining > 0:
             self.timer.start_timer(
-                sec=30,
+                sec=remaining,
                 vk_id=vk_id,
                 game_id=game_id,
-                next_method=self.collect_players,
+                next_method=expired,
+            )
+        else:
+            self.timer.start_overdue(
+                vk_id=vk_id, game_id=game_id, next_method=expired
+            )
+
+    async def on_deadline(
+        self,
+        vk_id: int,
+        game_id: int,
+        expired: Callable[[int, int], Awaitable[Any]],
+        next_method: Callable[[int, int], Awaitable[Any]],
+    ) -> None:
+        """обработка сработавшего срока в акторе беседы.
+        если команда игрока успела отменить или заменить таймер,
+        устаревший срок пропускается"""
+
+        if not self.timer.take_expired(game_id, expired):
+            return
+
+        try:
+            async with self.app.database.unit_of_work():
+                await next_method(vk_id, game_id)
+        except DatabaseUnavailable as error:
+            # бд недоступна - срок повторится из очереди просроченных
+            self.logger.warning(
+                f"database unavailable, game_id={game_id}: {error}"
+            )
+            self.start_timer(
+                vk_id, game_id, datetime.now(timezone.utc), next_method
             )
+
+    async def gathering_players(
+        self, vk_id: int, game_id: int, deadline: Optional[datetime] = None
+    ) -> None:
+        """запускает стадию набора игроков. при восстановлении
+        передается срок стадии, сохраненный до перезапуска"""
+
+        self.logger.info(f"gathering_players, vk_id={vk_id}, game_id={game_id}")
+
+        deadline = deadline or self.deadline_in(30)
+        await self.app.store.game.set_game_state(
+            game_id, GameState.gathering, deadline
         )
+        await self.notifier.waiting_players(vk_id)
+
+        self.start_timer(vk_id, game_id, deadline, self.collect_players)
 
     async def collect_players(self, vk_id: int, game_id: int) -> None:
         """проверяет наличие игроков и направляет на стадию ставок, если есть"""
 
         self.logger.info(f"collect_players, vk_id={vk_id}, game_id={game_id}")
 
-        players = await self.app.store.game.get_active_players(game_id)
+        players = await self.app.store.game.get_active_players_with_users(
+            game_id
+        )
 
         if not players:
             await self.notifier.no_players(vk_id)
@@ -64,30 +140,26 @@ class GameManager:
             await self.notifier.game_aborted(vk_id)
             return
 
-        players_names: list[str] = []
-        for player in players:
-            vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
-            players_names.append(vk_user.name)
+        players_names = [player.vk_user.name for player in players]
 
         await self.notifier.active_players(vk_id, players_names)
         await self.start_betting(vk_id, game_id)
 
-    async def start_betting(self, vk_id: int, game_id: int) -> None:
-        """запускает ожидание ставок"""
+    async def start_betting(
+        self, vk_id: int, game_id: int, deadline: Optional[datetime] = None
+    ) -> None:
+        """запускает ожидание ставок. при восстановлении
+        передается срок стадии, сохраненный до перезапуска"""
 
         self.logger.info(f"start_betting, vk_id={vk_id}, game_id={game_id}")
 
-        await self.app.store.game.set_game_state(game_id, GameState.betting)
+        deadline = deadline or self.deadline_in(60)
+        await self.app.store.game.set_game_state(
+            game_id, GameState.betting, deadline
+        )
         await self.notifier.waiting_bets(vk_id)
 
-        create_task(
-            self.timer.start_timer(
-                sec=60,
-                vk_id=vk_id,
-                game_id=game_id,
-                next_method=self.collect_bets,
-            )
-        )
+        self.start_timer(vk_id, game_id, deadline, self.collect_bets)
 
     async def collect_bets(self, vk_id: int, game_id: int) -> None:
         """проверяет наличие ставок игроков, инактивирует непоставивших,
@@ -95,15 +167,14 @@ class GameManager:
 
         self.logger.info(f"collect_bets, vk_id={vk_id}, game_id={game_id}")
 
-        players = await self.app.store.game.get_active_players(game_id)
+        players = await self.app.store.game.get_active_players_with_users(
+            game_id
+        )
 
         for player in players:
             if player.bet is None:
-                vk_user = await self.app.store.game.get_vk_user_by_player(
-                    player.id
-                )
                 await self.app.store.game.set_player_state(player.id, False)
-                await self.notifier.no_player_bet(vk_id, vk_user.name)
+                await self.notifier.no_player_bet(vk_id, player.vk_user.name)
 
         players = await self.app.store.game.get_active_players(game_id)
 
@@ -127,15 +198,18 @@ class GameManager:
         )
         await self.notifier.dealing_started(vk_id)
 
-        players = await self.app.store.game.get_active_players(game_id)
+        players = await self.app.store.game.get_active_players_with_users(
+            game_id
+        )
 
         # TODO транзакции
         player = random.choice(players)
 
         await self.app.store.game.set_current_player(game_id, player.id)
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
-        await self.notifier.player_turn(vk_id, vk_user.name, vk_user.sex)
+        await self.notifier.player_turn(
+            vk_id, player.vk_user.name, player.vk_user.sex
+        )
 
         await self.deal_cards_to_player(2, vk_id, game_id, player.id)
 
@@ -156,44 +230,42 @@ class GameManager:
         await self.check_player_hand(vk_id, game_id, player_id)
 
     async def check_player_hand(
-        self, vk_id: int, game_id: int, player_id: int
+        self,
+        vk_id: int,
+        game_id: int,
+        player_id: int,
+        deadline: Optional[datetime] = None,
     ) -> None:
-        """проверяет сумму карт в руке игрока и делает выводы"""
+        """проверяет сумму карт в руке игрока и делает выводы.
+        при восстановлении передается срок хода до перезапуска"""
 
         self.logger.info(
             f"_check_player_hand, vk_id={vk_id}, game_id={game_id}, player_id={player_id}"
         )
 
-        player = await self.app.store.game.get_player_by_id(player_id)
+        player = await self.app.store.game.get_player_with_user(player_id)
         player_cards = player.hand["cards"]
         player_points = self.deck.count_points(player_cards)
 
         if player_points == 21:
             if len(player_cards) == 2:
-                vk_user = await self.app.store.game.get_vk_user_by_player(
-                    player.id
-                )
-                await self.notifier.player_blackjack(vk_id, vk_user.name)
+                await self.notifier.player_blackjack(vk_id, player.vk_user.name)
             await self.set_next_player_turn(vk_id, game_id)
             return
 
         if player_points > 21:
             await self.notifier.player_overflow(vk_id)
-            await self.set_player_loss(vk_id, player_id)
+            await self.set_player_loss(vk_id, player)
             await self.set_next_player_turn(vk_id, game_id)
             return
 
         if player_points < 21:
-            vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
-            await self.notifier.offer_a_card(vk_id, vk_user.name)
-
-            create_task(
-                self.timer.start_timer(
-                    sec=60,
-                    vk_id=vk_id,
-                    game_id=game_id,
-                    next_method=self.set_next_player_turn,
-                )
+            await self.notifier.offer_a_card(vk_id, player.vk_user.name)
+
+            deadline = deadline or self.deadline_in(60)
+            await self.app.store.game.set_game_deadline(game_id, deadline)
+            self.start_timer(
+                vk_id, game_id, deadline, self.set_next_player_turn
             )
 
     async def set_next_player_turn(self, vk_id: int, game_id: int) -> None:
@@ -203,7 +275,9 @@ class GameManager:
             f"_check_player_hand, vk_id={vk_id}, game_id={game_id}"
         )
 
-        players = await self.app.store.game.get_active_players(game_id)
+        players = await self.app.store.game.get_active_players_with_users(
+            game_id
+        )
 
         if not players:
             await self.end_game(vk_id, game_id)
@@ -221,8 +295,9 @@ class GameManager:
 
         await self.app.store.game.set_current_player(game_id, player.id)
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player.id)
-        await self.notifier.player_turn(vk_id, vk_user.name, vk_user.sex)
+        await self.notifier.player_turn(
+            vk_id, player.vk_user.name, player.vk_user.sex
+        )
 
         await self.deal_cards_to_player(2, vk_id, game_id, player.id)
 
@@ -258,78 +333,86 @@ class GameManager:
 
         await self.app.store.game.set_game_state(game_id, GameState.results)
 
-        players = await self.app.store.game.get_active_players(game_id)
+        players = await self.app.store.game.get_active_players_with_users(
+            game_id
+        )
         game = await self.app.store.game.get_game_by_id(game_id)
 
         if not game.dealer_points:
             await self.inactivate_game(game_id)
             return
 
-        if game.dealer_points > 21:
-            for player in players:
-                if self.deck.is_blackjack(player.hand["cards"]):
-                    await self.set_player_win(vk_id, player.id, blackjack=True)
-                else:
-                    await self.set_player_win(vk_id, player.id)
-        else:
-            for player in players:
-                player_points = self.deck.count_points(player.hand["cards"])
-
-                if (
-                    self.deck.is_blackjack(player.hand["cards"])
-                    and game.dealer_points < 21
-                ):
-                    await self.set_player_win(vk_id, player.id, blackjack=True)
-                elif player_points < game.dealer_points:
-                    await self.set_player_loss(vk_id, player.id)
+        outcomes = {
+            player.id: self._player_outcome(player, game.dealer_points)
+            for player in players
+        }
 
-                elif player_points > game.dealer_points:
-                    await self.set_player_win(vk_id, player.id)
+        for player in players:
+            await self._notify_outcome(vk_id, player, outcomes[player.id])
 
-                else:
-                    await self.set_player_draw(vk_id, player.id)
+        await self.app.store.game.settle_players(game_id, outcomes)
 
         await self.end_game(vk_id, game_id)
 
-    async def set_player_win(
-        self, vk_id: int, player_id: int, blackjack: bool = False
-    ) -> None:
-        """засчитывает игроку выигрыш"""
+    def _player_outcome(
+        self, player: PlayerModel, dealer_points: int
+    ) -> PlayerOutcome:
+        """исход раздачи для игрока по его картам и очкам дилера"""
 
-        self.logger.info(
-            f"set_player_win, vk_id={vk_id}, player_id={player_id}, blackjack={blackjack}"
-        )
+        blackjack = self.deck.is_blackjack(player.hand["cards"])
+
+        if dealer_points > 21:
+            return PlayerOutcome.blackjack if blackjack else PlayerOutcome.win
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player_id)
-        await self.notifier.player_win(vk_id, vk_user.name, blackjack)
+        player_points = self.deck.count_points(player.hand["cards"])
 
-        await self.app.store.game.set_player_win(player_id, blackjack)
+        if blackjack and dealer_points < 21:
+            return PlayerOutcome.blackjack
+        if player_points < dealer_points:
+            return PlayerOutcome.loss
+        if player_points > dealer_points:
+            return PlayerOutcome.win
+        return PlayerOutcome.draw
 
-    async def set_player_draw(self, vk_id: int, player_id: int) -> None:
-        """засчитывает игроку ничью"""
+    async def _notify_outcome(
+        self, vk_id: int, player: PlayerModel, outcome: PlayerOutcome
+    ) -> None:
+        """сообщает в чат исход раздачи для игрока.
+        player - с загруженным пользователем вк (player.vk_user)"""
 
         self.logger.info(
-            f"set_player_draw, vk_id={vk_id}, player_id={player_id}"
+            f"player_outcome, vk_id={vk_id}, player_id={player.id}, outcome={outcome}"
         )
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player_id)
-        await self.notifier.player_draw(vk_id, vk_user.name)
+        vk_user = player.vk_user
 
-        await self.app.store.game.set_player_draw(player_id)
+        if outcome in (PlayerOutcome.win, PlayerOutcome.blackjack):
+            await self.notifier.player_win(
+                vk_id, vk_user.name, outcome == PlayerOutcome.blackjack
+            )
+        elif outcome == PlayerOutcome.draw:
+            await self.notifier.player_draw(vk_id, vk_user.name)
+        else:
+            await self.notifier.player_loss(vk_id, vk_user.name)
+            if player.cash - (player.bet or 0) <= 0:
+                await self.notifier.last_cash_spent(
+                    vk_id, vk_user.name, vk_user.sex
+                )
 
-    async def set_player_loss(self, vk_id: int, player_id: int) -> None:
-        """засчитывает игроку проигрыш"""
+    async def set_player_loss(self, vk_id: int, player: PlayerModel) -> None:
+        """засчитывает игроку проигрыш.
+        player - с загруженным пользователем вк (player.vk_user)"""
 
         self.logger.info(
-            f"set_player_loss, vk_id={vk_id}, player_id={player_id}"
+            f"set_player_loss, vk_id={vk_id}, player_id={player.id}"
         )
 
-        vk_user = await self.app.store.game.get_vk_user_by_player(player_id)
+        vk_user = player.vk_user
         await self.notifier.player_loss(vk_id, vk_user.name)
 
-        await self.app.store.game.set_player_loss(player_id)
+        await self.app.store.game.set_player_loss(player.id)
 
-        player = await self.app.store.game.get_player_by_id(player_id)
+        player = await self.app.store.game.get_player_by_id(player.id)
         if not player.cash:
             await self.notifier.last_cash_spent(
                 vk_id, vk_user.name, vk_user.sex
@@ -385,23 +468,70 @@ class GameManager:
             player.cash,
         )
 
-    async def connect(self, app: "Application") -> None:
-        """проверка при запуске на наличие активных игр. если такие есть,
-        уведомляет чат о возвращении и отправляет игру в восстановительную функцию
+    async def recover(self, shards: list[int]) -> None:
+        """проверка активных игр бесед шардов, которые процесс только что
+        занял. если такие есть, уведомляет чат о возвращении
+        и отправляет игру в восстановительную функцию.
+        игры восстанавливаются параллельно, каждая - в акторе своей беседы
         """
 
         active_games = await self.app.store.game.get_active_games()
+        returns = []
 
         for game in active_games:
             chat = await self.app.store.game.get_chat_by_game_id(game.id)
-            await self.notifier.bot_returning(chat.vk_id)
+            shard = shard_of(chat.vk_id, self.app.config.rabbitmq.shards)
+            if shard not in shards:
+                continue
+
+            returns.append(
+                self.actors.ask(
+                    chat.vk_id,
+                    partial(self.return_to_game, chat.vk_id, game.id),
+                )
+            )
+
+        await gather(*returns)
+
+    async def release(self, shards: list[int]) -> None:
+        """забывает игры бесед шардов, замок которых процесс потерял:
+        отменяет их таймеры и выбрасывает их состояние из памяти,
+        не сохраняя. игры продолжит новый владелец шарда по данным бд
+        """
+
+        active_games = await self.app.store.game.get_active_games()
+        game_ids = []
 
-            await self.recovery(chat.vk_id, game)
+        for game in active_games:
+            chat = await self.app.store.game.get_chat_by_game_id(game.id)
+            shard = shard_of(chat.vk_id, self.app.config.rabbitmq.shards)
+            if shard not in shards:
+                continue
+
+            self.timer.end_timer(game.id)
+            game_ids.append(game.id)
+
+        self.app.store.game.active.evict(game_ids)
+        self.logger.info(f"release, shards={shards}, games={game_ids}")
+
+    async def return_to_game(self, vk_chat_id: int, game_id: int) -> None:
+        """уведомляет чат о возвращении бота и восстанавливает игру,
+        если ее не успела закончить команда, пришедшая раньше"""
+
+        async with self.app.database.unit_of_work():
+            game = await self.app.store.game.get_game_by_id(game_id)
+            if game.state == GameState.inactive:
+                return
+
+            await self.notifier.bot_returning(vk_chat_id)
+            await self.recovery(vk_chat_id, game)
 
     # TODO возможно будет лучше выглядеть с match-case
 
     async def recovery(self, vk_chat_id: int, game: GameModel) -> None:
-        """восстанавливает активную игру после отключения сервера"""
+        """восстанавливает активную игру после отключения сервера.
+        таймер стадии или хода ждет только время, оставшееся
+        до сохраненного срока"""
 
         if game.state == GameState.gathering:
             self.logger.info(
@@ -412,7 +542,7 @@ class GameManager:
             )
 
             if all_play:
-                await self.app.store.game_manager.timer.end_timer(game.id)
+                self.app.store.game_manager.timer.end_timer(game.id)
 
                 losers = await self.app.store.game.count_losers(game.id)
                 await self.notifier.all_play(vk_chat_id, losers)
@@ -421,7 +551,7 @@ class GameManager:
                     vk_chat_id, game.id
                 )
             else:
-                await self.gathering_players(vk_chat_id, game.id)
+                await self.gathering_players(vk_chat_id, game.id, game.deadline)
 
             return
 
@@ -439,7 +569,7 @@ class GameManager:
                     vk_chat_id, game.id
                 )
             else:
-                await self.start_betting(vk_chat_id, game.id)
+                await self.start_betting(vk_chat_id, game.id, game.deadline)
 
             return
 
@@ -463,7 +593,7 @@ class GameManager:
                     vk_chat_id, vk_user.name, current_player.hand["cards"]
                 )
                 await self.check_player_hand(
-                    vk_chat_id, game.id, current_player.id
+                    vk_chat_id, game.id, current_player.id, game.deadline
                 )
             else:
                 await self.notifier.player_turn(
@@ -501,7 +631,7 @@ class GameManager:
 
         self.logger.info(f"inactivate_game, game_id={game_id}")
 
-        await self.timer.end_timer(game_id)
+        self.timer.end_timer(game_id)
 
         game = await self.app.store.game.get_game_by_id(game_id)
 
@@ -522,12 +652,22 @@ class GameManager:
         await self.app.store.game.set_game_state(game.id, GameState.inactive)
 
     async def disconnect(self, app: "Application") -> None:
-        """проверка при отключении на наличие активных игр.
-        если такие есть, уведомляет ее чат о своем отключении
+        """проверка при отключении на наличие активных игр занятых шардов.
+        если такие есть, уведомляет ее чат о своем отключении.
+        перед этим останавливает таймеры игр, дожидается акторов бесед
+        и сохраняет в бд состояние игр из памяти
         """
 
+        if not app.runs(Role.worker):
+            return
+
+        await self.timer.close()
+        await self.actors.close()
+        await self.app.store.game.active.flush()
+
         active_games = await self.app.store.game.get_active_games()
 
         for game in active_games:
             chat = await self.app.store.game.get_chat_by_game_id(game.id)
-            await self.notifier.bot_leaving(chat.vk_id)
+            if self.app.store.bot_manager.receiver.owns(chat.vk_id):
+                await self.notifier.bot_leaving(chat.vk_id)
@@ -7,6 +7,7 @@ from app.store.game.events import GameEvent
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
+from app.store.game.dataclasses import GameContext
 from app.store.game.handler import GameHandler
 from app.store.vk_api.dataclasses import Update
 
@@ -49,7 +50,10 @@ class GameEventRouter:
         except ValueError:
             return None
 
-    def route(self, event: GameEvent) -> Callable[[Update], Awaitable[Any]]:
-        """возвращает назначенный на событие обработчик"""
+    def route(
+        self, event: GameEvent
+    ) -> Callable[[Update, GameContext], Awaitable[Any]]:
+        """возвращает назначенный на событие обработчик.
+        обработчик ждет update и загруженный для него GameContext"""
 
         return self.HANDLERS[event]
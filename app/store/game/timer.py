@@ -1,60 +1,199 @@
-from asyncio import create_task, sleep as asleep
+from asyncio import Task, create_task, gather, sleep as asleep
 from collections.abc import Awaitable, Callable
 from logging import getLogger
-from typing import Any
+from math import ceil
+from time import monotonic
+from typing import Any, Optional
 
-from app.store.game.dataclasses import GameWaitTask
+from app.store.game.dataclasses import GameDeadline
 
 
 class GameTimerManager:
-    """управление таймерами игры"""
+    """таймеры игр на одном хешированном колесе времени.
+    у игры не больше одного таймера, срок - номер тика колеса.
+    постановка и отмена - O(1) по id игры, а все сроки обслуживает
+    одна задача, которая просыпается раз в tick секунд,
+    пока есть что ждать. таймер срабатывает не раньше срока
+    и не позже чем через tick после него.
+    просроченные сроки (например, после перезапуска) срабатывают
+    не все разом, а не чаще overdue_rate в секунду.
+    после close новые таймеры не ставятся"""
 
-    def __init__(self):
-        self.tasks: dict = {}
+    def __init__(
+        self, tick: float = 0.1, slots: int = 1024, overdue_rate: float = 5.0
+    ):
+        self.tick = tick
+        self.slots = slots
+        self.overdue_rate = overdue_rate
+        self.overdue_at: float = 0.0
+        self.closed = False
+        self.wheel: list[dict[int, GameDeadline]] = [{} for _ in range(slots)]
+        self.deadlines: dict[int, GameDeadline] = {}
+        # сработавшие сроки, обработка которых еще не началась
+        self.expired: dict[int, GameDeadline] = {}
+        self.current_tick: int = 0
+        self.epoch: float = monotonic()
+        self.driver: Optional[Task] = None
+        self.firing: set[Task] = set()
         self.logger = getLogger("game timer manager")
 
-    async def start_timer(
+        self.scheduled: int = 0
+        self.cancelled: int = 0
+        self.fired: int = 0
+        self.overdue: int = 0
+        self.max_lateness: float = 0.0
+
+    def start_timer(
         self,
-        sec: int,
+        sec: float,
         vk_id: int,
         game_id: int,
         next_method: Callable[[int, int], Awaitable[Any]],
     ) -> None:
-        """запускает фоновое ожидание и регистрирует его.
-        если таймер вышел, а ожидание не cancel - запускает next_method и удаляет запись.
-        """
+        """через sec секунд запускает next_method(vk_id, game_id).
+        прежний таймер игры отменяется"""
 
-        try:
-            task = GameWaitTask(
-                game_id=game_id,
-                timer=create_task(asleep(sec)),
-            )
+        self.end_timer(game_id)
 
-            self.tasks.setdefault(game_id, [])
-            self.tasks[game_id].append(task)
+        if self.closed:
+            # срок сохранен в бд, его поставит восстановление после запуска
+            self.logger.warning(f"timers closed, game_id={game_id}")
+            return
 
-            await asleep(sec)
+        if self.driver is None:
+            # колесо стояло: его тики отсчитываются заново от текущего
+            self.epoch = monotonic() - self.current_tick * self.tick
 
-            if not task.timer.cancelled():
-                self.tasks[game_id].remove(task)
-                await next_method(vk_id, game_id)
+        now = (monotonic() - self.epoch) / self.tick
+        deadline = GameDeadline(
+            game_id=game_id,
+            vk_id=vk_id,
+            tick=max(ceil(now + sec / self.tick), self.current_tick + 1),
+            callback=next_method,
+        )
+        self.deadlines[game_id] = deadline
+        self.wheel[deadline.tick % self.slots][game_id] = deadline
+        self.scheduled += 1
 
-        except Exception as error:
-            self.logger.info("start_timer error: ", error)
+        if self.driver is None:
+            self.driver = create_task(self._run())
 
-    async def end_timer(self, game_id: int) -> None:
-        """останавливает активное фоновое ожидание в игре.
-        удаляет запись о нём соответственно id игры.
-        """
+    def start_overdue(
+        self,
+        vk_id: int,
+        game_id: int,
+        next_method: Callable[[int, int], Awaitable[Any]],
+    ) -> None:
+        """ставит в очередь просроченный срок: такие сроки
+        срабатывают друг за другом с интервалом 1 / overdue_rate"""
+
+        now = monotonic()
+        self.overdue_at = max(self.overdue_at, now)
+        self.start_timer(self.overdue_at - now, vk_id, game_id, next_method)
+        self.overdue_at += 1 / self.overdue_rate
+        self.overdue += 1
+
+    def end_timer(self, game_id: int) -> None:
+        """отменяет таймер игры, если он есть. сработавший, но еще
+        не обработанный срок тоже отменяется - см. take_expired"""
+
+        if self.expired.pop(game_id, None) is not None:
+            self.cancelled += 1
 
-        if not self.tasks.get(game_id):
+        deadline = self.deadlines.pop(game_id, None)
+        if deadline is None:
             return
 
+        del self.wheel[deadline.tick % self.slots][game_id]
+        self.cancelled += 1
+
+    def take_expired(self, game_id: int, callback: Callable) -> bool:
+        """забирает сработавший срок перед его обработкой.
+        если между срабатыванием и обработкой таймер игры отменили
+        или поставили заново, срок устарел и обрабатывать его не нужно"""
+
+        deadline = self.expired.get(game_id)
+        if deadline is None or deadline.callback is not callback:
+            return False
+
+        del self.expired[game_id]
+        return True
+
+    def remaining(self, game_id: int) -> Optional[float]:
+        """сколько секунд осталось до срабатывания таймера игры"""
+
+        deadline = self.deadlines.get(game_id)
+        if deadline is None:
+            return None
+
+        return max(self.epoch + deadline.tick * self.tick - monotonic(), 0.0)
+
+    async def _run(self) -> None:
+        """поворачивает колесо, пока есть ожидающие сроки"""
+
         try:
-            for task in self.tasks[game_id]:
-                if not task.timer.done():
-                    task.timer.cancel()
-                    self.tasks[game_id].remove(task)
+            while self.deadlines:
+                next_at = self.epoch + (self.current_tick + 1) * self.tick
+                delay = next_at - monotonic()
+                if delay > 0:
+                    await asleep(delay)
+
+                # после задержки цикла событий проходятся все пропущенные тики
+                now = int((monotonic() - self.epoch) / self.tick)
+                while self.current_tick < now and self.deadlines:
+                    self.current_tick += 1
+                    self._expire(self.current_tick)
+
+                self.current_tick = max(self.current_tick, now)
+        finally:
+            self.driver = None
+
+    def _expire(self, tick: int) -> None:
+        """запускает сроки, наступившие на этом тике.
+        в ячейке лежат и сроки следующих оборотов колеса - они ждут дальше"""
+
+        slot = self.wheel[tick % self.slots]
+        if not slot:
+            return
 
+        for deadline in [d for d in slot.values() if d.tick <= tick]:
+            del slot[deadline.game_id]
+            del self.deadlines[deadline.game_id]
+            self.expired[deadline.game_id] = deadline
+            self.fired += 1
+            self.max_lateness = max(
+                self.max_lateness,
+                monotonic() - (self.epoch + deadline.tick * self.tick),
+            )
+
+            task = create_task(self._fire(deadline))
+            self.firing.add(task)
+            task.add_done_callback(self.firing.discard)
+
+    async def _fire(self, deadline: GameDeadline) -> None:
+        try:
+            await deadline.callback(deadline.vk_id, deadline.game_id)
         except Exception as error:
-            self.logger.info("end_timer error: ", error)
+            self.logger.error("Exception", exc_info=error)
+
+    async def close(self) -> None:
+        """останавливает колесо и уже запущенные обработчики сроков"""
+
+        self.closed = True
+        tasks = [*self.firing]
+        if self.driver:
+            tasks.append(self.driver)
+
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.deadlines),
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "fired": self.fired,
+            "overdue": self.overdue,
+            "max_lateness": round(self.max_lateness, 3),
+        }
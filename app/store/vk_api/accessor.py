@@ -1,17 +1,23 @@
 import random
 import typing
+from asyncio import sleep as asleep
+from functools import partial
 from logging import getLogger
 from pathlib import Path
 from typing import Optional
 
-from aiohttp import TCPConnector
-from aiohttp.client import ClientSession
-
 from app.base.base_accessor import BaseAccessor
 from app.store.bot.notifications import BotNotifier
-from app.store.vk_api.dataclasses import BotMessage, VKUser
+from app.store.vk_api.batcher import BATCHABLE_METHODS, ExecuteBatcher
+from app.store.vk_api.dataclasses import BotMessage, TypingActivity, VKUser
+from app.store.vk_api.http import HttpPool
+from app.store.vk_api.limiter import TokenBucket
+from app.store.vk_api.members import ChatMembersCache
+from app.store.vk_api.outbox import MessageOutbox
 from app.store.vk_api.poller import Poller
+from app.store.vk_api.profiles import ProfileCache
 from app.store.vk_api.sender import UpdateSender
+from app.web.roles import Role
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
@@ -19,22 +25,39 @@ if typing.TYPE_CHECKING:
 
 IMG_DIR = Path(__file__).resolve().parent.parent / "game" / "img"
 API_PATH = "https://api.vk.com/method/"
+TOO_MANY_REQUESTS = 6
+USERS_GET_MAX = 1000
 
 
 class VkApiAccessor(BaseAccessor):
     def __init__(self, app: "Application", *args, **kwargs):
         super().__init__(app, *args, **kwargs)
         self.logger = getLogger("vk api accessor")
-        self.session: Optional[ClientSession] = None
+        self.longpoll_http: Optional[HttpPool] = None
+        self.api_http: Optional[HttpPool] = None
+        self.upload_http: Optional[HttpPool] = None
         self.key: Optional[str] = None
         self.server: Optional[str] = None
         self.poller: Optional[Poller] = None
         self.ts: Optional[int] = None
         self.sender = UpdateSender(app)
         self.notifier = BotNotifier(app)
+        self.outbox = MessageOutbox(self)
+        self.batcher = ExecuteBatcher(self)
+        self.profiles = ProfileCache(self)
+        self.members = ChatMembersCache(self)
+        self.buckets: dict[str, TokenBucket] = {}
 
     async def connect(self, app: "Application"):
-        self.session = ClientSession(connector=TCPConnector(verify_ssl=False))
+        """http нужен поллеру и воркеру, long poll - только поллеру"""
+
+        if not app.runs(Role.poller, Role.worker):
+            return
+
+        self.open_http()
+
+        if not app.runs(Role.poller):
+            return
 
         try:
             await self._get_long_poll_service()
@@ -46,10 +69,34 @@ class VkApiAccessor(BaseAccessor):
         await self.poller.start()
 
     async def disconnect(self, app: "Application"):
-        if self.session:
-            await self.session.close()
         if self.poller:
             await self.poller.stop()
+        await self.members.close()
+        await self.outbox.close()
+        await self.close_http()
+
+    def open_http(self) -> None:
+        """отдельные пулы соединений для long poll, api и загрузки фото"""
+
+        config = self.app.config.http
+        self.longpoll_http = HttpPool("longpoll", config.longpoll)
+        self.api_http = HttpPool("api", config.api)
+        self.upload_http = HttpPool("upload", config.upload)
+
+        for pool in self.http_pools:
+            pool.open()
+
+    async def close_http(self) -> None:
+        for pool in self.http_pools:
+            await pool.close()
+
+    @property
+    def http_pools(self) -> list[HttpPool]:
+        return [
+            pool
+            for pool in (self.longpoll_http, self.api_http, self.upload_http)
+            if pool is not None
+        ]
 
     @staticmethod
     def _build_query(host: str, method: str, params: dict) -> str:
@@ -59,24 +106,71 @@ class VkApiAccessor(BaseAccessor):
         url += "&".join([f"{k}={v}" for k, v in params.items()])
         return url
 
+    async def _call(self, method: str, params: dict) -> dict:
+        """вызывает метод api vk. при vk_api.execute_batching
+        частые вызовы собираются в общие запросы execute"""
+
+        if (
+            self.app.config.vk_api.execute_batching
+            and method in BATCHABLE_METHODS
+        ):
+            return await self.batcher.call(method, params)
+
+        return await self._request(method, params)
+
+    async def _request(
+        self, method: str, params: dict, post: bool = False
+    ) -> dict:
+        """выполняет запрос к api vk в пределах лимита запросов токена.
+        на ошибку 6 (слишком много запросов) повторяет запрос
+        с нарастающей паузой. post - для длинных параметров, например code"""
+
+        config = self.app.config.vk_api
+        token = params.setdefault("access_token", self.app.config.bot.token)
+
+        bucket = self.buckets.get(token)
+        if bucket is None:
+            bucket = TokenBucket(config.rate_limit, config.burst)
+            self.buckets[token] = bucket
+
+        if post:
+            params.setdefault("v", "5.131")
+            request = partial(
+                self.api_http.session.post, API_PATH + method, data=params
+            )
+        else:
+            url = self._build_query(host=API_PATH, method=method, params=params)
+            request = partial(self.api_http.session.get, url)
+
+        for attempt in range(config.max_retries + 1):
+            await bucket.acquire()
+
+            async with request() as response:
+                data = await response.json()
+                self.logger.info(data)
+
+            error_code = data.get("error", {}).get("error_code")
+            if error_code != TOO_MANY_REQUESTS or attempt == config.max_retries:
+                break
+
+            await asleep(config.retry_backoff * 2**attempt)
+
+        return data
+
     async def _get_long_poll_service(self):
-        url = self._build_query(
-            host=API_PATH,
+        data = await self._call(
             method="groups.getLongPollServer",
-            params={
-                "group_id": self.app.config.bot.group_id,
-                "access_token": self.app.config.bot.token,
-            },
+            params={"group_id": self.app.config.bot.group_id},
         )
-        async with self.session.get(url) as response:
-            data = (await response.json())["response"]
-            self.logger.info(data)
-            self.key = data["key"]
-            self.server = data["server"]
-            self.ts = data["ts"]
-            self.logger.info(self.server)
+        data = data["response"]
+        self.key = data["key"]
+        self.server = data["server"]
+        self.ts = data["ts"]
+        self.logger.info(self.server)
+
+    async def poll(self) -> list[dict]:
+        """выполняет один запрос long poll и возвращает полученные updates"""
 
-    async def poll(self):
         url = self._build_query(
             host=self.server,
             method="",
@@ -87,7 +181,7 @@ class VkApiAccessor(BaseAccessor):
                 "wait": 30,
             },
         )
-        async with self.session.get(url) as response:
+        async with self.longpoll_http.session.get(url) as response:
             data = await response.json()
             self.logger.info(data)
 
@@ -97,21 +191,27 @@ class VkApiAccessor(BaseAccessor):
                     self.logger.info("long_poll_service renewed")
                 except Exception as error:
                     self.logger.error("Exception", exc_info=error)
-                return
+                return []
 
             self.ts = data["ts"]
 
-            raw_updates = data.get("updates", [])
-
-            if raw_updates:
-                for raw_update in raw_updates:
-                    await self.sender.send_update(raw_update)
+            return data.get("updates", [])
 
     async def send_message(self, message: BotMessage) -> None:
-        """посылает сообщение вконтакте"""
+        """ставит сообщение в очередь на отправку вконтакте"""
 
-        url = self._build_query(
-            host=API_PATH,
+        self.outbox.put(message)
+
+    async def send_typing(self, vk_chat_id: int, sec: float) -> None:
+        """ставит в очередь чата статус набора текста на sec секунд.
+        следующее сообщение в этот чат уйдет после паузы"""
+
+        self.outbox.put(TypingActivity(peer_id=vk_chat_id, sec=sec))
+
+    async def _send_message(self, message: BotMessage) -> int | None:
+        """посылает сообщение вконтакте, возвращает код ошибки vk, если была"""
+
+        data = await self._call(
             method="messages.send",
             params={
                 "random_id": random.randint(1, 2**32),
@@ -119,126 +219,97 @@ class VkApiAccessor(BaseAccessor):
                 "message": message.text,
                 "keyboard": message.keyboard,
                 "attachment": message.attachment,
-                "access_token": self.app.config.bot.token,
             },
         )
-        async with self.session.get(url) as response:
-            data = await response.json()
-            self.logger.info(data)
 
-            if data.get("error"):
-                await self.notifier.vk_error(
-                    peer_id=message.peer_id,
-                    error_code=data["error"]["error_code"],
-                )
+        if data.get("error"):
+            return data["error"]["error_code"]
 
     async def send_activity(self, vk_chat_id: int) -> bool:
         """посылает статус набора текста,
         возвращает истину об успешности запроса"""
 
-        url = self._build_query(
-            host=API_PATH,
+        data = await self._call(
             method="messages.setActivity",
-            params={
-                "type": "typing",
-                "peer_id": vk_chat_id,
-                "access_token": self.app.config.bot.token,
-            },
+            params={"type": "typing", "peer_id": vk_chat_id},
         )
-        async with self.session.get(url) as response:
-            data = await response.json()
-            self.logger.info(data)
-
-            if data.get("error"):
-                await self.notifier.vk_error(
-                    peer_id=vk_chat_id, error_code=data["error"]["error_code"]
-                )
 
         return bool(data.get("response"))
 
     async def get_user(self, vk_user_id: int) -> VKUser:
         """получить датакласс пользователя по его id в vk"""
 
-        url = self._build_query(
-            host=API_PATH,
-            method="users.get",
-            params={
-                "user_ids": vk_user_id,
-                "fields": "sex",
-                "access_token": self.app.config.bot.token,
-            },
-        )
-        async with self.session.get(url) as response:
-            data = await response.json()
-            self.logger.info(data)
+        return await self.profiles.get(vk_user_id)
 
-        if (
-            data["response"][0]["first_name"] == "Demmenty"
-            or data["response"][0]["sex"] == 1
-        ):
-            sex = "female"
-        else:
-            sex = "male"
+    async def get_users(self, vk_user_ids: list[int]) -> dict[int, VKUser]:
+        """получить датаклассы пользователей по их id в vk"""
 
-        user = VKUser(
-            vk_user_id=data["response"][0]["id"],
-            name=data["response"][0]["first_name"],
-            sex=sex,
-        )
-        return user
+        return await self.profiles.get_many(vk_user_ids)
+
+    async def _fetch_users(self, vk_user_ids: list[int]) -> list[VKUser]:
+        """запрашивает профили в vk, по USERS_GET_MAX id на вызов users.get"""
+
+        users = []
+
+        for i in range(0, len(vk_user_ids), USERS_GET_MAX):
+            ids = vk_user_ids[i : i + USERS_GET_MAX]
+            data = await self._call(
+                method="users.get",
+                params={"user_ids": ",".join(map(str, ids)), "fields": "sex"},
+            )
+            users.extend(
+                self._make_user(profile) for profile in data["response"]
+            )
+
+        return users
+
+    async def get_chat_members_count(self, vk_chat_id: int) -> int | None:
+        """возвращает количество пользователей в чате по кэшу состава,
+        None - если не получилось"""
+
+        return await self.members.count(vk_chat_id)
 
     async def get_chat_users(self, vk_chat_id: int) -> list[VKUser] | None:
         """возвращает список участников чата или None, если не получилось"""
-        url = self._build_query(
-            host=API_PATH,
+        data = await self._call(
             method="messages.getConversationMembers",
-            params={
-                "peer_id": vk_chat_id,
-                "fields": "sex",
-                "access_token": self.app.config.bot.token,
-            },
+            params={"peer_id": vk_chat_id, "fields": "sex"},
         )
-        async with self.session.get(url) as response:
-            data = await response.json()
-            self.logger.info(data)
 
         if data.get("error"):
             return None
 
-        users = data["response"]["profiles"]
         users_list = []
 
-        for user in users:
-            if user["first_name"] == "Demmenty" or user["sex"] == 1:
-                sex = "female"
-            else:
-                sex = "male"
-
-            user = VKUser(
-                vk_user_id=user["id"],
-                name=user["first_name"],
-                sex=sex,
-            )
+        for profile in data["response"]["profiles"]:
+            user = self._make_user(profile)
+            self.profiles.put(user)
             users_list.append(user)
 
+        self.members.put(vk_chat_id, {user.vk_user_id for user in users_list})
+
         return users_list
 
+    @staticmethod
+    def _make_user(profile: dict) -> VKUser:
+        if profile["first_name"] == "Demmenty" or profile["sex"] == 1:
+            sex = "female"
+        else:
+            sex = "male"
+
+        return VKUser(
+            vk_user_id=profile["id"],
+            name=profile["first_name"],
+            sex=sex,
+        )
+
     async def _get_upload_url(self) -> str:
         """получение адреса для загрузки вложения"""
 
-        url = self._build_query(
-            host=API_PATH,
-            method="photos.getMessagesUploadServer",
-            params={
-                "peer_id": 0,
-                "access_token": self.app.config.bot.token,
-            },
+        data = await self._call(
+            method="photos.getMessagesUploadServer", params={"peer_id": 0}
         )
 
-        async with self.session.get(url) as response:
-            data = await response.json()
-            self.logger.info(data)
-
         upload_url = data["response"]["upload_url"]
         return upload_url
 
@@ -250,24 +321,21 @@ class VkApiAccessor(BaseAccessor):
             upload_url = await self._get_upload_url()
             files = {"photo": open(path, "rb")}
 
-            async with self.session.post(upload_url, data=files) as response:
+            async with self.upload_http.session.post(
+                upload_url, data=files
+            ) as response:
                 response = await response.json(content_type=None)
 
-            url = self._build_query(
-                host=API_PATH,
+            data = await self._call(
                 method="photos.saveMessagesPhoto",
                 params={
                     "photo": response["photo"],
                     "server": response["server"],
                     "hash": response["hash"],
-                    "access_token": self.app.config.bot.token,
                 },
             )
-            async with self.session.get(url) as response:
-                data = await response.json()
-
-                owner_id = data["response"][0]["owner_id"]
-                photo_id = data["response"][0]["id"]
+            owner_id = data["response"][0]["owner_id"]
+            photo_id = data["response"][0]["id"]
 
             return f"photo{owner_id}_{photo_id}"
 
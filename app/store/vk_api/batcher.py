@@ -0,0 +1,135 @@
+import asyncio
+import json
+import typing
+from asyncio import Future, TimerHandle, create_task
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Optional
+from urllib.parse import unquote
+
+if typing.TYPE_CHECKING:
+    from app.store.vk_api.accessor import VkApiAccessor
+
+
+EXECUTE_MAX_CALLS = 25
+BATCHABLE_METHODS = {
+    "messages.send",
+    "messages.setActivity",
+    "messages.getConversationMembers",
+    "users.get",
+}
+
+
+@dataclass
+class ExecuteCall:
+    method: str
+    params: dict
+    future: Future
+
+
+class ExecuteBatcher:
+    """собирает вызовы api vk, пришедшие в пределах execute_window,
+    в один запрос execute (до 25 вызовов) и раздает результаты ожидающим.
+    каждый ожидающий получает ответ в том же виде, что и от обычного вызова:
+    {"response": ...} или {"error": {...}}"""
+
+    def __init__(self, vk_api: "VkApiAccessor"):
+        self.vk_api = vk_api
+        self.pending: list[ExecuteCall] = []
+        self.flush_handle: Optional[TimerHandle] = None
+        self.logger = getLogger("execute batcher")
+
+        self.requests: int = 0
+        self.calls: int = 0
+
+    async def call(self, method: str, params: dict) -> dict:
+        """ставит вызов в ближайший execute и ждет его результата"""
+
+        loop = asyncio.get_running_loop()
+        call = ExecuteCall(
+            method=method, params=params, future=loop.create_future()
+        )
+        self.pending.append(call)
+
+        if len(self.pending) >= EXECUTE_MAX_CALLS:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(
+                self.vk_api.app.config.vk_api.execute_window, self.flush
+            )
+
+        return await call.future
+
+    def flush(self) -> None:
+        """отправляет накопленные вызовы пачками по 25"""
+
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        while self.pending:
+            calls = self.pending[:EXECUTE_MAX_CALLS]
+            self.pending = self.pending[EXECUTE_MAX_CALLS:]
+            create_task(self._execute(calls))
+
+    async def _execute(self, calls: list[ExecuteCall]) -> None:
+        self.requests += 1
+        self.calls += len(calls)
+
+        try:
+            data = await self.vk_api._request(
+                method="execute",
+                params={"code": self._build_code(calls)},
+                post=True,
+            )
+        except Exception as error:
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(error)
+            return
+
+        if data.get("error"):
+            for call in calls:
+                self._resolve(call, {"error": data["error"]})
+            return
+
+        # неудавшиеся вызовы возвращают false,
+        # их ошибки перечислены в execute_errors в том же порядке
+        errors = iter(data.get("execute_errors", []))
+
+        for call, response in zip(calls, data["response"]):
+            if response is False:
+                error = next(errors, {"error_code": 0, "error_msg": "unknown"})
+                self._resolve(call, {"error": error})
+            else:
+                self._resolve(call, {"response": response})
+
+    @staticmethod
+    def _resolve(call: ExecuteCall, result: dict) -> None:
+        if not call.future.done():
+            call.future.set_result(result)
+
+    @staticmethod
+    def _build_code(calls: list[ExecuteCall]) -> str:
+        """код VKScript, возвращающий массив результатов вызовов по порядку.
+        строковые параметры раскодируются так же,
+        как vk раскодировал бы их из строки запроса"""
+
+        api_calls = []
+        for call in calls:
+            params = {
+                key: unquote(value) if isinstance(value, str) else value
+                for key, value in call.params.items()
+            }
+            api_calls.append(
+                f"API.{call.method}({json.dumps(params, ensure_ascii=False)})"
+            )
+
+        return "return [" + ",".join(api_calls) + "];"
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "calls": self.calls,
+            "pending": len(self.pending),
+        }
@@ -1,5 +1,6 @@
 import json
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
+from time import monotonic
 
 
 # событие от вк
@@ -10,6 +11,7 @@ class Update:
     from_id: int
     peer_id: int
     action_type: str = ""
+    action_member_id: int = 0
     text: str = ""
 
     @property
@@ -17,6 +19,14 @@ class Update:
         return json.dumps(asdict(self))
 
 
+# пачка updates из одного ответа long poll
+@dataclass
+class UpdateBatch:
+    ts: int
+    updates: list[dict]
+    received_at: float = field(default_factory=monotonic)
+
+
 # клавиатура от бота
 @dataclass
 class Action:
@@ -50,6 +60,13 @@ class BotMessage:
     attachment: str = ""
 
 
+# статус набора текста и пауза перед следующим сообщением бота
+@dataclass
+class TypingActivity:
+    peer_id: int
+    sec: float
+
+
 # инфо о пользователе vk
 @dataclass
 class VKUser:
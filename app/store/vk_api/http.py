@@ -0,0 +1,92 @@
+from time import monotonic
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, TraceConfig
+
+from app.web.config import HttpPoolConfig
+
+
+class HttpPool:
+    """сессия aiohttp со своим пулом соединений, лимитами и таймаутами.
+    у long poll, api и загрузки фото - по собственному пулу,
+    чтобы висящий a_check не занимал соединения отправки сообщений.
+    считает переиспользование соединений и ожидание свободного"""
+
+    def __init__(self, name: str, config: HttpPoolConfig):
+        self.name = name
+        self.config = config
+        self.session: Optional[ClientSession] = None
+
+        self.requests: int = 0
+        self.connections_created: int = 0
+        self.connections_reused: int = 0
+        self.queued: int = 0
+        self.queued_time: float = 0.0
+        self.dns_hits: int = 0
+        self.dns_misses: int = 0
+
+    def open(self) -> None:
+        connector = TCPConnector(
+            ssl=False,
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            ttl_dns_cache=self.config.dns_ttl,
+            keepalive_timeout=self.config.keepalive_timeout,
+        )
+        timeout = ClientTimeout(
+            total=self.config.total_timeout,
+            connect=self.config.connect_timeout,
+        )
+        self.session = ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+
+    def _trace_config(self) -> TraceConfig:
+        trace_config = TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_queued_start.append(self._on_queued_start)
+        trace_config.on_connection_queued_end.append(self._on_queued_end)
+        trace_config.on_connection_create_end.append(self._on_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_reuseconn)
+        trace_config.on_dns_cache_hit.append(self._on_dns_hit)
+        trace_config.on_dns_cache_miss.append(self._on_dns_miss)
+        return trace_config
+
+    async def _on_request_start(self, session, context, params) -> None:
+        self.requests += 1
+
+    async def _on_queued_start(self, session, context, params) -> None:
+        self.queued += 1
+        context.queued_at = monotonic()
+
+    async def _on_queued_end(self, session, context, params) -> None:
+        self.queued_time += monotonic() - context.queued_at
+
+    async def _on_create_end(self, session, context, params) -> None:
+        self.connections_created += 1
+
+    async def _on_reuseconn(self, session, context, params) -> None:
+        self.connections_reused += 1
+
+    async def _on_dns_hit(self, session, context, params) -> None:
+        self.dns_hits += 1
+
+    async def _on_dns_miss(self, session, context, params) -> None:
+        self.dns_misses += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "queued": self.queued,
+            "queued_time": round(self.queued_time, 3),
+            "dns_hits": self.dns_hits,
+            "dns_misses": self.dns_misses,
+        }
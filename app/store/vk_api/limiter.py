@@ -0,0 +1,46 @@
+from asyncio import Lock, sleep as asleep
+from time import monotonic
+
+
+class TokenBucket:
+    """ограничение частоты запросов алгоритмом token bucket:
+    не больше rate запросов в секунду, всплеском - не больше capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens: float = capacity
+        self.updated = monotonic()
+        self.lock = Lock()
+        self.waits: int = 0
+        self.waited: float = 0.0
+
+    async def acquire(self) -> None:
+        """забирает один токен, если токенов нет - ждет появления.
+        ожидающие обслуживаются по очереди"""
+
+        async with self.lock:
+            self._refill()
+
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self.waits += 1
+                self.waited += delay
+                await asleep(delay)
+                self._refill()
+
+            self.tokens -= 1
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def stats(self) -> dict:
+        return {
+            "tokens": round(self.tokens, 2),
+            "waits": self.waits,
+            "waited": round(self.waited, 3),
+        }
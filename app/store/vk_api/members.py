@@ -0,0 +1,117 @@
+import typing
+from asyncio import Task, create_task, gather, shield
+from logging import getLogger
+from time import monotonic
+
+from app.store.vk_api.dataclasses import Update
+
+if typing.TYPE_CHECKING:
+    from app.store.vk_api.accessor import VkApiAccessor
+
+
+INVITE_ACTIONS = {"chat_invite_user", "chat_invite_user_by_link"}
+KICK_ACTIONS = {"chat_kick_user"}
+
+
+class ChatMembersCache:
+    """кэш состава бесед (id пользователей, без сообществ).
+    заполняется ответами getConversationMembers, поправляется
+    событиями входа и выхода из беседы. состав старше members_ttl
+    отдается как есть и обновляется в фоне"""
+
+    def __init__(self, vk_api: "VkApiAccessor"):
+        self.vk_api = vk_api
+        self.members: dict[int, set[int]] = {}
+        self.loaded_at: dict[int, float] = {}
+        self.refreshing: dict[int, Task] = {}
+        self.logger = getLogger("chat members")
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.refreshes: int = 0
+
+    def put(self, peer_id: int, member_ids: set[int]) -> None:
+        """запоминает полученный из vk состав беседы"""
+
+        self.members[peer_id] = member_ids
+        self.loaded_at[peer_id] = monotonic()
+
+    async def count(self, peer_id: int) -> int | None:
+        """количество пользователей в беседе, None - если не получилось"""
+
+        members = await self.get(peer_id)
+        return None if members is None else len(members)
+
+    async def get(self, peer_id: int) -> set[int] | None:
+        """состав беседы, None - если не получилось"""
+
+        members = self.members.get(peer_id)
+
+        if members is None:
+            self.misses += 1
+            await shield(self._refresh(peer_id))
+            return self.members.get(peer_id)
+
+        self.hits += 1
+        ttl = self.vk_api.app.config.vk_api.members_ttl
+        if self.loaded_at[peer_id] + ttl < monotonic():
+            self._refresh(peer_id)
+
+        return members
+
+    async def on_action(self, update: Update) -> None:
+        """поправляет состав беседы по событию входа или выхода"""
+
+        member_id = update.action_member_id or update.from_id
+        members = self.members.get(update.peer_id)
+
+        if member_id == -self.vk_api.app.config.bot.group_id:
+            if update.action_type in KICK_ACTIONS:
+                self.forget(update.peer_id)
+            return
+
+        if members is None or member_id < 0:
+            return
+
+        if update.action_type in INVITE_ACTIONS:
+            members.add(member_id)
+        elif update.action_type in KICK_ACTIONS:
+            members.discard(member_id)
+
+    def forget(self, peer_id: int) -> None:
+        self.members.pop(peer_id, None)
+        self.loaded_at.pop(peer_id, None)
+
+    def _refresh(self, peer_id: int) -> Task:
+        """запускает загрузку состава беседы, если она еще не идет"""
+
+        if peer_id in self.refreshing:
+            return self.refreshing[peer_id]
+
+        self.refreshes += 1
+        task = create_task(self._load(peer_id))
+        self.refreshing[peer_id] = task
+        task.add_done_callback(lambda _: self.refreshing.pop(peer_id, None))
+        return task
+
+    async def _load(self, peer_id: int) -> None:
+        try:
+            await self.vk_api.get_chat_users(peer_id)
+        except Exception as error:
+            self.logger.error("Exception", exc_info=error)
+
+    async def close(self) -> None:
+        """отменяет фоновые обновления"""
+
+        tasks = list(self.refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self.members),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import typing
+from asyncio import Task, create_task, sleep as asleep
+from collections import deque
+from logging import getLogger
+
+from app.store.vk_api.dataclasses import BotMessage, TypingActivity
+
+if typing.TYPE_CHECKING:
+    from app.store.vk_api.accessor import VkApiAccessor
+
+
+MESSAGE_MAX_LENGTH = 4096
+MESSAGE_SEPARATOR = "%0A%0A"
+ATTACHMENTS_MAX = 10
+
+
+class MessageOutbox:
+    """исходящая очередь сообщений vk.
+    сообщения одного чата отправляются строго по порядку,
+    разные чаты обслуживаются параллельно.
+    статус набора текста - тоже элемент очереди: пауза перед следующим
+    сообщением выдерживается здесь, а не в игровой логике"""
+
+    def __init__(self, vk_api: "VkApiAccessor"):
+        self.vk_api = vk_api
+        self.queues: dict[int, deque[BotMessage | TypingActivity]] = {}
+        self.workers: dict[int, Task] = {}
+        self.failing_peers: set[int] = set()
+        self.logger = getLogger("outbox")
+
+        self.sent: int = 0
+        self.failed: int = 0
+        self.coalesced: int = 0
+
+    def put(self, item: BotMessage | TypingActivity) -> None:
+        """ставит сообщение или статус набора текста в очередь его чата"""
+
+        self.queues.setdefault(item.peer_id, deque()).append(item)
+
+        if item.peer_id not in self.workers:
+            self.workers[item.peer_id] = create_task(self._work(item.peer_id))
+
+    async def close(self, timeout: float = 10) -> None:
+        """дожидается отправки очередей, по таймауту отменяет оставшееся"""
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.workers and loop.time() < deadline:
+            await asyncio.wait(
+                list(self.workers.values()), timeout=deadline - loop.time()
+            )
+
+        for task in list(self.workers.values()):
+            task.cancel()
+
+    async def _work(self, peer_id: int) -> None:
+        """отправляет сообщения чата по одному, пока очередь не опустеет"""
+
+        queue = self.queues[peer_id]
+        try:
+            while queue:
+                item = queue.popleft()
+                try:
+                    if isinstance(item, TypingActivity):
+                        await self._type(item)
+                        continue
+                    if self.vk_api.app.config.vk_api.coalesce:
+                        item = await self._coalesce(item, queue)
+                    await self._deliver(item)
+                except Exception as error:
+                    self.failed += 1
+                    self.logger.error("Exception", exc_info=error)
+        finally:
+            del self.workers[peer_id]
+            del self.queues[peer_id]
+
+    async def _type(self, activity: TypingActivity) -> None:
+        """показывает в чате набор текста и выдерживает паузу"""
+
+        if not await self.vk_api.send_activity(activity.peer_id):
+            self.logger.info(f"typing failed, peer_id={activity.peer_id}")
+        await asleep(activity.sec)
+
+    async def _coalesce(
+        self, message: BotMessage, queue: deque[BotMessage | TypingActivity]
+    ) -> BotMessage:
+        """склеивает сообщение со следующими за ним в очереди чата,
+        подождав coalesce_window, если очередь пуста.
+        текст - не длиннее лимита vk, клавиатура - от последнего сообщения"""
+
+        if not queue:
+            await asleep(self.vk_api.app.config.vk_api.coalesce_window)
+
+        texts = [message.text]
+        length = len(message.text)
+        keyboard = message.keyboard
+        attachments = [message.attachment] if message.attachment else []
+
+        while queue and isinstance(queue[0], BotMessage):
+            following = queue[0]
+            merged_length = (
+                length + len(MESSAGE_SEPARATOR) + len(following.text)
+            )
+            if merged_length > MESSAGE_MAX_LENGTH:
+                break
+            if following.attachment and len(attachments) == ATTACHMENTS_MAX:
+                break
+
+            queue.popleft()
+            texts.append(following.text)
+            length = merged_length
+            if following.keyboard:
+                keyboard = following.keyboard
+            if following.attachment:
+                attachments.append(following.attachment)
+            self.coalesced += 1
+
+        if len(texts) == 1:
+            return message
+
+        return BotMessage(
+            peer_id=message.peer_id,
+            text=MESSAGE_SEPARATOR.join(texts),
+            keyboard=keyboard,
+            attachment=",".join(attachments),
+        )
+
+    async def _deliver(self, message: BotMessage) -> None:
+        """отправляет сообщение. об ошибке vk уведомляет чат
+        только один раз, до следующей успешной отправки"""
+
+        error_code = await self.vk_api._send_message(message)
+
+        if not error_code:
+            self.sent += 1
+            self.failing_peers.discard(message.peer_id)
+            return
+
+        self.failed += 1
+        if message.peer_id not in self.failing_peers:
+            self.failing_peers.add(message.peer_id)
+            await self.vk_api.notifier.vk_error(
+                peer_id=message.peer_id, error_code=error_code
+            )
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(queue) for queue in self.queues.values()),
+            "active_peers": len(self.workers),
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+        }
@@ -1,24 +1,99 @@
 import asyncio
-from asyncio import Task
+from asyncio import Queue, Task
+from logging import getLogger
+from time import monotonic
 from typing import Optional
 
 from app.store import Store
+from app.store.vk_api.dataclasses import UpdateBatch
 
 
 class Poller:
+    """long poll в два этапа: одна задача держит запрос к vk
+    постоянно в полете и складывает пачки updates в ограниченную очередь,
+    воркеры разбирают очередь и отправляют пачки в брокер сообщений"""
+
     def __init__(self, store: Store):
         self.store = store
         self.is_running = False
         self.poll_task: Optional[Task] = None
+        self.send_tasks: list[Task] = []
+        self.queue: Optional[Queue[UpdateBatch]] = None
+        self.logger = getLogger("poller")
+
+        self.batches_sent: int = 0
+        self.updates_sent: int = 0
+        self.last_lag: float = 0.0
+        self.max_lag: float = 0.0
 
     async def start(self):
+        config = self.store.vk_api.app.config.poller
+
         self.is_running = True
+        self.queue = Queue(maxsize=config.queue_size)
         self.poll_task = asyncio.create_task(self.poll())
+        self.send_tasks = [
+            asyncio.create_task(self.send()) for _ in range(config.workers)
+        ]
 
     async def stop(self):
         self.is_running = False
-        await self.poll_task
+
+        if self.poll_task:
+            self.poll_task.cancel()
+            await asyncio.gather(self.poll_task, return_exceptions=True)
+
+        if self.queue:
+            await self.queue.join()
+
+        for task in self.send_tasks:
+            task.cancel()
+        await asyncio.gather(*self.send_tasks, return_exceptions=True)
 
     async def poll(self):
+        """получает updates от vk и складывает их в очередь.
+        если очередь заполнена - ждет, пока воркеры ее разберут"""
+
         while self.is_running:
-            await self.store.vk_api.poll()
+            try:
+                updates = await self.store.vk_api.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.logger.error("Exception", exc_info=error)
+                await asyncio.sleep(1)
+                continue
+
+            if updates:
+                await self.queue.put(
+                    UpdateBatch(ts=self.store.vk_api.ts, updates=updates)
+                )
+
+    async def send(self):
+        """забирает пачки updates из очереди и отправляет их в брокер"""
+
+        while True:
+            batch = await self.queue.get()
+            try:
+                await self.store.vk_api.sender.send_updates(batch.updates)
+            except Exception as error:
+                self.logger.error("Exception", exc_info=error)
+            finally:
+                self.queue.task_done()
+
+            self.last_lag = monotonic() - batch.received_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self.batches_sent += 1
+            self.updates_sent += len(batch.updates)
+
+    def stats(self) -> dict:
+        """метрики очереди: глубина, задержка от получения до брокера"""
+
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue.maxsize if self.queue else 0,
+            "last_lag": round(self.last_lag, 4),
+            "max_lag": round(self.max_lag, 4),
+            "batches_sent": self.batches_sent,
+            "updates_sent": self.updates_sent,
+        }
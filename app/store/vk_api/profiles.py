@@ -0,0 +1,127 @@
+import typing
+from collections import OrderedDict
+from time import monotonic
+
+from app.store.vk_api.dataclasses import VKUser
+
+if typing.TYPE_CHECKING:
+    from app.store.vk_api.accessor import VkApiAccessor
+
+
+class ProfileCache:
+    """общий кэш профилей пользователей vk (имя и пол).
+    запись живет profile_ttl секунд, при переполнении
+    вытесняется давно не использовавшаяся.
+    промах ищется сначала в таблице vk_user, затем одним users.get.
+    устаревшая запись сразу перечитывается из vk,
+    а свежий профиль обновляет и таблицу vk_user"""
+
+    def __init__(self, vk_api: "VkApiAccessor"):
+        self.vk_api = vk_api
+        self.profiles: OrderedDict[int, tuple[float, VKUser]] = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.db_loads: int = 0
+        self.api_loads: int = 0
+        self.refreshes: int = 0
+
+    def put(self, user: VKUser) -> None:
+        """кладет или обновляет профиль"""
+
+        config = self.vk_api.app.config.vk_api
+
+        self.profiles[user.vk_user_id] = (
+            monotonic() + config.profile_ttl,
+            user,
+        )
+        self.profiles.move_to_end(user.vk_user_id)
+
+        while len(self.profiles) > config.profile_cache_size:
+            self.profiles.popitem(last=False)
+
+    def peek(self, vk_user_id: int) -> VKUser | None:
+        """профиль из кэша без обращений к бд и vk, None - если его нет"""
+
+        entry = self.profiles.get(vk_user_id)
+        if entry is None:
+            return None
+
+        expires, user = entry
+        if expires < monotonic():
+            del self.profiles[vk_user_id]
+            return None
+
+        self.profiles.move_to_end(vk_user_id)
+        return user
+
+    async def get(self, vk_user_id: int) -> VKUser:
+        """профиль пользователя vk"""
+
+        users = await self.get_many([vk_user_id])
+        return users[vk_user_id]
+
+    async def get_many(self, vk_user_ids: list[int]) -> dict[int, VKUser]:
+        """профили пользователей vk по их id.
+        недостающие в кэше берутся из бд, оставшиеся и устаревшие -
+        одним users.get"""
+
+        users = {}
+        missing = []
+        stale = []
+
+        for vk_user_id in dict.fromkeys(vk_user_ids):
+            cached = vk_user_id in self.profiles
+            user = self.peek(vk_user_id)
+            if user is not None:
+                users[vk_user_id] = user
+            elif cached:
+                # в бд профиль не новее устаревшего
+                stale.append(vk_user_id)
+            else:
+                missing.append(vk_user_id)
+
+        self.hits += len(users)
+        self.misses += len(missing) + len(stale)
+
+        if missing:
+            for user in await self._load_from_db(missing):
+                users[user.vk_user_id] = user
+                self.put(user)
+                self.db_loads += 1
+
+            missing = [id_ for id_ in missing if id_ not in users]
+
+        if missing or stale:
+            fetched = await self.vk_api._fetch_users(missing + stale)
+            for user in fetched:
+                users[user.vk_user_id] = user
+                self.put(user)
+                self.api_loads += 1
+
+            refreshed = [user for user in fetched if user.vk_user_id in stale]
+            if refreshed:
+                await self.vk_api.app.store.game.update_vk_users(refreshed)
+                self.refreshes += len(refreshed)
+
+        return users
+
+    async def _load_from_db(self, vk_user_ids: list[int]) -> list[VKUser]:
+        vk_users = await self.vk_api.app.store.game.get_vk_users_by_vk_ids(
+            vk_user_ids
+        )
+
+        return [
+            VKUser(vk_user_id=vk_user.vk_id, name=vk_user.name, sex=vk_user.sex)
+            for vk_user in vk_users or []
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.profiles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "db_loads": self.db_loads,
+            "api_loads": self.api_loads,
+            "refreshes": self.refreshes,
+        }
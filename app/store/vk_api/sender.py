@@ -1,38 +1,58 @@
 import typing
+from asyncio import Task, create_task, gather
 from logging import getLogger
+from typing import Optional
 
 import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
 
 from app.store.vk_api.dataclasses import Update
+from app.store.vk_api.shards import QUEUE_ARGUMENTS, shard_of, shard_queue
+from app.web.roles import Role
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
 
 class UpdateSender:
-    """отправитель обновлений в брокер сообщений"""
+    """отправитель обновлений в брокер сообщений.
+    держит одно соединение и пул каналов на все время работы,
+    подтверждения публикаций ожидает пачками.
+    update уходит в очередь шарда своей беседы через канал этого шарда,
+    поэтому updates одной беседы не обгоняют друг друга"""
 
     def __init__(self, app: "Application"):
         self.app = app
-        self.connection = None
-        self.channel = None
-        self.routing_key = "vk_updates"
+        self.connection: Optional[AbstractRobustConnection] = None
+        self.channels: list[AbstractChannel] = []
+        self.confirmations: list[Task] = []
         self.logger = getLogger("update sender")
         app.on_startup.append(self.connect)
+        app.on_cleanup.append(self.disconnect)
 
     async def connect(self, app: "Application"):
+        if not app.runs(Role.poller):
+            return
+
         self.connection = await aio_pika.connect_robust(
             self.app.config.rabbitmq.url
         )
 
-        async with self.connection:
-            self.channel = await self.connection.channel()
+        for _ in range(self.app.config.rabbitmq.publisher_channels):
+            channel = await self.connection.channel(publisher_confirms=True)
+            self.channels.append(channel)
 
-            await self.channel.default_exchange.publish(
-                aio_pika.Message(body=f"Hello Rabbit!".encode()),
-                routing_key=self.routing_key,
+        for shard in range(self.app.config.rabbitmq.shards):
+            await self.channels[0].declare_queue(
+                shard_queue(shard), durable=True, arguments=QUEUE_ARGUMENTS
             )
 
+    async def disconnect(self, app: "Application"):
+        await self.wait_confirms()
+
+        if self.connection:
+            await self.connection.close()
+
     async def send_update(self, raw_update: dict) -> None:
         """отправляет update vk в брокер сообщений"""
 
@@ -42,28 +62,71 @@ class UpdateSender:
             self.logger.info(f"неожиданный формат update vk:\n{raw_update}")
             return
 
-        self.connection = await aio_pika.connect_robust(
-            self.app.config.rabbitmq.url
-        )
+        confirmation = self._publish(update)
+        self.confirmations.append(confirmation)
+
+        if len(self.confirmations) >= self.app.config.rabbitmq.confirm_batch:
+            await self.wait_confirms()
+
+    async def send_updates(self, raw_updates: list[dict]) -> None:
+        """отправляет в брокер все updates из ответа long poll разом
+        и дожидается подтверждений брокера по всей пачке"""
+
+        confirmations = []
+        for raw_update in raw_updates:
+            try:
+                update = self._prepare_update(raw_update)
+            except KeyError:
+                self.logger.info(f"неожиданный формат update vk:\n{raw_update}")
+                continue
+            confirmations.append(self._publish(update))
 
-        async with self.connection:
-            self.channel = await self.connection.channel()
+        await self._check_confirmations(confirmations)
 
-            await self.channel.default_exchange.publish(
+    async def wait_confirms(self) -> None:
+        """дожидается подтверждений брокера по всем сообщениям,
+        отправленным через send_update"""
+
+        if not self.confirmations:
+            return
+
+        confirmations, self.confirmations = self.confirmations, []
+        await self._check_confirmations(confirmations)
+
+    async def _check_confirmations(self, confirmations: list[Task]) -> None:
+        """ждет подтверждений по переданным публикациям
+        и логирует неподтвержденные"""
+
+        results = await gather(*confirmations, return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.error("publish not confirmed", exc_info=result)
+
+    def _publish(self, update: Update) -> Task:
+        """публикует update в очередь шарда его беседы,
+        не дожидаясь подтверждения брокера. возвращает задачу-подтверждение"""
+
+        shard = shard_of(update.peer_id, self.app.config.rabbitmq.shards)
+        channel = self.channels[shard % len(self.channels)]
+
+        return create_task(
+            channel.default_exchange.publish(
                 aio_pika.Message(body=update.json.encode()),
-                routing_key=self.routing_key,
+                routing_key=shard_queue(shard),
             )
+        )
 
     def _prepare_update(self, raw_update: dict) -> Update:
-        if raw_update["object"]["message"].get("action"):
-            action_type = raw_update["object"]["message"]["action"]["type"]
-        else:
-            action_type = ""
+        action = raw_update["object"]["message"].get("action", {})
+        action_type = action.get("type", "")
+        action_member_id = action.get("member_id", 0)
 
         update = Update(
             id=raw_update["object"]["message"]["id"],
             type=raw_update["type"],
             action_type=action_type,
+            action_member_id=action_member_id,
             from_id=raw_update["object"]["message"]["from_id"],
             peer_id=raw_update["object"]["message"]["peer_id"],
             text=raw_update["object"]["message"]["text"],
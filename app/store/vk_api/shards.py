@@ -0,0 +1,58 @@
+"""шардирование updates по беседам.
+
+updates беседы всегда попадают в одну и ту же очередь vk_updates.{n},
+а каждую очередь обслуживает один процесс бота: события беседы,
+таймеры и состояние ее игры в памяти живут только на нем.
+шард выбирается jump consistent hash от peer_id (Lamping, Veach):
+при переходе от n шардов к n + 1 переезжает лишь 1 / (n + 1) бесед
+"""
+from typing import Optional
+
+QUEUE_PREFIX = "vk_updates"
+
+# второй потребитель очереди стоит в резерве, пока первый не отключится
+QUEUE_ARGUMENTS = {"x-single-active-consumer": True}
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """номер корзины от 0 до buckets - 1 для ключа"""
+
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, jump = -1, 0
+
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+
+    return bucket
+
+
+def shard_of(peer_id: int, shards: int) -> int:
+    return jump_hash(peer_id, shards)
+
+
+def shard_queue(shard: int) -> str:
+    return f"{QUEUE_PREFIX}.{shard}"
+
+
+def owner_queue(shard: int) -> str:
+    """эксклюзивная очередь-замок шарда. ее держит соединение процесса,
+    который обслуживает шард: второй процесс (например,
+    при перекрывающемся деплое) не может ее объявить и ждет в резерве,
+    не трогая ни очередь шарда, ни игры его бесед"""
+
+    return f"{shard_queue(shard)}.owner"
+
+
+def owned_shards(shards: int, owned: Optional[list[int]]) -> list[int]:
+    """шарды, которые обслуживает этот процесс: из конфига или все"""
+
+    if owned is None:
+        return list(range(shards))
+
+    for shard in owned:
+        if not 0 <= shard < shards:
+            raise ValueError(f"shard {shard} is out of range 0..{shards - 1}")
+
+    return sorted(set(owned))
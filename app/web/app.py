@@ -15,6 +15,7 @@ from app.store.database.database import Database
 from app.web.config import Config, setup_config
 from app.web.logger import setup_logging
 from app.web.middlewares import setup_middlewares
+from app.web.roles import Role
 from app.web.routes import setup_routes
 
 
@@ -22,6 +23,12 @@ class Application(AiohttpApplication):
     config: Optional[Config] = None
     store: Optional[Store] = None
     database: Optional[Database] = None
+    role: Role = Role.all
+
+    def runs(self, *roles: Role) -> bool:
+        """выполняет ли процесс хотя бы одну из ролей"""
+
+        return self.role == Role.all or self.role in roles
 
 
 class Request(AiohttpRequest):
@@ -53,7 +60,8 @@ class View(AiohttpView):
 app = Application()
 
 
-def setup_app(config_path: str) -> Application:
+def setup_app(config_path: str, role: Role = Role.all) -> Application:
+    app.role = role
     setup_logging(app)
     setup_config(app, config_path)
     session_setup(app, EncryptedCookieStorage(app.config.session.key))
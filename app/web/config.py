@@ -1,5 +1,5 @@
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 
 import yaml
 
@@ -33,6 +33,26 @@ class DatabaseConfig:
     user: str = "postgres"
     password: str = "postgres"
     database: str = "project"
+    # лог каждого запроса - только для отладки
+    echo: bool = False
+    profile_queries: bool = True
+    slow_queries: int = 5
+    # пул соединений: pool_size постоянных и до max_overflow временных
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # кэши подготовленных запросов asyncpg и sqlalchemy,
+    # 0 - выключены (нужно за pgbouncer в режиме transaction)
+    statement_cache_size: int = 100
+    prepared_statement_cache_size: int = 100
+    # повторы при сбоях соединения и предохранитель
+    retry_attempts: int = 3
+    retry_backoff: float = 0.1
+    retry_max_backoff: float = 2.0
+    breaker_threshold: int = 5
+    breaker_reset: float = 10.0
 
 
 @dataclass
@@ -43,6 +63,67 @@ class ServerConfig:
 @dataclass
 class RabbitMQConfig:
     url: str = "localhost"
+    publisher_channels: int = 4
+    confirm_batch: int = 100
+    shards: int = 1
+    # шарды, которые обслуживает этот процесс; None - все
+    owned_shards: list[int] | None = None
+
+
+@dataclass
+class PollerConfig:
+    queue_size: int = 100
+    workers: int = 2
+
+
+@dataclass
+class VkApiConfig:
+    rate_limit: float = 20
+    burst: int = 20
+    max_retries: int = 3
+    retry_backoff: float = 1.0
+    coalesce: bool = False
+    coalesce_window: float = 0.5
+    typing_delays: bool = True
+    execute_batching: bool = False
+    execute_window: float = 0.005
+    profile_ttl: float = 3600
+    profile_cache_size: int = 10000
+    members_ttl: float = 300
+
+
+@dataclass
+class GameConfig:
+    write_behind_delay: float = 1.0
+    timer_tick: float = 0.1
+    timer_slots: int = 1024
+    overdue_timers_rate: float = 5.0
+    actors_concurrency: int = 20
+    chat_cache_size: int = 10000
+
+
+@dataclass
+class HttpPoolConfig:
+    limit: int = 100
+    limit_per_host: int = 0
+    dns_ttl: int = 300
+    keepalive_timeout: float = 15
+    connect_timeout: float = 5
+    total_timeout: float = 10
+
+
+@dataclass
+class HttpConfig:
+    # long poll держит запрос до 30 секунд (wait=30)
+    longpoll: HttpPoolConfig = field(
+        default_factory=lambda: HttpPoolConfig(
+            limit=1, limit_per_host=1, total_timeout=40
+        )
+    )
+    api: HttpPoolConfig = field(default_factory=HttpPoolConfig)
+    upload: HttpPoolConfig = field(
+        default_factory=lambda: HttpPoolConfig(limit=4, total_timeout=60)
+    )
 
 
 @dataclass
@@ -53,6 +134,10 @@ class Config:
     database: DatabaseConfig = None
     server: ServerConfig = None
     rabbitmq: RabbitMQConfig = None
+    poller: PollerConfig = None
+    vk_api: VkApiConfig = None
+    http: HttpConfig = None
+    game: GameConfig = None
 
 
 def setup_config(app: "Application", config_path: str):
@@ -73,5 +158,14 @@ def setup_config(app: "Application", config_path: str):
         ),
         database=DatabaseConfig(**raw_config["database"]),
         server=ServerConfig(host=raw_config["server"]["host"]),
-        rabbitmq=RabbitMQConfig(url=raw_config["rabbitmq"]["url"]),
+        rabbitmq=RabbitMQConfig(**raw_config["rabbitmq"]),
+        poller=PollerConfig(**raw_config.get("poller", {})),
+        vk_api=VkApiConfig(**raw_config.get("vk_api", {})),
+        game=GameConfig(**raw_config.get("game", {})),
+        http=HttpConfig(
+            **{
+                name: replace(getattr(HttpConfig(), name), **pool)
+                for name, pool in raw_config.get("http", {}).items()
+            }
+        ),
     )
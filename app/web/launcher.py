@@ -0,0 +1,168 @@
+import asyncio
+import multiprocessing
+import signal
+import time
+from dataclasses import replace
+from logging import getLogger
+from multiprocessing.process import BaseProcess
+from typing import Optional
+
+from aiohttp.web import AppRunner, run_app
+
+from app.store.vk_api.shards import owned_shards
+from app.web.app import Application, setup_app
+from app.web.config import VkApiConfig, setup_config
+from app.web.logger import setup_logging
+from app.web.roles import Role
+
+# пауза перед перезапуском упавшего воркера
+RESTART_DELAY = 1.0
+# сколько ждать корректного завершения воркера после SIGTERM
+STOP_TIMEOUT = 30.0
+
+
+def run(
+    config_path: str,
+    role: Role,
+    shards: Optional[list[int]] = None,
+    processes: int = 1,
+) -> None:
+    """запускает процесс в заданной роли. api и all слушают http,
+    остальные роли работают без http сервера до SIGINT или SIGTERM.
+    shards - шарды воркера вместо rabbitmq.owned_shards из конфига,
+    processes - сколько воркеров делят лимит запросов к vk"""
+
+    app = setup_app(config_path, role)
+    if shards is not None:
+        app.config.rabbitmq.owned_shards = shards
+    app.config.vk_api = share_rate_limit(app.config.vk_api, processes)
+
+    if app.runs(Role.api):
+        run_app(app)
+    else:
+        asyncio.run(run_headless(app))
+
+
+async def run_headless(app: Application) -> None:
+    """выполняет запуск и остановку приложения без http сервера"""
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    runner = AppRunner(app, handle_signals=False)
+    await runner.setup()
+    getLogger("launcher").info(f"running as {app.role}")
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.shutdown()
+        await runner.cleanup()
+
+
+def run_worker(config_path: str, shards: list[int], processes: int) -> None:
+    """точка входа процесса воркера под супервизором"""
+
+    # обработчики сигналов супервизора достались от fork
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    run(config_path, Role.worker, shards, processes)
+
+
+def split_shards(
+    shards: int, owned: Optional[list[int]], workers: int
+) -> list[list[int]]:
+    """делит шарды процесса между воркерами поровну"""
+
+    owned = owned_shards(shards, owned)
+    if workers > len(owned):
+        raise ValueError(
+            f"{workers} workers need at least {workers} shards, "
+            f"got {len(owned)}"
+        )
+
+    return [owned[index::workers] for index in range(workers)]
+
+
+def share_rate_limit(config: VkApiConfig, processes: int) -> VkApiConfig:
+    """доля лимита токена vk на один из processes процессов:
+    у каждого свое ведро токенов, и вместе они не превышают лимит"""
+
+    return replace(
+        config,
+        rate_limit=config.rate_limit / processes,
+        burst=max(config.burst // processes, 1),
+    )
+
+
+class Supervisor:
+    """запускает воркеры в отдельных процессах, у каждого свои шарды.
+    упавший воркер перезапускается, SIGINT или SIGTERM
+    останавливает всех и ждет их корректного завершения"""
+
+    def __init__(self, config_path: str, workers: int):
+        self.config_path = config_path
+        self.logger = getLogger("supervisor")
+        self.context = multiprocessing.get_context("fork")
+        self.processes: dict[int, BaseProcess] = {}
+        self.stopping = False
+        self.restarts: int = 0
+
+        # конфиг читается только ради шардов, приложение создают воркеры
+        app = Application()
+        setup_logging(app)
+        setup_config(app, config_path)
+        config = app.config.rabbitmq
+        self.shards = split_shards(config.shards, config.owned_shards, workers)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+
+        for index in range(len(self.shards)):
+            self._start(index)
+
+        while not self.stopping:
+            for index, process in list(self.processes.items()):
+                if not process.is_alive() and not self.stopping:
+                    self.logger.error(
+                        f"worker {index} exited with code {process.exitcode}, "
+                        f"restarting"
+                    )
+                    self.restarts += 1
+                    time.sleep(RESTART_DELAY)
+                    self._start(index)
+            time.sleep(RESTART_DELAY)
+
+        self._shutdown()
+
+    def _start(self, index: int) -> None:
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.config_path, self.shards[index], len(self.shards)),
+            name=f"worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+        self.logger.info(
+            f"worker {index} started, pid={process.pid}, "
+            f"shards={self.shards[index]}"
+        )
+
+    def _stop(self, *_) -> None:
+        self.stopping = True
+
+    def _shutdown(self) -> None:
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in self.processes.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                self.logger.error(f"{process.name} did not stop, killing")
+                process.kill()
+                process.join()
@@ -0,0 +1,15 @@
+from strenum import StrEnum
+
+
+class Role(StrEnum):
+    """роли процесса бота. все роли читают один конфиг.
+
+    poller - long poll vk и публикация updates в брокер, без бд;
+    worker - разбор updates своих шардов, игры, таймеры и ответы в vk;
+    api - http api админки;
+    all - все сразу в одном процессе"""
+
+    poller = "poller"
+    worker = "worker"
+    api = "api"
+    all = "all"
@@ -0,0 +1,148 @@
+import asyncio
+from collections import defaultdict
+
+from pamqp import commands, frame
+from pamqp.body import ContentBody
+from pamqp.header import ContentHeader, ProtocolHeader
+
+SERVER_PROPERTIES = {
+    "product": "amqp stand-in",
+    "capabilities": {
+        "publisher_confirms": True,
+        "basic.nack": True,
+        "consumer_cancel_notify": True,
+        "exchange_exchange_bindings": True,
+        "connection.blocked": True,
+        "authentication_failure_close": True,
+        "per_consumer_qos": True,
+    },
+}
+
+
+class AMQPStandIn:
+    """минимальный локальный брокер AMQP 0-9-1 для бенчмарков.
+    умеет рукопожатие, каналы, publisher confirms и прием публикаций,
+    сообщения никуда не доставляет, только считает"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.server: asyncio.AbstractServer | None = None
+        self.published = 0
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        return f"amqp://guest:guest@{self.host}:{self.port}/"
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(
+            self._serve, self.host, self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        buffer = b""
+        confirming: set[int] = set()
+        delivery_tags: dict[int, int] = defaultdict(int)
+        body_left: dict[int, int] = {}
+
+        def send(value, channel_id: int = 0) -> None:
+            writer.write(frame.marshal(value, channel_id))
+
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                buffer += data
+
+                while buffer:
+                    try:
+                        consumed, channel_id, value = frame.unmarshal(buffer)
+                    except Exception:
+                        break
+                    buffer = buffer[consumed:]
+
+                    if isinstance(value, ProtocolHeader):
+                        send(
+                            commands.Connection.Start(
+                                server_properties=SERVER_PROPERTIES
+                            )
+                        )
+                    elif isinstance(value, commands.Connection.StartOk):
+                        send(
+                            commands.Connection.Tune(
+                                channel_max=2047, frame_max=131072
+                            )
+                        )
+                    elif isinstance(value, commands.Connection.Open):
+                        send(commands.Connection.OpenOk())
+                    elif isinstance(value, commands.Connection.Close):
+                        send(commands.Connection.CloseOk())
+                        await writer.drain()
+                        return
+                    elif isinstance(value, commands.Channel.Open):
+                        send(commands.Channel.OpenOk(), channel_id)
+                    elif isinstance(value, commands.Channel.Close):
+                        confirming.discard(channel_id)
+                        delivery_tags.pop(channel_id, None)
+                        send(commands.Channel.CloseOk(), channel_id)
+                    elif isinstance(value, commands.Confirm.Select):
+                        confirming.add(channel_id)
+                        send(commands.Confirm.SelectOk(), channel_id)
+                    elif isinstance(value, commands.Basic.Qos):
+                        send(commands.Basic.QosOk(), channel_id)
+                    elif isinstance(value, commands.Queue.Declare):
+                        send(
+                            commands.Queue.DeclareOk(
+                                queue=value.queue,
+                                message_count=0,
+                                consumer_count=0,
+                            ),
+                            channel_id,
+                        )
+                    elif isinstance(value, commands.Exchange.Declare):
+                        send(commands.Exchange.DeclareOk(), channel_id)
+                    elif isinstance(value, commands.Queue.Bind):
+                        send(commands.Queue.BindOk(), channel_id)
+                    elif isinstance(value, ContentHeader):
+                        body_left[channel_id] = value.body_size
+                        if not value.body_size:
+                            self._published(
+                                send, channel_id, confirming, delivery_tags
+                            )
+                    elif isinstance(value, ContentBody):
+                        body_left[channel_id] -= len(value.value)
+                        if body_left[channel_id] <= 0:
+                            self._published(
+                                send, channel_id, confirming, delivery_tags
+                            )
+
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            return
+        finally:
+            writer.close()
+
+    def _published(
+        self,
+        send,
+        channel_id: int,
+        confirming: set[int],
+        delivery_tags: dict[int, int],
+    ) -> None:
+        self.published += 1
+        if channel_id in confirming:
+            delivery_tags[channel_id] += 1
+            send(
+                commands.Basic.Ack(delivery_tag=delivery_tags[channel_id]),
+                channel_id,
+            )
@@ -0,0 +1,206 @@
+"""планы и время горячих запросов аксессора игр до и после индексов
+миграции 435a436c2215, на засеянных данных.
+
+бенчмарк создает в бд из конфига отдельную схему bench_indexes,
+засевает ее (на каждый чат - игра и три игрока, около 2% игр идут),
+выполняет запросы без индексов, строит индексы и выполняет их снова.
+схема удаляется в конце.
+
+запуск из корня проекта:
+    python -m benchmarks.bench_db_indexes [конфиг] [количество чатов]
+"""
+import asyncio
+import sys
+import time
+
+import yaml
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.game.models import ChatModel, GameModel, PlayerModel, VKUserModel
+from app.game.states import GameState
+from app.store.database import db
+from app.web.config import DatabaseConfig
+
+SCHEMA = "bench_indexes"
+RUNS = 20
+
+
+def hot_queries(chats: int) -> dict[str, str]:
+    """запросы в том виде, в каком их строит GameAccessor"""
+
+    game_id = chats // 2
+    queries = {
+        "get_active_players": select(PlayerModel).filter_by(
+            game_id=game_id, is_active=True
+        ),
+        "count_losers": select(func.count())
+        .select_from(PlayerModel)
+        .filter_by(cash=0, game_id=game_id),
+        "get_game_by_vk_id": select(GameModel).filter(
+            GameModel.chat.has(vk_id=2000000000 + game_id)
+        ),
+        "get_players_of_user": select(PlayerModel).filter(
+            PlayerModel.vk_user.has(vk_id=100000 + game_id)
+        ),
+        "get_vk_user_by_vk_id": select(VKUserModel).filter_by(
+            vk_id=100000 + game_id
+        ),
+        "get_active_games": select(GameModel).filter(
+            GameModel.state != GameState.inactive
+        ),
+    }
+    return {
+        name: str(
+            query.compile(
+                dialect=postgresql.dialect(),
+                compile_kwargs={"literal_binds": True},
+            )
+        )
+        for name, query in queries.items()
+    }
+
+
+SEED = [
+    """
+    INSERT INTO chat (vk_id, casino_cash, games_played)
+    SELECT 2000000000 + n, 0, 0 FROM generate_series(1, {chats}) n
+    """,
+    """
+    INSERT INTO vk_user (vk_id, name, sex)
+    SELECT 100000 + n, 'user ' || n, 'female'
+    FROM generate_series(1, {chats}) n
+    """,
+    """
+    INSERT INTO game (chat_id, state, dealer_hand)
+    SELECT n, CASE WHEN n % 50 = 0 THEN 'betting' ELSE 'inactive' END,
+        '{{"cards": []}}'
+    FROM generate_series(1, {chats}) n
+    """,
+    """
+    INSERT INTO player (
+        user_id, game_id, cash, hand, is_active,
+        games_played, games_won, games_lost
+    )
+    SELECT (n + seat * 7919) % {chats} + 1, n,
+        CASE WHEN (n + seat) % 10 = 0 THEN 0 ELSE 1000 END,
+        '{{"cards": []}}', seat < 2, 0, 0, 0
+    FROM generate_series(1, {chats}) n, generate_series(0, 2) seat
+    """,
+]
+
+
+async def seed(connection: AsyncConnection, chats: int) -> None:
+    for statement in SEED:
+        await connection.execute(text(statement.format(chats=chats)))
+
+
+async def measure(
+    connection: AsyncConnection, queries: dict[str, str]
+) -> dict[str, tuple[str, float]]:
+    """верхний узел и чтения таблиц из плана, среднее время выполнения каждого запроса"""
+
+    await connection.execute(text("ANALYZE"))
+    results = {}
+
+    for name, query in queries.items():
+        plan = await connection.execute(text(f"EXPLAIN {query}"))
+        nodes = [
+            line.split("  (")[0].strip(" ->")
+            for line in plan.scalars().all()
+            if "  (cost=" in line
+        ]
+        scans = [node for node in nodes[1:] if "Scan" in node]
+        top = ", ".join([nodes[0], *scans])
+
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            await connection.execute(text(query))
+        elapsed = (time.perf_counter() - start) / RUNS
+
+        results[name] = (top, elapsed * 1000)
+
+    return results
+
+
+async def main(config_path: str, chats: int) -> None:
+    with open(config_path, "r") as f:
+        config = DatabaseConfig(**yaml.safe_load(f)["database"])
+
+    engine = create_async_engine(
+        f"{config.type}+{config.driver}://{config.user}:{config.password}"
+        f"@{config.host}:{config.port}/{config.database}",
+        connect_args={"server_settings": {"search_path": SCHEMA}},
+    )
+    tables = [
+        ChatModel.__table__,
+        VKUserModel.__table__,
+        GameModel.__table__,
+        PlayerModel.__table__,
+    ]
+    indexes = [index for table in tables for index in table.indexes]
+
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(
+                text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            )
+            await connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            await connection.run_sync(db.metadata.create_all, tables=tables)
+
+            # состояние до миграции: ни индексов, ни уникальности vk_id
+            for index in indexes:
+                await connection.execute(text(f"DROP INDEX {index.name}"))
+            await connection.execute(
+                text("ALTER TABLE vk_user DROP CONSTRAINT vk_user_vk_id_key")
+            )
+
+            start = time.perf_counter()
+            await seed(connection, chats)
+            print(
+                f"засеяно {chats} чатов за {time.perf_counter() - start:.1f} с"
+            )
+
+        queries = hot_queries(chats)
+
+        async with engine.connect() as connection:
+            before = await measure(connection, queries)
+
+        async with engine.begin() as connection:
+            for index in indexes:
+                await connection.run_sync(index.create)
+            await connection.execute(
+                text(
+                    "ALTER TABLE vk_user "
+                    "ADD CONSTRAINT vk_user_vk_id_key UNIQUE (vk_id)"
+                )
+            )
+
+        async with engine.connect() as connection:
+            after = await measure(connection, queries)
+
+        for name in queries:
+            (plan_before, ms_before), (plan_after, ms_after) = (
+                before[name],
+                after[name],
+            )
+            print(f"\n{name}")
+            print(f"  до:    {ms_before:8.3f} мс  {plan_before}")
+            print(f"  после: {ms_after:8.3f} мс  {plan_after}")
+
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(
+                text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            sys.argv[1] if len(sys.argv) > 1 else "config.yml",
+            int(sys.argv[2]) if len(sys.argv) > 2 else 100000,
+        )
+    )
@@ -0,0 +1,133 @@
+"""50 тысяч одновременных таймеров игр: прежняя схема с задачей
+asyncio.sleep на каждый таймер против колеса GameTimerManager.
+
+для каждой схемы замеряются постановка всех таймеров, отмена половины,
+память на ожидающие таймеры, число задач в цикле событий
+и опоздание срабатываний относительно сроков.
+
+запуск из корня проекта:
+    python -m benchmarks.bench_game_timers [количество таймеров]
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from app.store.game.timer import GameTimerManager
+
+SPREAD = 2.0
+BASE = 1.0
+
+
+class SleepingTimers:
+    """прежний GameTimerManager: задача со sleep на каждый таймер"""
+
+    def __init__(self):
+        self.tasks: dict[int, asyncio.Task] = {}
+
+    async def _wait(self, sec, vk_id, game_id, next_method):
+        await asyncio.sleep(sec)
+        del self.tasks[game_id]
+        await next_method(vk_id, game_id)
+
+    def start_timer(self, sec, vk_id, game_id, next_method):
+        self.tasks[game_id] = asyncio.create_task(
+            self._wait(sec, vk_id, game_id, next_method)
+        )
+
+    def end_timer(self, game_id):
+        task = self.tasks.pop(game_id, None)
+        if task:
+            task.cancel()
+
+
+async def idle(vk_id: int, game_id: int) -> None:
+    pass
+
+
+async def measure_memory(timers, count: int) -> tuple[float, int]:
+    """память и задачи цикла под count ожидающих таймеров"""
+
+    gc.collect()
+    tracemalloc.start()
+    for game_id in range(count):
+        timers.start_timer(60, 2000000000 + game_id, game_id, idle)
+    # память под корутины прежней схемы выделяется на первом шаге задач
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tasks = len(asyncio.all_tasks()) - 1
+
+    for game_id in range(count):
+        timers.end_timer(game_id)
+    await asyncio.sleep(0)
+
+    return memory / 2**20, tasks
+
+
+async def run(timers, count: int) -> dict:
+    memory, tasks = await measure_memory(timers, count)
+
+    deadlines: dict[int, float] = {}
+    lateness: list[float] = []
+    done = asyncio.Event()
+    expected = count - count // 2
+
+    async def fired(vk_id: int, game_id: int):
+        lateness.append(time.monotonic() - deadlines[game_id])
+        if len(lateness) == expected:
+            done.set()
+
+    start = time.perf_counter()
+    for game_id in range(count):
+        sec = BASE + SPREAD * game_id / count
+        deadlines[game_id] = time.monotonic() + sec
+        timers.start_timer(sec, 2000000000 + game_id, game_id, fired)
+    schedule = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for game_id in range(0, count, 2):
+        timers.end_timer(game_id)
+    cancel = time.perf_counter() - start
+
+    await asyncio.wait_for(done.wait(), BASE + SPREAD + 5)
+    await asyncio.sleep(0.1)
+    lateness.sort()
+
+    return {
+        "schedule": schedule * 1000,
+        "cancel": cancel * 1000,
+        "memory": memory,
+        "tasks": tasks,
+        "fired": len(lateness),
+        "p50": lateness[len(lateness) // 2] * 1000,
+        "p99": lateness[int(len(lateness) * 0.99)] * 1000,
+        "max": lateness[-1] * 1000,
+    }
+
+
+async def main(count: int) -> None:
+    results = {
+        "sleep на таймер": await run(SleepingTimers(), count),
+        "колесо": await run(GameTimerManager(), count),
+    }
+
+    print(
+        f"{count} таймеров со сроками {BASE}-{BASE + SPREAD} с, половина отменяется"
+    )
+    for name, result in results.items():
+        print(f"\n{name}")
+        print(f"  постановка:     {result['schedule']:8.1f} мс")
+        print(f"  отмена:         {result['cancel']:8.1f} мс")
+        print(f"  память:         {result['memory']:8.1f} МБ")
+        print(f"  задач в цикле:  {result['tasks']:8d}")
+        print(f"  сработало:      {result['fired']:8d}")
+        print(
+            f"  опоздание:      p50 {result['p50']:.1f} мс, "
+            f"p99 {result['p99']:.1f} мс, max {result['max']:.1f} мс"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000))
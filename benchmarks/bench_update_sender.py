@@ -0,0 +1,124 @@
+"""сравнение пропускной способности UpdateSender с прежней схемой
+"соединение и канал на каждый update" и пакетной отправки send_updates.
+
+запуск из корня проекта:
+    python -m benchmarks.bench_update_sender [количество updates]
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+import aio_pika
+
+from app.store.vk_api.sender import UpdateSender
+from app.store.vk_api.shards import shard_of, shard_queue
+from app.web.config import RabbitMQConfig
+from app.web.roles import Role
+from benchmarks.amqp_standin import AMQPStandIn
+
+
+def make_raw_update(i: int) -> dict:
+    return {
+        "type": "message_new",
+        "object": {
+            "message": {
+                "id": i,
+                "from_id": 1000 + i % 50,
+                "peer_id": 2000000000 + i % 20,
+                "text": "играю",
+            }
+        },
+    }
+
+
+def make_app(url: str) -> SimpleNamespace:
+    """заглушка приложения в роли поллера - только ему нужен отправитель"""
+
+    return SimpleNamespace(
+        config=SimpleNamespace(rabbitmq=RabbitMQConfig(url=url)),
+        role=Role.poller,
+        runs=lambda *roles: Role.poller in roles,
+        on_startup=[],
+        on_cleanup=[],
+    )
+
+
+async def bench_legacy(url: str, raw_updates: list[dict]) -> float:
+    """прежнее поведение: connect_robust и новый канал на каждый update.
+    update уходит в очередь своего шарда, как у UpdateSender"""
+
+    config = RabbitMQConfig(url=url)
+    sender = UpdateSender(SimpleNamespace(on_startup=[], on_cleanup=[]))
+    start = time.perf_counter()
+
+    for raw_update in raw_updates:
+        update = sender._prepare_update(raw_update)
+        connection = await aio_pika.connect_robust(url)
+        async with connection:
+            channel = await connection.channel()
+            await channel.default_exchange.publish(
+                aio_pika.Message(body=update.json.encode()),
+                routing_key=shard_queue(
+                    shard_of(update.peer_id, config.shards)
+                ),
+            )
+
+    return time.perf_counter() - start
+
+
+async def bench_pooled(url: str, raw_updates: list[dict]) -> float:
+    """постоянное соединение, пул каналов и пачки подтверждений"""
+
+    app = make_app(url)
+    sender = UpdateSender(app)
+    await sender.connect(app)
+    start = time.perf_counter()
+
+    for raw_update in raw_updates:
+        await sender.send_update(raw_update)
+    await sender.wait_confirms()
+
+    elapsed = time.perf_counter() - start
+    await sender.disconnect(app)
+    return elapsed
+
+
+async def bench_batched(url: str, raw_updates: list[dict]) -> float:
+    """пачки по 100 updates, как в ответе long poll, через send_updates"""
+
+    app = make_app(url)
+    sender = UpdateSender(app)
+    await sender.connect(app)
+    start = time.perf_counter()
+
+    for i in range(0, len(raw_updates), 100):
+        await sender.send_updates(raw_updates[i : i + 100])
+
+    elapsed = time.perf_counter() - start
+    await sender.disconnect(app)
+    return elapsed
+
+
+async def main(amount: int) -> None:
+    broker = AMQPStandIn()
+    await broker.start()
+    raw_updates = [make_raw_update(i) for i in range(amount)]
+
+    try:
+        for name, bench in (
+            ("legacy", bench_legacy),
+            ("pooled", bench_pooled),
+            ("batched", bench_batched),
+        ):
+            elapsed = await bench(broker.url, raw_updates)
+            print(
+                f"{name:>8}: {amount} updates за {elapsed:.3f} с, "
+                f"{amount / elapsed:,.0f} updates/с"
+            )
+    finally:
+        await broker.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
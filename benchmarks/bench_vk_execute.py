@@ -0,0 +1,73 @@
+"""сравнение отправки сообщений в vk по одному запросу на вызов
+и пачками через execute, на локальной имитации api vk.
+
+ограничение частоты запросов то же, что и в боевом конфиге,
+поэтому выигрыш execute виден в том числе на нем.
+
+запуск из корня проекта:
+    python -m benchmarks.bench_vk_execute [количество сообщений] [задержка]
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from app.store.vk_api import accessor
+from app.store.vk_api.accessor import VkApiAccessor
+from app.store.vk_api.dataclasses import BotMessage
+from app.web.config import BotConfig, HttpConfig, VkApiConfig
+from tests.fake_vk_server import FakeVkServer
+
+
+async def bench(
+    amount: int, latency: float, execute_batching: bool
+) -> tuple[float, int]:
+    server = FakeVkServer(latency=latency)
+    await server.start()
+    accessor.API_PATH = server.api_path
+
+    app = SimpleNamespace(
+        config=SimpleNamespace(
+            bot=BotConfig(token="token", group_id=1),
+            vk_api=VkApiConfig(execute_batching=execute_batching),
+            http=HttpConfig(),
+        ),
+        on_startup=[],
+        on_cleanup=[],
+    )
+    vk_api = VkApiAccessor(app)
+    vk_api.open_http()
+    messages = [
+        BotMessage(peer_id=2000000000 + i % 20, text=f"сообщение {i}")
+        for i in range(amount)
+    ]
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[vk_api._send_message(message) for message in messages]
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        await vk_api.close_http()
+        await server.stop()
+
+    return elapsed, len(server.requests)
+
+
+async def main(amount: int, latency: float) -> None:
+    for name, execute_batching in (("plain", False), ("execute", True)):
+        elapsed, requests = await bench(amount, latency, execute_batching)
+        print(
+            f"{name:>8}: {amount} сообщений за {elapsed:.3f} с, "
+            f"{requests} http-запросов"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+            float(sys.argv[2]) if len(sys.argv) > 2 else 0.02,
+        )
+    )
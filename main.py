@@ -1,14 +1,37 @@
+import argparse
 import os
 
-from aiohttp.web import run_app
-
-from app.web.app import setup_app
+from app.web.launcher import Supervisor, run
+from app.web.roles import Role
 
 if __name__ == "__main__":
-    run_app(
-        setup_app(
-            config_path=os.path.join(
-                os.path.dirname(os.path.realpath(__file__)), "config.yml"
-            )
-        )
+    parser = argparse.ArgumentParser(description="Black Jack VK bot")
+    parser.add_argument(
+        "--config",
+        default=os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "config.yml"
+        ),
+        help="путь к конфигу, один на все роли",
+    )
+    parser.add_argument(
+        "--role",
+        type=Role,
+        choices=list(Role),
+        default=Role.all,
+        help="poller, worker, api или all - все в одном процессе",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="больше одного - супервизор запускает столько процессов "
+        "воркеров и делит между ними шарды (только для роли worker)",
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if args.role != Role.worker:
+            parser.error("--workers is only supported with --role worker")
+        Supervisor(args.config, args.workers).run()
+    else:
+        run(args.config, args.role)
@@ -0,0 +1,96 @@
+import pytest
+from aiohttp.test_utils import TestClient
+
+from app.store import Store
+from app.store.vk_api.batcher import ExecuteBatcher
+from app.store.vk_api.members import ChatMembersCache
+from app.store.vk_api.outbox import MessageOutbox
+from app.store.vk_api.poller import Poller
+from app.store.vk_api.profiles import ProfileCache
+from app.web.config import Config
+from app.web.roles import Role
+
+
+class TestMetricsView:
+    async def test_unauthorized_metrics_get(self, cli: TestClient):
+        """проверка безуспешности получения метрик
+        неавторизованным пользователем"""
+
+        response = await cli.get("/admin.metrics")
+
+        assert response.status == 401
+
+        data = await response.json()
+        assert data["status"] == "unauthorized"
+
+    async def test_succesful_metrics_get(
+        self, authed_cli: TestClient, store: Store, config: Config
+    ):
+        """проверка получения метрик незапущенных poller и outbox"""
+
+        store.vk_api.poller = Poller(store)
+        store.vk_api.outbox = MessageOutbox(store.vk_api)
+        store.vk_api.batcher = ExecuteBatcher(store.vk_api)
+        store.vk_api.profiles = ProfileCache(store.vk_api)
+        store.vk_api.members = ChatMembersCache(store.vk_api)
+        store.vk_api.buckets = {}
+        store.vk_api.http_pools = []
+
+        response = await authed_cli.get("/admin.metrics")
+
+        assert response.status == 200
+
+        data = await response.json()
+        assert data["status"] == "ok"
+        assert data["data"]["poller"]["queue_depth"] == 0
+        assert data["data"]["poller"]["batches_sent"] == 0
+        assert data["data"]["outbox"]["pending"] == 0
+        assert data["data"]["execute"]["requests"] == 0
+        assert data["data"]["profiles"]["hits"] == 0
+        assert data["data"]["members"]["chats"] == 0
+        assert data["data"]["rate_limit"] == []
+        assert data["data"]["http"] == {}
+        assert data["data"]["active_games"]["dirty"] == 0
+        assert data["data"]["db_pool"]["size"] == config.database.pool_size
+        assert data["data"]["db_pool"]["timeouts"] == 0
+        assert data["data"]["game_timers"]["pending"] == 0
+        assert data["data"]["game_actors"]["pending"] == 0
+        assert data["data"]["db_retry"]["state"] == "closed"
+        assert data["data"]["updates"]["failed"] == 0
+        assert data["data"]["role"] == Role.all
+
+    async def test_api_role_metrics_get(
+        self,
+        server,
+        authed_cli: TestClient,
+        store: Store,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        """проверка, что процесс api не показывает метрики
+        компонентов поллера и воркера, а только свои"""
+
+        monkeypatch.setattr(store.vk_api, "poller", None)
+        monkeypatch.setattr(server, "role", Role.api)
+
+        response = await authed_cli.get("/admin.metrics")
+
+        assert response.status == 200
+
+        data = (await response.json())["data"]
+        assert data["role"] == Role.api
+        for section in (
+            "poller",
+            "outbox",
+            "execute",
+            "profiles",
+            "members",
+            "http",
+            "active_games",
+            "game_timers",
+            "game_actors",
+            "updates",
+            "rate_limit",
+        ):
+            assert data[section] is None
+        assert data["db_pool"]["timeouts"] == 0
+        assert data["db_retry"]["state"] == "closed"
@@ -0,0 +1,51 @@
+from aiohttp.test_utils import TestClient
+
+from app.store import Database
+from app.store.database.profiler import fingerprint
+
+
+class TestQueryProfileView:
+    async def test_unauthorized_queries_get(self, cli: TestClient):
+        """проверка безуспешности получения профиля запросов
+        неавторизованным пользователем"""
+
+        response = await cli.get("/admin.queries")
+
+        assert response.status == 401
+
+    async def test_queries_attributed_to_method(
+        self, authed_cli: TestClient, server
+    ):
+        """проверка того, что запрос входа админа попал в профиль
+        под методом аксессора, который его сделал"""
+
+        database: Database = server.database
+        database.profiler.reset()
+        await server.store.admin.get_by_email(server.config.admin.email)
+
+        response = await authed_cli.get("/admin.queries")
+
+        assert response.status == 200
+
+        data = (await response.json())["data"]
+        assert data["queries"] >= 1
+        assert sum(data["histogram"].values()) == data["queries"]
+
+        statements = data["methods"]["AdminAccessor.get_by_email"]
+        assert statements[0]["count"] >= 1
+        assert statements[0]["rows"] >= 1
+        assert "FROM admins" in statements[0]["statement"]
+
+    async def test_fingerprint_folds_values(self):
+        """проверка того, что запросы с разным числом значений
+        считаются одним запросом"""
+
+        two = fingerprint(
+            "SELECT * FROM player WHERE id IN ($1::INTEGER, $2::INTEGER)"
+        )
+        three = fingerprint(
+            "SELECT *  FROM player\n WHERE id IN ($1::INTEGER, $2, $3)"
+        )
+
+        assert fingerprint("SELECT 1 WHERE a = 'x'") == "SELECT ? WHERE a = ?"
+        assert two == three
@@ -0,0 +1,135 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import select
+
+from app.game.models import GameModel, PlayerModel, VKUserModel
+from app.game.states import GameState
+from app.store import Store
+from app.web.config import GameConfig
+
+
+async def stored_game(server) -> GameModel:
+    async with server.database.session() as session:
+        result = await session.execute(select(GameModel).filter_by(id=1))
+        return result.scalars().first()
+
+
+async def stored_player(server) -> PlayerModel:
+    async with server.database.session() as session:
+        result = await session.execute(select(PlayerModel).filter_by(id=1))
+        return result.scalars().first()
+
+
+@pytest.fixture
+def short_write_behind(server):
+    config = server.config
+    server.config = replace(config, game=GameConfig(write_behind_delay=0.1))
+    yield
+    server.config = config
+
+
+class TestActiveGames:
+    async def test_turn_written_behind(
+        self, server, store: Store, vk_user_3: VKUserModel, short_write_behind
+    ):
+        """проверка, что ход игры сразу виден через аксессор,
+        а в бд попадает с задержкой"""
+
+        await store.game.set_current_player(1, 1)
+        await store.game.add_cards_to_player(1, ["A", "K"])
+
+        assert (await store.game.get_game_by_id(1)).current_player_id == 1
+        assert (await store.game.get_player_by_id(1)).hand == {
+            "cards": ["A", "K"]
+        }
+        assert (await stored_game(server)).current_player_id is None
+
+        await asyncio.sleep(0.2)
+
+        assert (await stored_game(server)).current_player_id == 1
+        assert (await stored_player(server)).hand == {"cards": ["A", "K"]}
+
+    async def test_stage_flushed(
+        self, server, store: Store, vk_user_3: VKUserModel
+    ):
+        """проверка, что смена стадии сохраняет накопленное сразу"""
+
+        await store.game.add_cards_to_player(1, ["A"])
+        await store.game.set_game_state(1, GameState.dealing_players)
+
+        assert (await stored_game(server)).state == GameState.dealing_players
+        assert (await stored_player(server)).hand == {"cards": ["A"]}
+
+    async def test_handler_failure_rolled_back(
+        self, server, store: Store, vk_user_3: VKUserModel
+    ):
+        """проверка, что обработчик, упавший на полпути,
+        не оставляет в памяти и в бд ничего из своих изменений"""
+
+        with pytest.raises(RuntimeError):
+            async with server.database.unit_of_work():
+                await store.game.add_game_played_to_player(1)
+                await store.game.add_cards_to_player(1, ["A"])
+                await store.game.set_game_state(1, GameState.dealing_players)
+                raise RuntimeError
+
+        assert (await store.game.get_game_by_id(1)).state == GameState.inactive
+        assert (await store.game.get_player_by_id(1)).hand == {"cards": []}
+
+        await store.game.active.flush()
+
+        assert (await stored_game(server)).state == GameState.inactive
+        assert (await stored_player(server)).hand == {"cards": []}
+        assert (await stored_player(server)).games_played == 2
+
+    async def test_rollback_keeps_earlier_changes(
+        self, server, store: Store, vk_user_3: VKUserModel
+    ):
+        """проверка, что откат возвращает запись к состоянию до единицы
+        работы, не теряя ее прежних несохраненных изменений"""
+
+        await store.game.set_current_player(1, 1)
+
+        with pytest.raises(RuntimeError):
+            async with server.database.unit_of_work():
+                await store.game.set_game_state(1, GameState.betting)
+                raise RuntimeError
+
+        game = await store.game.get_game_by_id(1)
+        assert game.state == GameState.inactive
+        assert game.current_player_id == 1
+
+        await store.game.active.flush()
+
+        assert (await stored_game(server)).state == GameState.inactive
+        assert (await stored_game(server)).current_player_id == 1
+
+    async def test_open_unit_of_work_not_flushed(
+        self, server, store: Store, vk_user_3: VKUserModel
+    ):
+        """проверка, что сохранение из другой задачи не пишет
+        изменения еще не зафиксированной единицы работы"""
+
+        async with server.database.unit_of_work():
+            await store.game.set_current_player(1, 1)
+            await asyncio.create_task(store.game.active.flush())
+
+            assert (await stored_game(server)).current_player_id is None
+
+        await store.game.active.flush()
+
+        assert (await stored_game(server)).current_player_id == 1
+
+    async def test_finished_game_evicted(
+        self, store: Store, vk_user_3: VKUserModel
+    ):
+        """проверка, что закончившаяся игра не остается в памяти"""
+
+        await store.game.set_game_state(1, GameState.gathering)
+        await store.game.add_cards_to_player(1, ["A"])
+        await store.game.set_game_state(1, GameState.inactive)
+
+        assert store.game.active.stats()["games"] == 0
+        assert store.game.active.stats()["hands"] == 0
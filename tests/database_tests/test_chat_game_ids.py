@@ -0,0 +1,77 @@
+from dataclasses import replace
+
+import pytest
+
+from app.store import Database, Store
+
+
+class TestChatGameIds:
+    async def test_known_chat_by_primary_key(
+        self, store: Store, statements: list[str]
+    ):
+        """проверка, что игра известной беседы и чат известной игры
+        ищутся одним запросом по первичному ключу, без подзапросов"""
+
+        chat = await store.game.create_chat(2000000001)
+        game = await store.game.create_game(chat.id)
+        assert (await store.game.get_game_by_vk_id(2000000001)).id == game.id
+
+        statements.clear()
+        assert (await store.game.get_game_by_vk_id(2000000001)).id == game.id
+        assert (await store.game.get_chat_by_game_id(game.id)).id == chat.id
+
+        assert len(statements) == 2
+        assert all("JOIN" not in statement for statement in statements)
+        assert all("EXISTS" not in statement for statement in statements)
+        assert "WHERE game.id = " in statements[0]
+        assert "WHERE chat.id = " in statements[1]
+
+    async def test_rolled_back_game_forgotten(self, server, store: Store):
+        """проверка, что запомненная игра из откаченной единицы работы
+        не мешает найти игру, созданную заново"""
+
+        database: Database = server.database
+
+        with pytest.raises(RuntimeError):
+            async with database.unit_of_work():
+                chat = await store.game.create_chat(2000000001)
+                await store.game.create_game(chat.id)
+                assert await store.game.get_game_by_vk_id(2000000001)
+                raise RuntimeError
+
+        chat = await store.game.create_chat(2000000001)
+        game = await store.game.create_game(chat.id)
+
+        assert (await store.game.get_game_by_vk_id(2000000001)).id == game.id
+        assert (await store.game.get_chat_by_game_id(game.id)).id == chat.id
+
+    async def test_cache_size_capped(
+        self, server, store: Store, monkeypatch: pytest.MonkeyPatch
+    ):
+        """проверка, что запоминается не больше chat_cache_size бесед,
+        а вытесненная беседа находится снова"""
+
+        monkeypatch.setattr(
+            server,
+            "config",
+            replace(
+                server.config,
+                game=replace(server.config.game, chat_cache_size=2),
+            ),
+        )
+
+        games = {}
+        for vk_id in (2000000001, 2000000002, 2000000003):
+            chat = await store.game.create_chat(vk_id)
+            games[vk_id] = (await store.game.create_game(chat.id)).id
+            await store.game.get_game_by_vk_id(vk_id)
+
+        assert list(store.game.chat_games) == [2000000002, 2000000003]
+        assert set(store.game.game_chats) == {
+            games[2000000002],
+            games[2000000003],
+        }
+
+        game = await store.game.get_game_by_vk_id(2000000001)
+        assert game.id == games[2000000001]
+        assert list(store.game.chat_games) == [2000000003, 2000000001]
@@ -0,0 +1,49 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.store import Database
+from app.web.config import Config
+
+
+class TestConnectionPool:
+    async def test_pool_configured(self, server, config: Config):
+        """проверка, что размер пула и таймаут взяты из конфига"""
+
+        pool = server.database._engine.pool
+
+        assert pool.size() == config.database.pool_size
+        assert pool._max_overflow == config.database.max_overflow
+        assert pool._timeout == config.database.pool_timeout
+
+    async def test_overflow_and_wait_counted(self, server, config: Config):
+        """проверка, что занятые и временные соединения
+        и время их получения видны в статистике пула"""
+
+        database: Database = server.database
+        before = database.pool_stats()["checkouts"]
+        connections = config.database.pool_size + 1
+        held = asyncio.Event()
+        opened = []
+
+        async def hold_connection():
+            async with database._engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                opened.append(connection)
+                await held.wait()
+
+        tasks = [
+            asyncio.create_task(hold_connection()) for _ in range(connections)
+        ]
+        while len(opened) < connections:
+            await asyncio.sleep(0.01)
+
+        stats = database.pool_stats()
+        held.set()
+        await asyncio.gather(*tasks)
+
+        assert stats["checked_out"] == connections
+        assert stats["overflow"] == 1
+        assert stats["checkouts"] - before == connections
+        assert stats["wait_time"] >= 0
+        assert database.pool_stats()["checked_out"] == 0
@@ -0,0 +1,81 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.game.models import PlayerModel, VKUserModel
+from app.store import Store
+from app.store.vk_api.dataclasses import Update
+
+
+class TestGameContext:
+    async def test_context_loaded(self, store: Store, vk_user_2: VKUserModel):
+        """проверка, что беседа, игра, пользователь и его игрок
+        в игре этой беседы загружаются вместе"""
+
+        ctx = await store.game.get_game_context(2000000001, vk_user_2.vk_id)
+
+        assert ctx.chat.vk_id == 2000000001
+        assert ctx.game.chat_id == ctx.chat.id
+        assert ctx.vk_user.id == vk_user_2.id
+        assert ctx.player.game_id == ctx.game.id
+        assert ctx.player.vk_user.name == vk_user_2.name
+        assert not ctx.game_is_on
+
+    async def test_unknown_chat(self, store: Store, vk_user_1: VKUserModel):
+        """проверка пустого контекста для незнакомой беседы"""
+
+        ctx = await store.game.get_game_context(2000000099, vk_user_1.vk_id)
+
+        assert ctx.chat is None
+        assert ctx.game is None
+        assert not ctx.game_is_on
+
+    async def test_guard_uses_context(
+        self, store: Store, vk_user_2: VKUserModel, statements: list[str]
+    ):
+        """проверка, что команда при выключенной игре
+        обходится одним запросом к бд"""
+
+        store.vk_api.send_message.reset_mock()
+        await store.bot_manager.handle_update(
+            Update(
+                id=1,
+                type="message_new",
+                from_id=vk_user_2.vk_id,
+                peer_id=2000000001,
+                text="рука",
+            )
+        )
+
+        selects = [s for s in statements if s.lstrip().startswith("SELECT")]
+        assert len(selects) == 1
+        assert store.vk_api.send_message.await_count == 1
+
+    async def test_cash_command_keeps_cash(
+        self, store: Store, vk_user_2: VKUserModel, db_session: AsyncSession
+    ):
+        """проверка, что команда баланса показывает остаток за вычетом
+        ставки, но не списывает ставку с баланса в бд"""
+
+        async with db_session.begin() as session:
+            await session.execute(
+                update(PlayerModel).filter_by(id=1).values(cash=1000, bet=100)
+            )
+
+        store.vk_api.send_message.reset_mock()
+        await store.bot_manager.handle_update(
+            Update(
+                id=1,
+                type="message_new",
+                from_id=vk_user_2.vk_id,
+                peer_id=2000000001,
+                text="кошель",
+            )
+        )
+
+        message = store.vk_api.send_message.await_args.args[0]
+        assert "900" in message.text
+
+        async with db_session.begin() as session:
+            player = await session.scalar(select(PlayerModel).filter_by(id=1))
+        assert player.cash == 1000
+        assert player.bet == 100
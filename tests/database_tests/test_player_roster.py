@@ -0,0 +1,35 @@
+from sqlalchemy import event
+
+from app.game.models import VKUserModel
+from app.store import Store
+
+
+class TestPlayerRoster:
+    async def test_active_players_with_users(
+        self, server, store: Store, vk_user_3: VKUserModel
+    ):
+        """проверка, что активные игроки и их имена
+        достаются одним запросом"""
+
+        await store.game.set_player_state(1, True)
+
+        statements = []
+
+        def on_execute(*args):
+            statements.append(args[2])
+
+        engine = server.database._engine.sync_engine
+        event.listen(engine, "before_cursor_execute", on_execute)
+        players = await store.game.get_active_players_with_users(1)
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+        assert [player.vk_user.name for player in players] == ["Юлия"]
+        assert len(statements) == 1
+
+    async def test_player_with_user(self, store: Store, vk_user_3: VKUserModel):
+        """проверка получения игрока вместе с пользователем вк"""
+
+        player = await store.game.get_player_with_user(1)
+
+        assert player.vk_user.vk_id == vk_user_3.vk_id
+        assert player.vk_user.sex == "female"
@@ -0,0 +1,126 @@
+import asyncio
+from dataclasses import replace
+from time import monotonic
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.store.database.retry import DatabaseUnavailable, RetryPolicy
+from app.web.config import Config
+
+
+@pytest.fixture
+def retry(config: Config) -> RetryPolicy:
+    database = replace(
+        config.database,
+        retry_attempts=3,
+        retry_backoff=0.001,
+        retry_max_backoff=0.001,
+        breaker_threshold=4,
+        breaker_reset=60,
+    )
+    app = SimpleNamespace(config=replace(config, database=database))
+    return RetryPolicy(app)
+
+
+def failing(times: int, error: Exception):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= times:
+            raise error
+        return len(calls)
+
+    return call, calls
+
+
+connection_lost = OperationalError("SELECT 1", {}, ConnectionError())
+
+
+class TestRetryPolicy:
+    async def test_read_retried(self, retry: RetryPolicy):
+        """проверка, что чтение повторяется после сбоя соединения"""
+
+        call, calls = failing(2, connection_lost)
+
+        assert await retry.run(call) == 3
+        assert retry.retries == 2
+        assert retry.breaker.state == "closed"
+
+    async def test_write_not_retried(self, retry: RetryPolicy):
+        """проверка, что запись при сбое не повторяется"""
+
+        call, calls = failing(1, connection_lost)
+
+        with pytest.raises(DatabaseUnavailable):
+            await retry.run(call, retry=False)
+
+        assert len(calls) == 1
+        assert retry.failures == 1
+
+    async def test_query_error_not_retried(self, retry: RetryPolicy):
+        """проверка, что ошибка самого запроса не повторяется
+        и не размыкает предохранитель"""
+
+        call, calls = failing(1, IntegrityError("INSERT", {}, Exception()))
+
+        with pytest.raises(IntegrityError):
+            await retry.run(call)
+
+        assert len(calls) == 1
+        assert retry.breaker.failures == 0
+
+    async def test_breaker_opens(self, retry: RetryPolicy):
+        """проверка, что после серии сбоев обращения отклоняются сразу,
+        а после паузы пробная попытка замыкает предохранитель"""
+
+        call, calls = failing(100, connection_lost)
+
+        for _ in range(2):
+            with pytest.raises(DatabaseUnavailable):
+                await retry.run(call)
+
+        assert len(calls) == 4
+        assert retry.breaker.state == "open"
+        assert retry.rejected == 1
+
+        with pytest.raises(DatabaseUnavailable):
+            await retry.run(call)
+        assert len(calls) == 4
+        assert retry.rejected == 2
+
+        retry.breaker.opened_at -= 60
+        call, calls = failing(0, connection_lost)
+
+        assert await retry.run(call) == 1
+        assert retry.breaker.state == "closed"
+        assert retry.breaker.opens == 1
+
+    async def test_cancelled_trial_reopens(self, retry: RetryPolicy):
+        """проверка, что отмененная пробная попытка снова размыкает
+        предохранитель, а не оставляет его полуоткрытым навсегда"""
+
+        # предохранитель разомкнулся минуту назад
+        retry.breaker.opened_at = monotonic() - 60
+        assert retry.breaker.state == "half_open"
+
+        async def hanging():
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(retry.run(hanging))
+        await asyncio.sleep(0)
+        assert retry.breaker.trial
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert not retry.breaker.trial
+        assert retry.breaker.state == "open"
+
+        retry.breaker.opened_at -= 60
+        call, calls = failing(0, connection_lost)
+
+        assert await retry.run(call) == 1
+        assert retry.breaker.state == "closed"
@@ -0,0 +1,61 @@
+from app.game.models import VKUserModel
+from app.game.states import PlayerOutcome
+from app.store import Store
+
+
+class TestSettlement:
+    async def test_settle_blackjack(self, store: Store, vk_user_3: VKUserModel):
+        """проверка выплаты 3:2 за блэкджек и списания из казны чата"""
+
+        await store.game.set_player_bet(1, 100)
+
+        await store.game.settle_players(1, {1: PlayerOutcome.blackjack})
+
+        player = await store.game.get_player_by_id(1)
+        assert player.cash == 1150
+        assert player.bet is None
+        assert player.is_active is False
+        assert player.hand == {"cards": []}
+        assert player.games_played == 3
+        assert player.games_won == 2
+
+        chat = await store.game.get_chat_by_vk_id(2000000001)
+        assert chat.casino_cash == -150
+
+    async def test_settle_several_games(
+        self, store: Store, vk_user_2: VKUserModel
+    ):
+        """проверка, что итоги одной игры не задевают другую"""
+
+        await store.game.set_player_bet(1, 100)
+        await store.game.set_player_bet(2, 100)
+
+        await store.game.settle_players(1, {1: PlayerOutcome.loss})
+
+        player = await store.game.get_player_by_id(1)
+        assert player.cash == 900
+        assert player.games_lost == 1
+
+        other_player = await store.game.get_player_by_id(2)
+        assert other_player.cash == 1000
+        assert other_player.bet == 100
+
+        chat = await store.game.get_chat_by_vk_id(2000000001)
+        assert chat.casino_cash == 100
+        other_chat = await store.game.get_chat_by_vk_id(2000000002)
+        assert other_chat.casino_cash == 0
+
+    async def test_settle_draw(self, store: Store, vk_user_3: VKUserModel):
+        """проверка, что ничья не меняет баланс и казну"""
+
+        await store.game.set_player_bet(1, 100)
+
+        await store.game.settle_players(1, {1: PlayerOutcome.draw})
+
+        player = await store.game.get_player_by_id(1)
+        assert player.cash == 1000
+        assert player.games_played == 3
+        assert player.games_won == 1
+
+        chat = await store.game.get_chat_by_vk_id(2000000001)
+        assert chat.casino_cash == 0
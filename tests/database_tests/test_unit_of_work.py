@@ -0,0 +1,134 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import event
+
+from app.store import Database, Store
+from app.store.vk_api.accessor import VkApiAccessor
+from app.store.vk_api.dataclasses import Update
+from tests.fake_vk_server import FakeVkServer
+
+
+class TestUnitOfWork:
+    async def test_one_transaction(self, server, store: Store):
+        """проверка, что вызовы аксессора внутри единицы работы
+        занимают одно соединение и фиксируются одним commit"""
+
+        database: Database = server.database
+        checkouts = []
+        commits = []
+
+        def on_checkout(*_):
+            checkouts.append(1)
+
+        def on_commit(*_):
+            commits.append(1)
+
+        pool = database._engine.sync_engine.pool
+        event.listen(pool, "checkout", on_checkout)
+        event.listen(database._engine.sync_engine, "commit", on_commit)
+
+        async with database.unit_of_work():
+            chat = await store.game.create_chat(2000000001)
+            game = await store.game.create_game(chat.id)
+            assert await store.game.get_game_by_vk_id(2000000001) is not None
+            assert (await store.game.get_chat_by_game_id(game.id)).id == chat.id
+
+        event.remove(pool, "checkout", on_checkout)
+        event.remove(database._engine.sync_engine, "commit", on_commit)
+
+        assert len(checkouts) == 1
+        assert len(commits) == 1
+
+    async def test_rollback_on_error(self, server, store: Store):
+        """проверка, что при ошибке изменения единицы работы откатываются"""
+
+        with pytest.raises(RuntimeError):
+            async with server.database.unit_of_work():
+                await store.game.create_chat(2000000001)
+                raise RuntimeError
+
+        assert await store.game.get_chat_by_vk_id(2000000001) is None
+
+    async def test_child_task_has_own_session(self, server, store: Store):
+        """проверка, что задача, запущенная из единицы работы,
+        не пользуется ее сессией"""
+
+        async with server.database.unit_of_work():
+            await store.game.create_chat(2000000001)
+            chat = await asyncio.create_task(
+                store.game.get_chat_by_vk_id(2000000001)
+            )
+
+        assert chat is None
+
+    async def test_vk_requests_before_transaction(
+        self,
+        server,
+        store: Store,
+        vk_api: VkApiAccessor,
+        fake_vk: FakeVkServer,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        """проверка, что профиль автора и состав беседы команды
+        запрашиваются в vk до начала транзакции, а не внутри нее"""
+
+        fake_vk.members[2000000001] = [5, 6]
+        monkeypatch.setattr(store, "vk_api", vk_api)
+        monkeypatch.setattr(
+            server,
+            "config",
+            replace(
+                server.config,
+                vk_api=replace(server.config.vk_api, typing_delays=False),
+            ),
+        )
+
+        state = {"open": False}
+        requests = []
+
+        unit_of_work = server.database.unit_of_work
+
+        @asynccontextmanager
+        async def tracked_unit_of_work():
+            async with unit_of_work() as session:
+                state["open"] = True
+                try:
+                    yield session
+                finally:
+                    state["open"] = False
+
+        request = vk_api._request
+
+        async def tracked_request(method: str, *args, **kwargs) -> dict:
+            requests.append((method, state["open"]))
+            return await request(method, *args, **kwargs)
+
+        monkeypatch.setattr(
+            server.database, "unit_of_work", tracked_unit_of_work
+        )
+        monkeypatch.setattr(vk_api, "_request", tracked_request)
+
+        await store.bot_manager.dispatch_update(
+            Update(
+                id=1,
+                type="message_new",
+                from_id=5,
+                peer_id=2000000001,
+                text="начать",
+            )
+        )
+        await vk_api.outbox.close()
+
+        # сообщения уходят из очереди отправки, соединение бд они не держат
+        lookups = [
+            (method, in_transaction)
+            for method, in_transaction in requests
+            if method not in ("messages.send", "messages.setActivity")
+        ]
+        assert sorted(lookups) == [
+            ("messages.getConversationMembers", False),
+            ("users.get", False),
+        ]
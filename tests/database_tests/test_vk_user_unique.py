@@ -0,0 +1,27 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from app.store import Store
+from app.store.vk_api.dataclasses import VKUser
+
+
+class TestVkUserUnique:
+    async def test_parallel_create(self, store: Store, monkeypatch):
+        """проверка, что одновременное создание одного пользователя вк
+        из двух бесед дает одну запись, а не ошибку уникальности"""
+
+        monkeypatch.setattr(
+            store.vk_api,
+            "get_user",
+            AsyncMock(
+                return_value=VKUser(vk_user_id=93683216, name="Дима", sex="m")
+            ),
+        )
+
+        first, second = await asyncio.gather(
+            store.game.create_vk_user(93683216),
+            store.game.create_vk_user(93683216),
+        )
+
+        assert first.id == second.id
+        assert (await store.game.get_vk_user_by_vk_id(93683216)).name == "Дима"
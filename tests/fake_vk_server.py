@@ -0,0 +1,158 @@
+import asyncio
+import json
+from time import monotonic
+
+from aiohttp import web
+
+# vk: слишком много запросов в секунду
+TOO_MANY_REQUESTS = 6
+# vk: нет доступа к беседе
+NO_ACCESS_TO_CHAT = 917
+
+
+class FakeVkServer:
+    """локальная имитация api vk для тестов и бенчмарков.
+    понимает несколько методов бота и execute в том виде,
+    в каком его собирает ExecuteBatcher"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        longpoll_wait: float = 0.0,
+        fail_peers: set[int] | None = None,
+        members: dict[int, list[int]] | None = None,
+    ):
+        self.latency = latency
+        self.longpoll_wait = longpoll_wait
+        self.fail_peers = fail_peers or set()
+        self.members = members or {}
+        # новые имена переименованных пользователей
+        self.names: dict[int, str] = {}
+        self.requests: list[str] = []
+        self.request_times: list[float] = []
+        # сколько следующих запросов получат ошибку 6
+        self.throttle: int = 0
+        self.sent: list[dict] = []
+        self.runner: web.AppRunner | None = None
+        self.port: int = 0
+
+    @property
+    def api_path(self) -> str:
+        return f"http://127.0.0.1:{self.port}/method/"
+
+    @property
+    def longpoll_path(self) -> str:
+        return f"http://127.0.0.1:{self.port}/longpoll"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route("*", "/method/{method}", self.handle)
+        app.router.add_get("/longpoll", self.handle_longpoll)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        await self.runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.post())
+
+        self.requests.append(method)
+        self.request_times.append(monotonic())
+        await asyncio.sleep(self.latency)
+
+        if self.throttle:
+            self.throttle -= 1
+            return web.json_response(self._error(TOO_MANY_REQUESTS, method))
+
+        if method == "execute":
+            return web.json_response(self._execute(params["code"]))
+
+        return web.json_response(self._call(method, params))
+
+    async def handle_longpoll(self, request: web.Request) -> web.Response:
+        """a_check без событий, отвечающий через longpoll_wait секунд"""
+
+        self.requests.append("a_check")
+        await asyncio.sleep(self.longpoll_wait)
+        ts = int(request.query["ts"]) + 1
+        return web.json_response({"ts": ts, "updates": []})
+
+    def _call(self, method: str, params: dict) -> dict:
+        if method == "messages.send":
+            peer_id = int(params["peer_id"])
+            if peer_id in self.fail_peers:
+                return self._error(NO_ACCESS_TO_CHAT, method)
+            self.sent.append({"peer_id": peer_id, "message": params["message"]})
+            return {"response": len(self.sent)}
+
+        if method == "messages.setActivity":
+            return {"response": 1}
+
+        if method == "users.get":
+            user_ids = str(params["user_ids"]).split(",")
+            return {"response": [self._profile(int(id_)) for id_ in user_ids]}
+
+        if method == "messages.getConversationMembers":
+            members = self.members.get(int(params["peer_id"]), [])
+            return {
+                "response": {
+                    "count": len(members),
+                    "items": [{"member_id": id_} for id_ in members],
+                    "profiles": [self._profile(id_) for id_ in members],
+                }
+            }
+
+        return self._error(3, method)
+
+    def _execute(self, code: str) -> dict:
+        responses = []
+        errors = []
+
+        for method, params in self._parse_code(code):
+            result = self._call(method, params)
+            if "error" in result:
+                responses.append(False)
+                errors.append(result["error"])
+            else:
+                responses.append(result["response"])
+
+        data = {"response": responses}
+        if errors:
+            data["execute_errors"] = errors
+        return data
+
+    @staticmethod
+    def _parse_code(code: str) -> list[tuple[str, dict]]:
+        """разбирает 'return [API.method({...}),...];' на вызовы"""
+
+        decoder = json.JSONDecoder()
+        calls = []
+        position = 0
+
+        while (start := code.find("API.", position)) != -1:
+            bracket = code.index("(", start)
+            params, position = decoder.raw_decode(code, bracket + 1)
+            calls.append((code[start + 4 : bracket], params))
+
+        return calls
+
+    def _profile(self, vk_id: int) -> dict:
+        name = self.names.get(vk_id, f"user{vk_id}")
+        return {"id": vk_id, "first_name": name, "sex": 2}
+
+    @staticmethod
+    def _error(code: int, method: str) -> dict:
+        return {
+            "error": {
+                "error_code": code,
+                "error_msg": "fake error",
+                "method": method,
+            }
+        }
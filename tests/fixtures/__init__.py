@@ -1,3 +1,4 @@
 from .general import *
 from .test_game_models import *
 from .testclient import *
+from .vk_api import *
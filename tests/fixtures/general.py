@@ -4,10 +4,12 @@ from unittest.mock import AsyncMock
 
 import pytest
 from aiohttp.test_utils import loop_context
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.store import Database, Store
+from app.store.game.active import ActiveGames
+from app.store.game.timer import GameTimerManager
 from app.web.app import setup_app
 from app.web.config import Config
 
@@ -60,11 +62,35 @@ def db_session(server):
     return server.database.session
 
 
+# тексты запросов к бд, выполненных во время теста
+@pytest.fixture
+def statements(server):
+    executed = []
+
+    def on_execute(conn, cursor, statement, *_):
+        executed.append(statement)
+
+    engine = server.database._engine.sync_engine
+    event.listen(engine, "before_cursor_execute", on_execute)
+    yield executed
+    event.remove(engine, "before_cursor_execute", on_execute)
+
+
 # !авто
 # очистка бд после каждого теста
 @pytest.fixture(autouse=True, scope="function")
 async def clear_db(server):
     yield
+
+    # состояние игр в памяти и id бесед относятся к очищаемой бд
+    if server.store.game.active.flush_handle:
+        server.store.game.active.flush_handle.cancel()
+    server.store.game.active = ActiveGames(server)
+    server.store.game.chat_games.clear()
+    server.store.game.game_chats.clear()
+    await server.store.game_manager.timer.close()
+    server.store.game_manager.timer = GameTimerManager()
+
     try:
         session = AsyncSession(server.database._engine)
         connection = session.connection()
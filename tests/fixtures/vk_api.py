@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.store import Store
+from app.store.vk_api import accessor
+from app.store.vk_api.accessor import VkApiAccessor
+from app.web.config import Config
+from tests.fake_vk_server import FakeVkServer
+
+
+@pytest.fixture
+async def fake_vk() -> FakeVkServer:
+    """локальная имитация api vk, в чат 2000000013 писать нельзя"""
+
+    server = FakeVkServer(fail_peers={2000000013})
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+async def vk_api(
+    fake_vk: FakeVkServer, config: Config, store: Store, monkeypatch
+) -> VkApiAccessor:
+    """настоящий VkApiAccessor, отправляющий запросы в fake_vk"""
+
+    monkeypatch.setattr(accessor, "API_PATH", fake_vk.api_path)
+    app = SimpleNamespace(
+        on_startup=[], on_cleanup=[], config=config, store=store
+    )
+    vk_api = VkApiAccessor(app)
+    vk_api.open_http()
+    yield vk_api
+    await vk_api.close_http()
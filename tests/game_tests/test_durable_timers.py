@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.game.models import GameModel, VKUserModel
+from app.game.states import GameState
+from app.store import Store
+from app.store.game.timer import GameTimerManager
+
+
+async def set_betting(
+    db_session: AsyncSession, game_id: int, deadline: datetime
+) -> None:
+    async with db_session.begin() as session:
+        await session.execute(
+            update(GameModel)
+            .filter_by(id=game_id)
+            .values(state=GameState.betting, deadline=deadline)
+        )
+
+
+class TestDurableTimers:
+    async def test_stage_deadline_saved(
+        self, store: Store, vk_user_2: VKUserModel
+    ):
+        """проверка, что срок таймера стадии сохраняется в бд вместе с ней"""
+
+        before = datetime.now(timezone.utc)
+        await store.game_manager.start_betting(2000000001, 1)
+
+        game = await store.game.get_game_by_id(1)
+
+        assert game.state == GameState.betting
+        assert timedelta(seconds=60) <= game.deadline - before
+        assert game.deadline - before < timedelta(seconds=61)
+        assert 59 < store.game_manager.timer.remaining(1) <= 60.2
+
+    async def test_recovery_waits_remaining(
+        self, store: Store, vk_user_2: VKUserModel, db_session: AsyncSession
+    ):
+        """проверка, что после перезапуска таймер стадии
+        ждет только оставшееся до срока время"""
+
+        deadline = datetime.now(timezone.utc) + timedelta(seconds=20)
+        await set_betting(db_session, 1, deadline)
+
+        game = await store.game.get_game_by_id(1)
+        await store.game_manager.recovery(2000000001, game)
+
+        assert 19 < store.game_manager.timer.remaining(1) <= 20.2
+        assert (await store.game.get_game_by_id(1)).deadline == deadline
+
+    async def test_overdue_drained(
+        self,
+        store: Store,
+        vk_user_2: VKUserModel,
+        db_session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        """проверка, что просроченные таймеры срабатывают
+        не разом, а с интервалом 1 / overdue_timers_rate"""
+
+        fired = []
+        collect_bets = AsyncMock(
+            side_effect=lambda vk_id, game_id: fired.append(monotonic())
+        )
+        monkeypatch.setattr(store.game_manager, "collect_bets", collect_bets)
+        timer = GameTimerManager(tick=0.01, slots=64, overdue_rate=5)
+        monkeypatch.setattr(store.game_manager, "timer", timer)
+
+        overdue = datetime.now(timezone.utc) - timedelta(seconds=5)
+        for game_id in (1, 2):
+            await set_betting(db_session, game_id, overdue)
+
+        for game in await store.game.get_active_games():
+            chat = await store.game.get_chat_by_game_id(game.id)
+            await store.game_manager.recovery(chat.vk_id, game)
+
+        await asyncio.sleep(0.3)
+
+        assert collect_bets.await_count == 2
+        assert fired[1] - fired[0] >= 0.2 - 2 * timer.tick
+        assert timer.stats()["overdue"] == 2
@@ -0,0 +1,174 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.store import Store
+from app.store.game.actors import ActorsClosed, GameActors
+
+
+class TestGameActors:
+    async def test_mailbox_order(self):
+        """проверка, что письма одной беседы выполняются по одному
+        в порядке поступления, а разные беседы - параллельно"""
+
+        actors = GameActors(concurrency=10)
+        log = []
+
+        async def action(peer_id: int, n: int):
+            log.append(("start", peer_id, n))
+            await asyncio.sleep(0.01)
+            log.append(("end", peer_id, n))
+            return n
+
+        results = await asyncio.gather(
+            actors.ask(1, lambda: action(1, 1)),
+            actors.ask(1, lambda: action(1, 2)),
+            actors.ask(2, lambda: action(2, 1)),
+        )
+
+        assert results == [1, 2, 1]
+        peer_1 = [entry for entry in log if entry[1] == 1]
+        assert peer_1 == [
+            ("start", 1, 1),
+            ("end", 1, 1),
+            ("start", 1, 2),
+            ("end", 1, 2),
+        ]
+        assert log.index(("start", 2, 1)) < log.index(("end", 1, 1))
+        assert actors.stats()["actors"] == 0
+
+    async def test_concurrency_bounded(self):
+        """проверка, что одновременно выполняется не больше
+        concurrency писем, а глубина ящиков видна в метриках"""
+
+        actors = GameActors(concurrency=2)
+        running = []
+        peak = []
+
+        async def action():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        for peer_id in range(5):
+            actors.tell(peer_id, action)
+        actors.tell(0, action)
+
+        await asyncio.sleep(0)
+        stats = actors.stats()
+        assert stats["actors"] == 5
+        assert stats["waiting"] == 3
+        assert stats["max_depth"] == 1
+
+        await asyncio.sleep(0.1)
+
+        assert max(peak) == 2
+        assert actors.stats()["processed"] == 6
+        assert actors.stats()["peak_depth"] == 2
+
+    async def test_errors(self):
+        """проверка, что ошибка письма возвращается спросившему,
+        а ошибка письма без ответа не останавливает актор"""
+
+        actors = GameActors(concurrency=1)
+        done = AsyncMock()
+
+        async def failing():
+            raise RuntimeError("failed")
+
+        with pytest.raises(RuntimeError):
+            await actors.ask(1, failing)
+
+        actors.tell(1, failing)
+        await actors.ask(1, done)
+
+        assert done.await_count == 1
+        assert actors.stats()["failed"] == 2
+
+    async def test_closed_refuses_letters(self):
+        """проверка, что после close письма не принимаются:
+        ask получает ActorsClosed, а tell отбрасывает действие"""
+
+        actors = GameActors(concurrency=1)
+        action = AsyncMock()
+        await actors.close()
+
+        with pytest.raises(ActorsClosed):
+            await actors.ask(1, action)
+        actors.tell(1, action)
+
+        assert not actors.workers
+        action.assert_not_awaited()
+
+    async def test_cancelled_letter_in_hand(self):
+        """проверка, что письмо, вынутое из ящика, но не выполненное
+        до отмены актора, отменяется и у спросившего"""
+
+        actors = GameActors(concurrency=1)
+        release = asyncio.Event()
+        action = AsyncMock()
+
+        async def busy():
+            await release.wait()
+
+        actors.tell(1, busy)
+        asked = asyncio.create_task(actors.ask(2, action))
+        while actors.stats()["waiting"] == 0:
+            await asyncio.sleep(0.01)
+
+        actors.workers[2].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(asked, 1)
+
+        release.set()
+        await actors.close()
+        action.assert_not_awaited()
+
+
+class TestTimerEvents:
+    async def test_stale_deadline_skipped(self, store: Store):
+        """проверка, что срок, сработавший пока актор занят командой,
+        не обрабатывается, если команда отменила таймер"""
+
+        manager = store.game_manager
+        next_method = AsyncMock()
+
+        async def command():
+            manager.start_timer(
+                2000000001, 1, datetime.now(timezone.utc), next_method
+            )
+            while manager.timer.stats()["fired"] == 0:
+                await asyncio.sleep(0.01)
+            manager.timer.end_timer(1)
+
+        await manager.actors.ask(2000000001, command)
+        await asyncio.sleep(0.05)
+
+        assert manager.timer.stats()["fired"] == 1
+        assert next_method.await_count == 0
+
+    async def test_deadline_after_command(self, store: Store):
+        """проверка, что сработавший срок обрабатывается в акторе беседы
+        после команды, которая выполнялась в момент срабатывания"""
+
+        manager = store.game_manager
+        log = []
+
+        async def next_method(vk_id: int, game_id: int):
+            log.append(("deadline", vk_id, game_id))
+
+        async def command():
+            manager.start_timer(
+                2000000001, 1, datetime.now(timezone.utc), next_method
+            )
+            while manager.timer.stats()["fired"] == 0:
+                await asyncio.sleep(0.01)
+            log.append(("command",))
+
+        await manager.actors.ask(2000000001, command)
+        await asyncio.sleep(0.05)
+
+        assert log == [("command",), ("deadline", 2000000001, 1)]
@@ -0,0 +1,119 @@
+import asyncio
+from time import monotonic
+
+from app.store.game.timer import GameTimerManager
+
+
+def recorder():
+    calls = []
+
+    async def callback(vk_id: int, game_id: int):
+        calls.append((vk_id, game_id, monotonic()))
+
+    return callback, calls
+
+
+class TestGameTimers:
+    async def test_timer_fires_after_deadline(self):
+        """проверка, что таймер срабатывает не раньше срока
+        и не позже чем через тик после него"""
+
+        timer = GameTimerManager(tick=0.01, slots=8)
+        callback, calls = recorder()
+
+        started = monotonic()
+        timer.start_timer(0.05, 2000000001, 1, callback)
+        assert timer.stats()["pending"] == 1
+
+        await asyncio.sleep(0.15)
+
+        assert [call[:2] for call in calls] == [(2000000001, 1)]
+        assert 0.05 <= calls[0][2] - started < 0.1
+        assert timer.stats()["pending"] == 0
+        assert timer.driver is None
+
+    async def test_end_timer_cancels(self):
+        """проверка, что отмененный таймер не срабатывает,
+        а новый таймер игры заменяет прежний"""
+
+        timer = GameTimerManager(tick=0.01, slots=8)
+        callback, calls = recorder()
+
+        timer.start_timer(0.03, 2000000001, 1, callback)
+        timer.start_timer(0.03, 2000000002, 2, callback)
+        timer.start_timer(0.06, 2000000002, 2, callback)
+        timer.end_timer(1)
+        timer.end_timer(3)
+
+        assert timer.stats()["pending"] == 1
+        assert timer.remaining(1) is None
+        assert 0.059 <= timer.remaining(2) <= 0.06 + timer.tick
+
+        await asyncio.sleep(0.12)
+
+        assert [call[:2] for call in calls] == [(2000000002, 2)]
+        assert timer.stats()["cancelled"] == 2
+
+    async def test_closed_refuses_timers(self):
+        """проверка, что после close новые таймеры не ставятся"""
+
+        timer = GameTimerManager(tick=0.01, slots=8)
+        callback, calls = recorder()
+        await timer.close()
+
+        timer.start_timer(0.01, 2000000001, 1, callback)
+        await asyncio.sleep(0.05)
+
+        assert timer.remaining(1) is None
+        assert timer.driver is None
+        assert not calls
+
+    async def test_deadline_beyond_one_turn(self):
+        """проверка, что срок дальше одного оборота колеса
+        ждет своего оборота в той же ячейке"""
+
+        timer = GameTimerManager(tick=0.01, slots=4)
+        callback, calls = recorder()
+
+        started = monotonic()
+        timer.start_timer(0.1, 2000000001, 1, callback)
+        timer.start_timer(0.02, 2000000002, 2, callback)
+
+        await asyncio.sleep(0.06)
+        assert [call[1] for call in calls] == [2]
+
+        await asyncio.sleep(0.1)
+        assert [call[1] for call in calls] == [2, 1]
+        assert calls[1][2] - started >= 0.1
+
+    async def test_failed_callback_keeps_wheel(self):
+        """проверка, что ошибка в обработчике срока не останавливает колесо"""
+
+        timer = GameTimerManager(tick=0.01, slots=8)
+        callback, calls = recorder()
+
+        async def failing(vk_id: int, game_id: int):
+            raise RuntimeError("failed")
+
+        timer.start_timer(0.02, 2000000001, 1, failing)
+        timer.start_timer(0.04, 2000000002, 2, callback)
+
+        await asyncio.sleep(0.1)
+
+        assert [call[1] for call in calls] == [2]
+        assert timer.stats()["fired"] == 2
+
+    async def test_overdue_rate(self):
+        """проверка, что просроченные сроки срабатывают по очереди
+        не чаще overdue_rate в секунду"""
+
+        timer = GameTimerManager(tick=0.01, slots=8, overdue_rate=20)
+        callback, calls = recorder()
+
+        for game_id in range(1, 4):
+            timer.start_overdue(2000000000 + game_id, game_id, callback)
+
+        await asyncio.sleep(0.2)
+
+        assert [call[1] for call in calls] == [1, 2, 3]
+        assert calls[2][2] - calls[0][2] >= 0.1 - 2 * timer.tick
@@ -0,0 +1,84 @@
+import asyncio
+from dataclasses import replace
+
+from app.store.vk_api.accessor import VkApiAccessor
+from app.store.vk_api.dataclasses import Update
+from app.web.config import VkApiConfig
+from tests.fake_vk_server import FakeVkServer
+
+PEER_ID = 2000000001
+
+
+def action_update(action_type: str, member_id: int) -> Update:
+    return Update(
+        id=0,
+        type="message_new",
+        from_id=member_id,
+        peer_id=PEER_ID,
+        action_type=action_type,
+        action_member_id=member_id,
+    )
+
+
+class TestChatMembersCache:
+    async def test_count_cached(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что состав беседы запрашивается в vk один раз"""
+
+        fake_vk.members[PEER_ID] = [1, 2, 3]
+
+        counts = await asyncio.gather(
+            *[vk_api.get_chat_members_count(PEER_ID) for _ in range(5)]
+        )
+
+        assert counts == [3] * 5
+        assert fake_vk.requests == ["messages.getConversationMembers"]
+
+    async def test_invite_and_kick(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка поправки состава по событиям входа и выхода"""
+
+        fake_vk.members[PEER_ID] = [1, 2]
+        await vk_api.get_chat_members_count(PEER_ID)
+
+        await vk_api.members.on_action(action_update("chat_invite_user", 3))
+        await vk_api.members.on_action(action_update("chat_kick_user", 1))
+
+        assert await vk_api.get_chat_members_count(PEER_ID) == 2
+        assert vk_api.members.members[PEER_ID] == {2, 3}
+        assert fake_vk.requests == ["messages.getConversationMembers"]
+
+    async def test_bot_kicked(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что при исключении бота состав беседы забывается"""
+
+        fake_vk.members[PEER_ID] = [1, 2]
+        await vk_api.get_chat_members_count(PEER_ID)
+
+        group_id = vk_api.app.config.bot.group_id
+        await vk_api.members.on_action(
+            action_update("chat_kick_user", -group_id)
+        )
+
+        assert PEER_ID not in vk_api.members.members
+
+    async def test_stale_refreshed_in_background(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что устаревший состав отдается сразу
+        и обновляется в фоне"""
+
+        vk_api.app.config = replace(
+            vk_api.app.config, vk_api=VkApiConfig(members_ttl=-1)
+        )
+        fake_vk.members[PEER_ID] = [1, 2]
+        await vk_api.get_chat_members_count(PEER_ID)
+
+        fake_vk.members[PEER_ID] = [1, 2, 3]
+
+        assert await vk_api.get_chat_members_count(PEER_ID) == 2
+        await asyncio.gather(*vk_api.members.refreshing.values())
+        assert await vk_api.get_chat_members_count(PEER_ID) == 3
@@ -0,0 +1,84 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from app.store.vk_api.accessor import VkApiAccessor
+from app.store.vk_api.dataclasses import BotMessage
+from app.web.config import VkApiConfig
+from tests.fake_vk_server import NO_ACCESS_TO_CHAT, FakeVkServer
+
+
+@pytest.fixture(autouse=True)
+def execute_batching(vk_api: VkApiAccessor):
+    vk_api.app.config = replace(
+        vk_api.app.config, vk_api=VkApiConfig(execute_batching=True)
+    )
+
+
+class TestExecuteBatcher:
+    async def test_calls_batched_by_25(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что одновременные вызовы уходят
+        запросами execute не больше чем по 25 вызовов"""
+
+        messages = [
+            BotMessage(peer_id=2000000100 + i, text=f"message {i}")
+            for i in range(30)
+        ]
+
+        errors = await asyncio.gather(
+            *[vk_api._send_message(message) for message in messages]
+        )
+
+        assert errors == [None] * 30
+        assert fake_vk.requests == ["execute", "execute"]
+        assert len(fake_vk.sent) == 30
+        assert vk_api.batcher.stats()["calls"] == 30
+
+    async def test_error_goes_to_its_caller(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что ошибка одного вызова в execute
+        достается только его вызывающему"""
+
+        errors = await asyncio.gather(
+            vk_api._send_message(BotMessage(peer_id=2000000001, text="a")),
+            vk_api._send_message(BotMessage(peer_id=2000000013, text="b")),
+            vk_api._send_message(BotMessage(peer_id=2000000002, text="c")),
+        )
+
+        assert errors == [None, NO_ACCESS_TO_CHAT, None]
+        assert fake_vk.requests == ["execute"]
+        assert [msg["message"] for msg in fake_vk.sent] == ["a", "c"]
+
+    async def test_batched_text_decoded(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что переносы %0A в тексте доходят переносами,
+        как и при обычном вызове"""
+
+        await vk_api._send_message(
+            BotMessage(peer_id=2000000001, text="первая%0Aвторая")
+        )
+
+        assert fake_vk.sent[0]["message"] == "первая\nвторая"
+
+    async def test_users_batched(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка получения пользователей через execute"""
+
+        # промахи кэша профилей сначала идут в бд, ответы приходят вразнобой
+        vk_api.app.config = replace(
+            vk_api.app.config,
+            vk_api=replace(vk_api.app.config.vk_api, execute_window=0.2),
+        )
+
+        users = await asyncio.gather(
+            vk_api.get_user(1), vk_api.get_user(2), vk_api.get_user(3)
+        )
+
+        assert [user.vk_user_id for user in users] == [1, 2, 3]
+        assert fake_vk.requests == ["execute"]
@@ -0,0 +1,48 @@
+import asyncio
+
+from app.store.vk_api.accessor import VkApiAccessor
+from app.store.vk_api.dataclasses import BotMessage
+from tests.fake_vk_server import FakeVkServer
+
+
+class TestHttpPools:
+    async def test_keepalive_reused(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что последовательные запросы к api
+        идут по одному соединению"""
+
+        for i in range(3):
+            await vk_api._send_message(
+                BotMessage(peer_id=2000000001, text=str(i))
+            )
+
+        stats = vk_api.api_http.stats()
+        assert stats["requests"] == 3
+        assert stats["connections_created"] == 1
+        assert stats["connections_reused"] == 2
+
+    async def test_longpoll_does_not_block_api(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что висящий a_check не задерживает отправку сообщений"""
+
+        fake_vk.longpoll_wait = 0.5
+        vk_api.server, vk_api.key, vk_api.ts = fake_vk.longpoll_path, "key", 1
+        poll = asyncio.create_task(vk_api.poll())
+        await asyncio.sleep(0.05)
+
+        await asyncio.gather(
+            *[
+                vk_api._send_message(
+                    BotMessage(peer_id=2000000001, text=str(i))
+                )
+                for i in range(5)
+            ]
+        )
+
+        assert not poll.done()
+        assert await poll == []
+        assert vk_api.ts == 2
+        assert vk_api.api_http.stats()["queued"] == 0
+        assert vk_api.longpoll_http.stats()["requests"] == 1
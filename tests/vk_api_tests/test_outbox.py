@@ -0,0 +1,296 @@
+import asyncio
+from dataclasses import replace
+from time import monotonic
+from types import SimpleNamespace
+
+import pytest
+
+from app.store import Store
+from app.store.bot.phrases import BotPhrase
+from app.store.game.notifications import GameNotifier
+from app.store.vk_api import outbox
+from app.store.vk_api.accessor import VkApiAccessor
+from app.store.vk_api.dataclasses import BotMessage, TypingActivity
+from app.store.vk_api.limiter import TokenBucket
+from app.store.vk_api.outbox import MESSAGE_MAX_LENGTH, MESSAGE_SEPARATOR
+from tests.fake_vk_server import TOO_MANY_REQUESTS, FakeVkServer
+
+PEER_ID = 2000000001
+
+
+def configure(vk_api: VkApiAccessor, **fields) -> None:
+    config = vk_api.app.config
+    vk_api.app.config = replace(config, vk_api=replace(config.vk_api, **fields))
+
+
+class TestTokenBucket:
+    async def test_burst_then_rate(self):
+        """проверка, что после всплеска в capacity запросов
+        следующие ждут по 1 / rate секунды"""
+
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = monotonic()
+
+        for _ in range(6):
+            await bucket.acquire()
+
+        assert monotonic() - start >= 4 / 50 - 0.005
+        assert bucket.stats()["waits"] == 4
+
+    async def test_waiters_served_in_turn(self):
+        """проверка, что одновременные ожидающие
+        получают токены по очереди, а не разом"""
+
+        bucket = TokenBucket(rate=50, capacity=1)
+        times = []
+
+        async def acquire() -> None:
+            await bucket.acquire()
+            times.append(monotonic())
+
+        await asyncio.gather(*[acquire() for _ in range(4)])
+
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert all(gap >= 1 / 50 - 0.005 for gap in gaps)
+
+
+class TestMessageOutbox:
+    async def test_peer_order_kept(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что сообщения чата уходят по порядку,
+        а разные чаты обслуживаются параллельно"""
+
+        fake_vk.latency = 0.1
+        peers = [2000000001, 2000000002, 2000000003]
+        start = monotonic()
+
+        for n in range(9):
+            await vk_api.send_message(
+                BotMessage(peer_id=peers[n % 3], text=f"message {n}")
+            )
+        await vk_api.outbox.close()
+
+        # по очереди вышло бы 0.9 секунды
+        assert monotonic() - start < 0.6
+        for peer_id in peers:
+            assert [
+                msg["message"]
+                for msg in fake_vk.sent
+                if msg["peer_id"] == peer_id
+            ] == [f"message {n}" for n in range(9) if peers[n % 3] == peer_id]
+        assert vk_api.outbox.stats()["sent"] == 9
+
+    async def test_rate_limited(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что запросы всех чатов укладываются в лимит токена"""
+
+        configure(vk_api, rate_limit=20, burst=1)
+
+        for n in range(4):
+            await vk_api.send_message(
+                BotMessage(peer_id=2000000001 + n, text=f"message {n}")
+            )
+        await vk_api.outbox.close()
+
+        times = fake_vk.request_times
+        assert len(times) == 4
+        assert all(b - a >= 1 / 20 - 0.005 for a, b in zip(times, times[1:]))
+
+    async def test_too_many_requests_retried(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что на ошибку 6 запрос повторяется
+        с нарастающей паузой и сообщение доходит один раз"""
+
+        configure(vk_api, retry_backoff=0.05)
+        fake_vk.throttle = 2
+
+        await vk_api.send_message(BotMessage(peer_id=2000000001, text="a"))
+        await vk_api.outbox.close()
+
+        assert fake_vk.requests == ["messages.send"] * 3
+        assert [msg["message"] for msg in fake_vk.sent] == ["a"]
+
+        times = fake_vk.request_times
+        assert times[1] - times[0] >= 0.05
+        assert times[2] - times[1] >= 0.1
+
+    async def test_too_many_requests_gives_up(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer, store: Store
+    ):
+        """проверка, что после max_retries повторов сообщение
+        считается неотправленным, а чат получает уведомление об ошибке"""
+
+        configure(vk_api, retry_backoff=0.01, max_retries=2)
+        fake_vk.throttle = 10
+        store.vk_api.send_message.reset_mock()
+
+        await vk_api.send_message(BotMessage(peer_id=2000000001, text="a"))
+        await vk_api.outbox.close()
+
+        assert fake_vk.requests == ["messages.send"] * 3
+        assert not fake_vk.sent
+        assert vk_api.outbox.stats()["failed"] == 1
+
+        message = store.vk_api.send_message.await_args.args[0]
+        assert message.peer_id == 2000000001
+        assert message.text == BotPhrase.vk_error(TOO_MANY_REQUESTS)
+
+
+@pytest.fixture
+def delivered(vk_api: VkApiAccessor, monkeypatch) -> list:
+    """сообщения и статусы набора в порядке их отправки в vk"""
+
+    delivered = []
+
+    async def send_message(message: BotMessage) -> None:
+        delivered.append(message)
+
+    async def send_activity(peer_id: int) -> bool:
+        delivered.append(TypingActivity(peer_id=peer_id, sec=0))
+        return True
+
+    monkeypatch.setattr(vk_api, "_send_message", send_message)
+    monkeypatch.setattr(vk_api, "send_activity", send_activity)
+    return delivered
+
+
+class TestCoalescing:
+    async def test_window(self, vk_api: VkApiAccessor, delivered: list):
+        """проверка, что сообщение, пришедшее в пределах окна,
+        склеивается с предыдущим, а после окна уходит отдельно"""
+
+        configure(vk_api, coalesce=True, coalesce_window=0.1)
+
+        await vk_api.send_message(BotMessage(peer_id=PEER_ID, text="a"))
+        await asyncio.sleep(0.03)
+        await vk_api.send_message(BotMessage(peer_id=PEER_ID, text="b"))
+        await asyncio.sleep(0.2)
+        await vk_api.send_message(BotMessage(peer_id=PEER_ID, text="c"))
+        await vk_api.outbox.close()
+
+        assert [message.text for message in delivered] == [
+            f"a{MESSAGE_SEPARATOR}b",
+            "c",
+        ]
+        assert vk_api.outbox.stats()["coalesced"] == 1
+
+    async def test_length_limit(self, vk_api: VkApiAccessor, delivered: list):
+        """проверка, что склейка не выходит за лимит длины сообщения vk"""
+
+        configure(vk_api, coalesce=True, coalesce_window=0)
+        texts = ["a" * 2000, "b" * 2000, "c" * 100]
+
+        for text in texts:
+            await vk_api.send_message(BotMessage(peer_id=PEER_ID, text=text))
+        await vk_api.outbox.close()
+
+        assert [message.text for message in delivered] == [
+            MESSAGE_SEPARATOR.join(texts[:2]),
+            texts[2],
+        ]
+        assert all(
+            len(message.text) <= MESSAGE_MAX_LENGTH for message in delivered
+        )
+
+    async def test_last_keyboard_kept(
+        self, vk_api: VkApiAccessor, delivered: list
+    ):
+        """проверка, что у склеенного сообщения клавиатура
+        последнего из сообщений, у которых она есть"""
+
+        configure(vk_api, coalesce=True, coalesce_window=0)
+
+        for text, keyboard in (("a", "k1"), ("b", "k2"), ("c", "")):
+            await vk_api.send_message(
+                BotMessage(peer_id=PEER_ID, text=text, keyboard=keyboard)
+            )
+        await vk_api.outbox.close()
+
+        assert len(delivered) == 1
+        assert delivered[0].keyboard == "k2"
+
+    async def test_typing_barrier(self, vk_api: VkApiAccessor, delivered: list):
+        """проверка, что сообщения по разные стороны
+        от статуса набора текста не склеиваются"""
+
+        configure(vk_api, coalesce=True, coalesce_window=0)
+
+        await vk_api.send_message(BotMessage(peer_id=PEER_ID, text="a"))
+        await vk_api.send_typing(PEER_ID, 0.01)
+        await vk_api.send_message(BotMessage(peer_id=PEER_ID, text="b"))
+        await vk_api.outbox.close()
+
+        assert delivered == [
+            BotMessage(peer_id=PEER_ID, text="a"),
+            TypingActivity(peer_id=PEER_ID, sec=0),
+            BotMessage(peer_id=PEER_ID, text="b"),
+        ]
+
+
+@pytest.fixture
+def pauses(monkeypatch) -> list[float]:
+    """паузы набора текста в очереди записываются, а не выдерживаются"""
+
+    pauses = []
+
+    async def pause(sec: float) -> None:
+        pauses.append(sec)
+
+    monkeypatch.setattr(outbox, "asleep", pause)
+    return pauses
+
+
+@pytest.fixture
+def notifier(vk_api: VkApiAccessor) -> GameNotifier:
+    """уведомления игры, отправляющие через настоящую очередь"""
+
+    app = SimpleNamespace(
+        config=vk_api.app.config, store=SimpleNamespace(vk_api=vk_api)
+    )
+    return GameNotifier(app)
+
+
+class TestBotTyping:
+    async def test_typing_before_message(
+        self,
+        vk_api: VkApiAccessor,
+        delivered: list,
+        pauses: list[float],
+        notifier: GameNotifier,
+    ):
+        """проверка, что статус набора текста и пауза
+        идут в очереди перед сообщением, а метод их не ждет"""
+
+        start = monotonic()
+        await notifier.game_offer(PEER_ID)
+        assert monotonic() - start < 0.1
+
+        await vk_api.outbox.close()
+
+        assert [type(item) for item in delivered] == [
+            TypingActivity,
+            BotMessage,
+        ]
+        assert pauses == [3]
+
+    async def test_no_typing_without_delays(
+        self,
+        vk_api: VkApiAccessor,
+        delivered: list,
+        pauses: list[float],
+        notifier: GameNotifier,
+    ):
+        """проверка, что при typing_delays: false
+        сообщение уходит без статуса набора и паузы"""
+
+        configure(vk_api, typing_delays=False)
+        notifier.app.config = vk_api.app.config
+
+        await notifier.game_offer(PEER_ID)
+        await vk_api.outbox.close()
+
+        assert [type(item) for item in delivered] == [BotMessage]
+        assert pauses == []
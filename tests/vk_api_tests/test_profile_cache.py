@@ -0,0 +1,111 @@
+import asyncio
+from dataclasses import replace
+
+from app.game.models import VKUserModel
+from app.store import Store
+from app.store.vk_api.accessor import VkApiAccessor
+from app.web.config import VkApiConfig
+from tests.fake_vk_server import FakeVkServer
+
+
+class TestProfileCache:
+    async def test_user_cached(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что повторный запрос профиля не идет в vk"""
+
+        user = await vk_api.get_user(1)
+        same_user = await vk_api.get_user(1)
+
+        assert same_user == user
+        assert fake_vk.requests == ["users.get"]
+        assert vk_api.profiles.stats()["hits"] == 1
+        assert vk_api.profiles.stats()["misses"] == 1
+
+    async def test_user_from_db(
+        self,
+        vk_api: VkApiAccessor,
+        fake_vk: FakeVkServer,
+        vk_user_1: VKUserModel,
+    ):
+        """проверка, что профиль из таблицы vk_user не запрашивается в vk"""
+
+        user = await vk_api.get_user(vk_user_1.vk_id)
+
+        assert user.name == vk_user_1.name
+        assert fake_vk.requests == []
+        assert vk_api.profiles.stats()["db_loads"] == 1
+
+    async def test_renamed_user_after_ttl(
+        self,
+        vk_api: VkApiAccessor,
+        fake_vk: FakeVkServer,
+        store: Store,
+        vk_user_1: VKUserModel,
+    ):
+        """проверка, что после profile_ttl профиль из бд перечитывается
+        из vk, а новое имя записывается и в таблицу vk_user"""
+
+        vk_api.app.config = replace(
+            vk_api.app.config, vk_api=VkApiConfig(profile_ttl=0.05)
+        )
+        vk_id = vk_user_1.vk_id
+
+        assert (await vk_api.get_user(vk_id)).name == "Demmenty"
+        fake_vk.names[vk_id] = "Renamed"
+        assert (await vk_api.get_user(vk_id)).name == "Demmenty"
+        assert fake_vk.requests == []
+
+        await asyncio.sleep(0.06)
+
+        assert (await vk_api.get_user(vk_id)).name == "Renamed"
+        assert fake_vk.requests == ["users.get"]
+        assert vk_api.profiles.stats()["refreshes"] == 1
+
+        vk_user = await store.game.get_vk_user_by_vk_id(vk_id)
+        assert vk_user.name == "Renamed"
+
+    async def test_users_bulk(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что недостающие профили берутся одним users.get"""
+
+        await vk_api.get_user(2)
+        users = await vk_api.get_users([1, 2, 3, 4])
+
+        assert sorted(users) == [1, 2, 3, 4]
+        assert fake_vk.requests == ["users.get", "users.get"]
+        assert vk_api.profiles.stats()["api_loads"] == 4
+
+    async def test_chat_users_cached(
+        self, vk_api: VkApiAccessor, fake_vk: FakeVkServer
+    ):
+        """проверка, что участники чата попадают в кэш"""
+
+        fake_vk.members[2000000001] = [5, 6]
+
+        await vk_api.get_chat_users(2000000001)
+        users = await asyncio.gather(vk_api.get_user(5), vk_api.get_user(6))
+
+        assert [user.name for user in users] == ["user5", "user6"]
+        assert fake_vk.requests == ["messages.getConversationMembers"]
+
+    async def test_lru_and_ttl(self, vk_api: VkApiAccessor):
+        """проверка вытеснения давно не используемых и устаревших профилей"""
+
+        vk_api.app.config = replace(
+            vk_api.app.config, vk_api=VkApiConfig(profile_cache_size=2)
+        )
+        for vk_user_id in (1, 2):
+            await vk_api.get_user(vk_user_id)
+        await vk_api.get_user(1)
+        await vk_api.get_user(3)
+
+        assert list(vk_api.profiles.profiles) == [1, 3]
+
+        vk_api.app.config = replace(
+            vk_api.app.config, vk_api=VkApiConfig(profile_ttl=-1)
+        )
+        await vk_api.get_user(4)
+
+        assert vk_api.profiles.peek(4) is None
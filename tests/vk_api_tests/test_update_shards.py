@@ -0,0 +1,326 @@
+import asyncio
+import json
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import aio_pika
+import pytest
+from aiormq.exceptions import ChannelLockedResource
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.game.models import GameModel, VKUserModel
+from app.game.states import GameState
+from app.store import Store
+from app.store.bot import receiver as receiver_module
+from app.store.game.actors import GameActors
+from app.store.vk_api.sender import UpdateSender
+from app.store.vk_api.shards import jump_hash, owned_shards, shard_of
+from app.web.config import Config
+from app.web.roles import Role
+
+
+def raw_update(message_id: int, peer_id: int) -> dict:
+    return {
+        "type": "message_new",
+        "object": {
+            "message": {
+                "id": message_id,
+                "from_id": 1,
+                "peer_id": peer_id,
+                "text": f"сообщение {message_id}",
+            }
+        },
+    }
+
+
+class FakeBroker:
+    """брокер с одним шардом, замок которого может быть занят"""
+
+    def __init__(self, server):
+        self.server = server
+        self.locked = False
+        self.queue = SimpleNamespace(consume=AsyncMock(return_value="tag"))
+        self.channels: list[SimpleNamespace] = []
+        self.connections: list[SimpleNamespace] = []
+
+    async def connect(self, *_) -> SimpleNamespace:
+        connection = SimpleNamespace(
+            is_closed=False, channel=self.channel, close=AsyncMock()
+        )
+        self.connections.append(connection)
+        return connection
+
+    async def channel(self) -> SimpleNamespace:
+        channel = SimpleNamespace(
+            declare_queue=self.declare_queue,
+            set_qos=AsyncMock(),
+            close=AsyncMock(),
+            close_callbacks=set(),
+        )
+        self.channels.append(channel)
+        return channel
+
+    async def declare_queue(self, name: str, **_) -> SimpleNamespace:
+        if name == "vk_updates.0.owner" and self.locked:
+            raise ChannelLockedResource("locked")
+        return self.queue
+
+    def drop(self) -> None:
+        """обрыв соединения: закрываются все его каналы"""
+
+        for connection in self.connections:
+            connection.is_closed = True
+        for channel in self.channels:
+            for callback in list(channel.close_callbacks):
+                callback(channel, ConnectionError())
+
+    async def taken_over(self, receiver) -> None:
+        async with asyncio.timeout(1):
+            while receiver.standby:
+                await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def broker(
+    server,
+    store: Store,
+    config: Config,
+    vk_user_2: VKUserModel,
+    db_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> FakeBroker:
+    """получатель updates воркера с одним шардом на поддельном брокере.
+    игры в базе переведены в сбор игроков"""
+
+    async with db_session.begin() as session:
+        await session.execute(
+            update(GameModel).values(state=GameState.gathering)
+        )
+
+    receiver = store.bot_manager.receiver
+    monkeypatch.setattr(
+        receiver.app,
+        "config",
+        replace(
+            config,
+            rabbitmq=replace(config.rabbitmq, shards=1, owned_shards=[0]),
+        ),
+    )
+    monkeypatch.setattr(receiver_module, "STANDBY_RETRY", 0.05)
+    monkeypatch.setattr(receiver, "active", set())
+    monkeypatch.setattr(receiver, "consumers", {})
+    monkeypatch.setattr(receiver, "connection", None)
+    monkeypatch.setattr(receiver, "closing", False)
+    monkeypatch.setattr(server, "role", Role.worker)
+
+    broker = FakeBroker(server)
+    monkeypatch.setattr(aio_pika, "connect", broker.connect)
+    return broker
+
+
+class TestShards:
+    async def test_jump_hash_balanced(self):
+        """проверка, что беседы распределяются по шардам равномерно,
+        а при добавлении шарда переезжают только в новый шард"""
+
+        peers = range(2000000000, 2000010000)
+        before = {peer: jump_hash(peer, 4) for peer in peers}
+        after = {peer: jump_hash(peer, 5) for peer in peers}
+
+        assert all(
+            2400 < count < 2600 for count in Counter(before.values()).values()
+        )
+
+        moved = [peer for peer in peers if before[peer] != after[peer]]
+        assert 1800 < len(moved) < 2200
+        assert {after[peer] for peer in moved} == {4}
+
+    async def test_owned_shards(self):
+        """проверка выбора обслуживаемых шардов из конфига"""
+
+        assert owned_shards(4, None) == [0, 1, 2, 3]
+        assert owned_shards(4, [2, 0, 2]) == [0, 2]
+
+        with pytest.raises(ValueError):
+            owned_shards(4, [4])
+
+    async def test_sender_routes_by_peer(self, config: Config):
+        """проверка, что updates беседы уходят в очередь ее шарда
+        через один и тот же канал и по порядку"""
+
+        app = SimpleNamespace(
+            config=replace(config, rabbitmq=replace(config.rabbitmq, shards=4)),
+            on_startup=[],
+            on_cleanup=[],
+        )
+        sender = UpdateSender(app)
+        sender.channels = [
+            SimpleNamespace(
+                default_exchange=SimpleNamespace(publish=AsyncMock())
+            )
+            for _ in range(2)
+        ]
+
+        peers = [2000000001, 2000000002, 2000000003]
+        await sender.send_updates(
+            [raw_update(n, peers[n % 3]) for n in range(9)]
+        )
+
+        for peer_id in peers:
+            shard = shard_of(peer_id, 4)
+            channel = sender.channels[shard % 2]
+            published = [
+                json.loads(call.args[0].body)
+                for call in channel.default_exchange.publish.call_args_list
+                if call.kwargs["routing_key"] == f"vk_updates.{shard}"
+            ]
+            assert [u["id"] for u in published if u["peer_id"] == peer_id] == [
+                n for n in range(9) if peers[n % 3] == peer_id
+            ]
+
+        published = sum(
+            channel.default_exchange.publish.await_count
+            for channel in sender.channels
+        )
+        assert published == 9
+
+    async def test_recovery_of_owned_shard(
+        self,
+        store: Store,
+        config: Config,
+        vk_user_2: VKUserModel,
+        db_session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        """проверка, что при занятии шарда восстанавливаются
+        только игры его бесед"""
+
+        async with db_session.begin() as session:
+            await session.execute(
+                update(GameModel).values(state=GameState.gathering)
+            )
+
+        shard = shard_of(2000000001, 4)
+        assert shard != shard_of(2000000002, 4)
+        monkeypatch.setattr(
+            store.bot_manager.receiver.app,
+            "config",
+            replace(
+                config,
+                rabbitmq=replace(
+                    config.rabbitmq, shards=4, owned_shards=[shard]
+                ),
+            ),
+        )
+
+        await store.game_manager.recover([shard])
+
+        assert store.game_manager.timer.remaining(1) is not None
+        assert store.game_manager.timer.remaining(2) is None
+
+    async def test_busy_shard_standby(
+        self,
+        store: Store,
+        broker: FakeBroker,
+    ):
+        """проверка, что занятый другим процессом шард ждет в резерве:
+        его игры не восстанавливаются и его беседы не считаются своими,
+        пока замок шарда не освободится"""
+
+        receiver = store.bot_manager.receiver
+        broker.locked = True
+
+        await receiver.connect(broker.server)
+        await asyncio.sleep(0.1)
+
+        assert not receiver.owns(2000000001)
+        assert store.game_manager.timer.remaining(1) is None
+        broker.queue.consume.assert_not_awaited()
+
+        broker.locked = False
+        await broker.taken_over(receiver)
+
+        assert receiver.owns(2000000001)
+        assert store.game_manager.timer.remaining(1) is not None
+        broker.queue.consume.assert_awaited_once()
+
+    async def test_lost_lock(
+        self,
+        store: Store,
+        broker: FakeBroker,
+    ):
+        """проверка, что при обрыве соединения шард отдается:
+        его беседы перестают считаться своими, таймеры их игр
+        отменяются, а состояние забывается, пока шард снова
+        не будет занят через новое соединение"""
+
+        receiver = store.bot_manager.receiver
+        manager = store.game_manager
+        await receiver.connect(broker.server)
+        assert receiver.owns(2000000001)
+        assert manager.timer.remaining(1) is not None
+
+        await store.game.active.set_game_fields(1, dealer_points=21)
+        broker.locked = True
+        broker.drop()
+
+        assert not receiver.owns(2000000001)
+        assert 0 not in receiver.consumers
+        await asyncio.sleep(0.1)
+        assert manager.timer.remaining(1) is None
+        assert 1 not in store.game.active.games
+        assert receiver.standby
+
+        broker.locked = False
+        await broker.taken_over(receiver)
+
+        assert receiver.owns(2000000001)
+        assert manager.timer.remaining(1) is not None
+        assert len(broker.connections) == 2
+        game = await store.game.get_game_by_id(1)
+        assert game.dealer_points != 21
+
+    async def test_update_during_shutdown(
+        self, store: Store, monkeypatch: pytest.MonkeyPatch
+    ):
+        """проверка, что при остановке прием updates прекращается
+        раньше акторов, а update, пришедший после их закрытия,
+        возвращается в очередь шарда необработанным"""
+
+        receiver = store.bot_manager.receiver
+        actors = GameActors(concurrency=1)
+        monkeypatch.setattr(store.game_manager, "actors", actors)
+        queue = SimpleNamespace(cancel=AsyncMock())
+        monkeypatch.setattr(receiver, "consumers", {0: (queue, "consumer")})
+        monkeypatch.setattr(receiver, "closing", False)
+        handled, requeued = receiver.handled, receiver.requeued
+
+        await receiver.stop_consuming()
+        queue.cancel.assert_awaited_once_with("consumer")
+        assert not receiver.consumers
+
+        await actors.close()
+        message = SimpleNamespace(
+            body=json.dumps(
+                {
+                    "id": 1,
+                    "type": "message_new",
+                    "from_id": 1,
+                    "peer_id": 2000000001,
+                    "text": "/start",
+                }
+            ).encode(),
+            process=lambda **_: nullcontext(),
+            nack=AsyncMock(),
+            reject=AsyncMock(),
+        )
+        await receiver.route_update(message)
+
+        message.nack.assert_awaited_once_with(requeue=True)
+        message.reject.assert_not_awaited()
+        assert receiver.handled == handled
+        assert receiver.requeued == requeued + 1
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.game.models import GameModel, VKUserModel
+from app.game.states import GameState
+from app.store import Store
+from app.web.app import Application
+from app.web.config import VkApiConfig
+from app.web.launcher import share_rate_limit, split_shards
+from app.web.roles import Role
+
+
+class TestRoles:
+    async def test_runs(self, server: Application, monkeypatch):
+        """проверка, какие части бота выполняет процесс в каждой роли"""
+
+        monkeypatch.setattr(server, "role", Role.worker)
+        assert server.runs(Role.worker)
+        assert not server.runs(Role.poller, Role.api)
+
+        monkeypatch.setattr(server, "role", Role.all)
+        assert server.runs(Role.poller)
+        assert server.runs(Role.api)
+
+    async def test_api_skips_workers(
+        self,
+        server: Application,
+        store: Store,
+        vk_user_2: VKUserModel,
+        db_session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        """проверка, что процесс api не подключается к брокеру
+        и не восстанавливает игры"""
+
+        async with db_session.begin() as session:
+            await session.execute(
+                update(GameModel).values(state=GameState.gathering)
+            )
+        monkeypatch.setattr(server, "role", Role.api)
+
+        # подключение к брокеру упало бы - в тестах его нет
+        await store.bot_manager.receiver.connect(server)
+
+        assert store.game_manager.timer.stats()["pending"] == 0
+
+
+class TestSupervisor:
+    async def test_split_shards(self):
+        """проверка, что шарды делятся между воркерами без пересечений"""
+
+        assert split_shards(4, None, 2) == [[0, 2], [1, 3]]
+        assert split_shards(8, [1, 2, 5], 2) == [[1, 5], [2]]
+
+        with pytest.raises(ValueError):
+            split_shards(2, None, 3)
+
+    async def test_share_rate_limit(self):
+        """проверка, что воркеры вместе не превышают лимит токена vk"""
+
+        config = VkApiConfig(rate_limit=20, burst=20)
+
+        assert share_rate_limit(config, 1) == config
+        share = share_rate_limit(config, 4)
+        assert (share.rate_limit, share.burst) == (5, 5)
+        assert share.max_retries == config.max_retries
+
+        share = share_rate_limit(VkApiConfig(rate_limit=3, burst=2), 3)
+        assert (share.rate_limit, share.burst) == (1, 1)